@@ -6,6 +6,10 @@ import sys
 import io
 import datetime  # 添加datetime导入
 from ppt_to_video_converter import ppt_to_video
+from disk_cache import DiskLRUCache, default_cache_root
+from powerpoint_session import PowerPointSession
+from export_worker import SlideExportWorker
+from narration_parser import preflight_files
 import ssl
 import traceback  # 确保导入了traceback模块
 import re  # 添加re模块
@@ -49,6 +53,13 @@ class PPTToVideoApp:
         
         # 添加精准字幕变量
         self.precise_subtitle = tk.BooleanVar(value=True)
+        # 静音检测对齐字幕（仅在未启用精准字幕时生效）
+        self.silence_timing = tk.BooleanVar(value=False)
+        # 使用ffmpeg烧录ASS字幕，代替逐行绘制字幕画面
+        self.ass_subtitles = tk.BooleanVar(value=False)
+        # 导出SRT/VTT字幕文件，以及以mov_text轨道内嵌字幕(画面不烧录字幕)
+        self.export_subtitle_files = tk.BooleanVar(value=False)
+        self.soft_subtitles = tk.BooleanVar(value=False)
         
         # 存储选中的PPT文件列表
         self.ppt_files = []
@@ -303,6 +314,16 @@ class PPTToVideoApp:
         # 添加精准字幕复选框 - 移动到右侧与字体颜色标签水平对齐
         ttk.Checkbutton(subtitle_frame, text="精准字幕", variable=self.precise_subtitle).grid(
             row=1, column=2, sticky=tk.W, pady=5, padx=(10, 0))
+        ttk.Checkbutton(subtitle_frame, text="静音检测对齐", variable=self.silence_timing).grid(
+            row=1, column=3, sticky=tk.W, pady=5)
+        
+        # 字幕输出方式
+        ttk.Checkbutton(subtitle_frame, text="ffmpeg烧录字幕", variable=self.ass_subtitles).grid(
+            row=2, column=0, sticky=tk.W, pady=5)
+        ttk.Checkbutton(subtitle_frame, text="导出SRT/VTT字幕", variable=self.export_subtitle_files).grid(
+            row=2, column=1, sticky=tk.W, pady=5)
+        ttk.Checkbutton(subtitle_frame, text="内嵌软字幕(不烧录)", variable=self.soft_subtitles).grid(
+            row=2, column=2, sticky=tk.W, pady=5, padx=(10, 0))
         
         # 添加图片水印设置区域
         #ttk.Separator(subtitle_frame, orient=tk.HORIZONTAL).grid(row=2, column=0, columnspan=4, sticky=tk.EW, pady=8)
@@ -375,6 +396,60 @@ class PPTToVideoApp:
         #         text="注意: 字幕中仍显示原始文字，替换仅影响语音发音", 
         #         foreground="blue").grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
         
+        # 添加性能设置框架（视频编码、语音合成等）
+        performance_frame = ttk.LabelFrame(options_frame, text="性能设置", padding="5")
+        performance_frame.grid(row=6, column=0, columnspan=4, sticky=tk.W+tk.E, pady=5)
+        
+        # 编码方式选择
+        ttk.Label(performance_frame, text="编码方式:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.encoder_backend = tk.StringVar(value="moviepy")
+        encoder_combo = ttk.Combobox(performance_frame, textvariable=self.encoder_backend, width=15, state="readonly")
+        encoder_combo['values'] = ("moviepy", "ffmpeg管道", "静态帧(VFR)")
+        encoder_combo.grid(row=0, column=1, sticky=tk.W, pady=5)
+        
+        # 分段并行编码复选框
+        self.parallel_segments = tk.BooleanVar(value=False)
+        ttk.Checkbutton(performance_frame, text="分段并行编码", variable=self.parallel_segments).grid(
+            row=0, column=2, sticky=tk.W, pady=5, padx=(20, 0))
+        
+        # 增量渲染: 按页缓存编码好的视频片段，只重新生成改动过的页面
+        self.use_segment_cache = tk.BooleanVar(value=True)
+        ttk.Checkbutton(performance_frame, text="增量渲染(片段缓存)", variable=self.use_segment_cache).grid(
+            row=0, column=3, columnspan=2, sticky=tk.W, pady=5, padx=(20, 0))
+        
+        # TTS音频缓存设置
+        self.use_tts_cache = tk.BooleanVar(value=True)
+        ttk.Checkbutton(performance_frame, text="TTS音频缓存", variable=self.use_tts_cache).grid(
+            row=1, column=0, sticky=tk.W, pady=5)
+        
+        ttk.Label(performance_frame, text="缓存上限(MB):").grid(row=1, column=1, sticky=tk.W, pady=5)
+        self.tts_cache_size = tk.IntVar(value=500)
+        ttk.Entry(performance_frame, textvariable=self.tts_cache_size, width=8).grid(
+            row=1, column=2, sticky=tk.W, pady=5, padx=(20, 0))
+        
+        # 网络TTS并发数
+        ttk.Label(performance_frame, text="TTS并发数:").grid(row=1, column=3, sticky=tk.W, pady=5, padx=(20, 0))
+        self.tts_workers = tk.IntVar(value=4)
+        ttk.Spinbox(performance_frame, from_=1, to=16, textvariable=self.tts_workers, width=5).grid(
+            row=1, column=4, sticky=tk.W, pady=5)
+        
+        # 幻灯片渲染后端
+        ttk.Label(performance_frame, text="幻灯片渲染:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.slide_renderer = tk.StringVar(value="自动")
+        renderer_combo = ttk.Combobox(performance_frame, textvariable=self.slide_renderer, width=15, state="readonly")
+        renderer_combo['values'] = ("自动", "PowerPoint", "LibreOffice")
+        renderer_combo.grid(row=2, column=1, sticky=tk.W, pady=5)
+        
+        # 在独立进程中导出幻灯片，PowerPoint卡死时结束该进程并继续处理下一个文件
+        self.isolated_export = tk.BooleanVar(value=True)
+        ttk.Checkbutton(performance_frame, text="独立进程导出(防卡死)", variable=self.isolated_export).grid(
+            row=2, column=2, columnspan=2, sticky=tk.W, pady=5, padx=(20, 0))
+        
+        # 流水线逐页编码: 每页渲染完成后立即编码，与后续页面的导出、语音合成同时进行
+        self.streaming_encode = tk.BooleanVar(value=True)
+        ttk.Checkbutton(performance_frame, text="流水线逐页编码", variable=self.streaming_encode).grid(
+            row=3, column=0, columnspan=2, sticky=tk.W, pady=5)
+        
         # Control buttons - 移到日志框上方
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=5)
@@ -658,7 +733,11 @@ class PPTToVideoApp:
             'bg_color': self.subtitle_bg_color.get(),
             'font_size': self.font_size.get(),
             'font_color': font_color,
-            'precise_subtitle': self.precise_subtitle.get()
+            'precise_subtitle': self.precise_subtitle.get(),
+            'timing_mode': 'precise' if self.precise_subtitle.get() else ('silence' if self.silence_timing.get() else 'estimate'),
+            'render_backend': 'none' if self.soft_subtitles.get() else ('ass' if self.ass_subtitles.get() else 'pil'),
+            'sidecar_formats': ['srt', 'vtt'] if self.export_subtitle_files.get() else [],
+            'mux_subtitles': self.soft_subtitles.get()
         }
         
         # 添加水印设置
@@ -672,6 +751,53 @@ class PPTToVideoApp:
         else:
             print("水印功能未启用或未选择图片")
         
+        # 视频编码参数
+        encoder_backend_map = {
+            'moviepy': 'moviepy',
+            'ffmpeg管道': 'ffmpeg_pipe',
+            '静态帧(VFR)': 'ffmpeg_still'
+        }
+        encoder_params = {
+            'backend': encoder_backend_map.get(self.encoder_backend.get(), 'moviepy'),
+            'parallel_segments': self.parallel_segments.get(),
+            'streaming_encode': self.streaming_encode.get()
+        }
+        if self.use_segment_cache.get():
+            try:
+                # 视频片段远大于音频，缓存上限取TTS缓存的4倍
+                segment_cache_size = max(100, int(self.tts_cache_size.get()) * 4)
+            except (ValueError, tk.TclError):
+                segment_cache_size = 2000
+            try:
+                encoder_params['segment_cache'] = DiskLRUCache(
+                    os.path.join(default_cache_root(), 'segments'), max_size_mb=segment_cache_size, name="片段缓存")
+            except Exception as e:
+                print(f"创建片段缓存失败 ({e})，本次完整生成所有页面")
+        
+        # 幻灯片渲染参数
+        renderer_map = {'自动': 'auto', 'PowerPoint': 'powerpoint', 'LibreOffice': 'libreoffice'}
+        render_params = {
+            'backend': renderer_map.get(self.slide_renderer.get(), 'auto'),
+            'isolated_export': self.isolated_export.get()
+        }
+        
+        # 语音合成参数
+        try:
+            tts_workers = max(1, int(self.tts_workers.get()))
+        except (ValueError, tk.TclError):
+            tts_workers = 4
+        synthesis_params = {'max_workers': tts_workers}
+        if self.use_tts_cache.get():
+            try:
+                cache_size = max(10, int(self.tts_cache_size.get()))
+            except (ValueError, tk.TclError):
+                cache_size = 500
+            try:
+                synthesis_params['cache'] = DiskLRUCache(
+                    os.path.join(default_cache_root(), 'tts'), max_size_mb=cache_size, name="TTS缓存")
+            except Exception as e:
+                print(f"创建TTS缓存失败 ({e})，本次不使用缓存")
+        
         print("="*50)
         print(f"开始批量转换 {len(self.ppt_files)} 个文件")
         print(f"语音引擎：{tts_engine}")
@@ -685,6 +811,18 @@ class PPTToVideoApp:
         print(f"字幕字体大小: {subtitle_params['font_size']}")
         print(f"字幕字体颜色: RGB{font_color}")  # 添加字体颜色日志输出
         print(f"精准字幕: {'启用' if subtitle_params['precise_subtitle'] else '禁用'}")
+        print(f"字幕时间轴模式: {subtitle_params['timing_mode']}")
+        render_backend_names = {'pil': '逐行绘制', 'ass': 'ffmpeg烧录ASS字幕', 'none': '不烧录(内嵌软字幕)'}
+        print(f"字幕渲染方式: {render_backend_names[subtitle_params['render_backend']]}")
+        print(f"导出字幕文件: {', '.join(subtitle_params['sidecar_formats']) or '否'}")
+        print(f"幻灯片渲染: {self.slide_renderer.get()}")
+        print(f"独立进程导出: {'启用' if render_params['isolated_export'] else '禁用'}")
+        print(f"编码方式: {self.encoder_backend.get()}")
+        print(f"分段并行编码: {'启用' if encoder_params['parallel_segments'] else '禁用'}")
+        print(f"流水线逐页编码: {'启用' if encoder_params['streaming_encode'] else '禁用'}")
+        print(f"增量渲染: {'启用' if 'segment_cache' in encoder_params else '禁用'}")
+        print(f"TTS音频缓存: {'启用' if 'cache' in synthesis_params else '禁用'}")
+        print(f"TTS并发数: {synthesis_params['max_workers']}")
         
         # 打印多音字替换设置
         if pronunciation_dict:
@@ -708,12 +846,12 @@ class PPTToVideoApp:
         # Start conversion in a separate thread
         conversion_thread = threading.Thread(
             target=self.run_batch_conversion,
-            args=(self.ppt_files, tts_engine, xfyun_params, ttsmaker_params, subtitle_params, pronunciation_dict, watermark_params)
+            args=(self.ppt_files, tts_engine, xfyun_params, ttsmaker_params, subtitle_params, pronunciation_dict, watermark_params, encoder_params, synthesis_params, render_params)
         )
         conversion_thread.daemon = True
         conversion_thread.start()
     
-    def run_batch_conversion(self, ppt_files, tts_engine, xfyun_params=None, ttsmaker_params=None, subtitle_params=None, pronunciation_dict=None, watermark_params=None):
+    def run_batch_conversion(self, ppt_files, tts_engine, xfyun_params=None, ttsmaker_params=None, subtitle_params=None, pronunciation_dict=None, watermark_params=None, encoder_params=None, synthesis_params=None, render_params=None):
         """批量处理多个PPT文件"""
         total_files = len(ppt_files)
         success_count = 0
@@ -722,6 +860,22 @@ class PPTToVideoApp:
         # 计算每个文件的进度增量
         progress_increment = 100.0 / total_files
         
+        # 启动PowerPoint前先并行检查所有文件的旁白，格式有误的文件直接标记为失败
+        print("预检所有文件的旁白文字...")
+        preflight_errors = preflight_files(ppt_files)
+        
+        # 整个批次复用同一个PowerPoint实例，只在首次使用PowerPoint渲染时启动
+        # 启用独立进程导出时，PowerPoint实例由导出子进程持有，卡死时连同子进程一起结束
+        render_params = dict(render_params or {})
+        powerpoint_session = None
+        export_worker = None
+        if render_params.pop('isolated_export', False):
+            export_worker = SlideExportWorker(render_params)
+            render_params['export_worker'] = export_worker
+        else:
+            powerpoint_session = PowerPointSession()
+            render_params['powerpoint_session'] = powerpoint_session
+        
         for index, ppt_path in enumerate(ppt_files):
             # 更新状态
             file_name = os.path.basename(ppt_path)
@@ -745,6 +899,14 @@ class PPTToVideoApp:
                     output_path = os.path.join(output_dir, output_filename)
                     print(f"将使用临时目录: {output_path}")
             
+            if ppt_path in preflight_errors:
+                print(f"文件 {file_name} 旁白预检未通过，跳过: {preflight_errors[ppt_path]}")
+                failed_files.append((file_name, preflight_errors[ppt_path]))
+                self.root.after(0, lambda idx=index: self.update_file_status(idx, "failed"))
+                current_progress = (index + 1) * progress_increment
+                self.root.after(0, lambda p=current_progress: self.progress_var.set(p))
+                continue
+            
             print("\n" + "="*50)
             print(f"开始处理文件 {index + 1}/{total_files}: {ppt_path}")
             print(f"输出路径: {output_path}")
@@ -761,7 +923,10 @@ class PPTToVideoApp:
                     ttsmaker_params, 
                     subtitle_params, 
                     pronunciation_dict,
-                    watermark_params  # 添加水印参数
+                    watermark_params,  # 添加水印参数
+                    encoder_params,  # 添加编码参数
+                    synthesis_params,  # 添加语音合成参数
+                    render_params  # 幻灯片渲染后端
                 )
                 
                 print(f"文件 {file_name} 处理成功!")
@@ -782,6 +947,12 @@ class PPTToVideoApp:
             current_progress = (index + 1) * progress_increment
             self.root.after(0, lambda p=current_progress: self.progress_var.set(p))
         
+        # 退出批次共用的PowerPoint实例
+        if export_worker is not None:
+            export_worker.stop()
+        if powerpoint_session is not None:
+            powerpoint_session.close()
+        
         # 处理完成，更新状态
         summary = f"转换完成! 成功: {success_count}/{total_files}"
         if failed_files:
@@ -793,6 +964,12 @@ class PPTToVideoApp:
         print("\n" + "="*50)
         print(f"批处理完成！成功: {success_count}/{total_files}")
         
+        # 输出整个批次的TTS缓存命中情况
+        if synthesis_params and synthesis_params.get('cache') is not None:
+            synthesis_params['cache'].print_stats()
+        if powerpoint_session is not None and powerpoint_session.launches:
+            powerpoint_session.print_stats()
+        
         if failed_files:
             print("\n失败文件列表:")
             for name, error in failed_files:
@@ -1168,6 +1345,10 @@ class PPTToVideoApp:
 
 # Run the application
 if __name__ == "__main__":
+    # 打包为exe后，分段并行编码的子进程需要此调用
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
     root = tk.Tk()
     app = PPTToVideoApp(root)
     root.protocol("WM_DELETE_WINDOW", app.on_close)
@@ -0,0 +1,166 @@
+"""
+按内容寻址的磁盘缓存
+
+缓存文件以键(内容哈希)命名，总大小超过上限时按最近使用时间(LRU)淘汰。
+文件的修改时间用作最近使用时间，命中时会刷新，因此缓存可在多次运行之间保留LRU顺序。
+"""
+import os
+import shutil
+import hashlib
+import threading
+import json
+from collections import OrderedDict
+
+def default_cache_root():
+    """返回默认的缓存根目录"""
+    base_dir = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    return os.path.join(base_dir, 'ppt_tool_cache')
+
+def make_cache_key(fields):
+    """
+    根据字段字典计算缓存键
+
+    Parameters:
+    - fields: 参与计算的字段字典，值需可被JSON序列化
+
+    Returns:
+    - 十六进制SHA-256字符串
+    """
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class DiskLRUCache:
+    """限制总大小的磁盘LRU缓存，可在多个线程间共享"""
+
+    def __init__(self, cache_dir, max_size_mb=500, name="缓存"):
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.name = name
+
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 文件名 -> 文件大小，按最近使用时间从旧到新排列
+        self._total_size = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_entries()
+
+    def _load_entries(self):
+        """扫描缓存目录，按修改时间恢复LRU顺序"""
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            file_path = os.path.join(self.cache_dir, file_name)
+            if file_name.endswith('.tmp') or not os.path.isfile(file_path):
+                continue
+            stat = os.stat(file_path)
+            entries.append((stat.st_mtime, file_name, stat.st_size))
+
+        for _, file_name, size in sorted(entries):
+            self._entries[file_name] = size
+            self._total_size += size
+
+    def _file_name(self, key, ext):
+        return f"{key}{ext}"
+
+    def fetch(self, key, output_path):
+        """
+        若缓存中存在该键，则复制到output_path
+
+        Returns:
+        - 命中返回True，否则返回False
+        """
+        file_name = self._file_name(key, os.path.splitext(output_path)[1])
+        cached_path = os.path.join(self.cache_dir, file_name)
+
+        with self._lock:
+            if file_name not in self._entries or not os.path.exists(cached_path):
+                self._entries.pop(file_name, None)
+                self.misses += 1
+                return False
+            self._entries.move_to_end(file_name)
+            self.hits += 1
+
+        try:
+            shutil.copyfile(cached_path, output_path)
+            os.utime(cached_path, None)  # 刷新最近使用时间
+            return True
+        except Exception as e:
+            print(f"读取{self.name}失败: {e}")
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return False
+
+    def store(self, key, source_path):
+        """将source_path的内容存入缓存，必要时淘汰最久未使用的文件"""
+        if not os.path.exists(source_path):
+            return
+        file_name = self._file_name(key, os.path.splitext(source_path)[1])
+        cached_path = os.path.join(self.cache_dir, file_name)
+        temp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, cached_path)
+        except Exception as e:
+            print(f"写入{self.name}失败: {e}")
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            except:
+                pass
+            return
+
+        size = os.path.getsize(cached_path)
+        with self._lock:
+            self._total_size -= self._entries.pop(file_name, 0)
+            self._entries[file_name] = size
+            self._total_size += size
+            self.stores += 1
+            self._evict_locked()
+
+    def _evict_locked(self):
+        """淘汰最久未使用的文件，直到总大小不超过上限"""
+        while self._total_size > self.max_size and len(self._entries) > 1:
+            file_name, size = self._entries.popitem(last=False)
+            self._total_size -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except Exception as e:
+                print(f"删除{self.name}文件失败 {file_name}: {e}")
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for file_name in list(self._entries):
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except Exception:
+                    pass
+            self._entries.clear()
+            self._total_size = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_mb': self._total_size / (1024 * 1024)
+            }
+
+    def print_stats(self):
+        """打印缓存统计信息"""
+        stats = self.stats()
+        print(f"{self.name}: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+              f"新增 {stats['stores']} 个, 淘汰 {stats['evictions']} 个, "
+              f"共 {stats['entries']} 个文件 ({stats['size_mb']:.1f} MB)")
@@ -0,0 +1,288 @@
+"""
+进程外幻灯片导出
+
+PowerPoint遇到损坏的文件或弹出模态对话框时，COM调用会一直阻塞。
+SlideExportWorker 在独立的子进程中运行幻灯片渲染后端，主进程按请求设置超时：
+打开演示文稿、读取文字、每页导出各有时限，整份演示文稿另有总时限。
+超时后结束子进程和其中的PowerPoint进程，下一个请求自动启动新的子进程，批量转换可以继续处理后续文件。
+子进程中的输出转发到主进程打印，每页导出完成后立即把结果发回主进程。
+"""
+import os
+import sys
+import time
+import atexit
+import signal
+import threading
+import traceback
+import multiprocessing
+from slide_renderer import SlideRenderer, create_slide_renderer, resolve_renderer_name
+from powerpoint_session import PowerPointSession
+
+class SlideExportTimeout(Exception):
+    """子进程中的幻灯片导出超时，子进程已被结束"""
+    pass
+
+class _PipeWriter:
+    """子进程的标准输出，把打印内容转发给主进程"""
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def write(self, text):
+        if text:
+            with self._lock:
+                self._conn.send(('log', text))
+        return len(text)
+
+    def flush(self):
+        pass
+
+def _worker_main(conn, render_params):
+    """子进程入口: 循环处理主进程发来的命令"""
+    lock = threading.Lock()
+    sys.stdout = sys.stderr = _PipeWriter(conn, lock)
+
+    def reply(*message):
+        with lock:
+            conn.send(message)
+
+    # 子进程内复用同一个PowerPoint实例，主进程不持有COM对象
+    session = None
+    if resolve_renderer_name(render_params.get('backend', 'auto')) == 'powerpoint':
+        session = PowerPointSession()
+        render_params = dict(render_params, powerpoint_session=session)
+
+    renderer = None
+    while True:
+        try:
+            command, args = conn.recv()
+        except EOFError:
+            break
+        try:
+            if command == 'open':
+                if session is not None:
+                    # 先启动PowerPoint并告知PID，打开演示文稿卡住(修复或密码对话框)时主进程才能结束它
+                    session.application()
+                    reply('pid', session.process_id())
+                renderer = create_slide_renderer(render_params)
+                renderer.open(args[0])
+                if session is not None:
+                    # 打开失败重启过PowerPoint时PID会变化
+                    reply('pid', session.process_id())
+                reply('result', renderer.slide_count)
+            elif command == 'text':
+                reply('result', renderer.slide_text(args[0]))
+            elif command == 'export':
+                slide_indices, output_dir, width, height = args
+                results = renderer.export_slides(
+                    slide_indices, output_dir, width, height,
+                    on_slide=lambda processed_idx, result: reply('slide', processed_idx, result)
+                )
+                reply('result', results)
+            elif command == 'close':
+                if renderer is not None:
+                    renderer.close()
+                    renderer = None
+                reply('result', None)
+            elif command == 'quit':
+                if renderer is not None:
+                    renderer.close()
+                if session is not None:
+                    if session.launches:
+                        session.print_stats()
+                    session.close()
+                reply('result', None)
+                break
+        except Exception as e:
+            reply('error', f"{e}", traceback.format_exc())
+
+class SlideExportWorker:
+    """
+    在子进程中运行幻灯片渲染后端的看门狗
+
+    同一个子进程可连续处理多份演示文稿(PowerPoint实例在子进程中复用)。
+    任一请求超时，子进程和PowerPoint进程都会被结束，并抛出 SlideExportTimeout。
+    """
+
+    def __init__(self, render_params=None, open_timeout=180, slide_timeout=30, deck_timeout=1800):
+        """
+        Parameters:
+        - render_params: 传给子进程中 create_slide_renderer 的参数，不能包含会话或工作进程对象
+        - open_timeout: 打开演示文稿的时限(秒)
+        - slide_timeout: 每页导出和读取文字的时限(秒)；批量导出时按页数累加
+        - deck_timeout: 一份演示文稿从打开到导出完成的总时限(秒)
+        """
+        self.render_params = {key: value for key, value in (render_params or {}).items()
+                              if key not in ('powerpoint_session', 'export_worker')}
+        self.open_timeout = open_timeout
+        self.slide_timeout = slide_timeout
+        self.deck_timeout = deck_timeout
+        self.backend = resolve_renderer_name(self.render_params.get('backend', 'auto'))
+        self.starts = 0
+        self.kills = 0
+        self._process = None
+        self._conn = None
+        self._child_pid = None  # 子进程中PowerPoint的PID
+        self._deck_deadline = None
+        self._atexit_registered = False
+
+    def _start(self):
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        # 不能是守护进程: 子进程中LibreOffice后端的光栅化会启动自己的进程池
+        self._process = context.Process(target=_worker_main, args=(child_conn, self.render_params))
+        self._process.start()
+        if not self._atexit_registered:
+            # multiprocessing退出时会等待非守护子进程，未调用stop()时在此之前结束子进程
+            atexit.register(self._kill_at_exit)
+            self._atexit_registered = True
+        child_conn.close()
+        self._conn = parent_conn
+        self._child_pid = None
+        self.starts += 1
+        print(f"幻灯片导出子进程已启动 (PID {self._process.pid})")
+
+    def _ensure_started(self):
+        if self._process is None or not self._process.is_alive():
+            if self._process is not None:
+                print("幻灯片导出子进程已退出，重新启动...")
+            self._start()
+
+    def _kill_at_exit(self):
+        if self._process is not None and self._process.is_alive():
+            self.kill()
+
+    def kill(self):
+        """强制结束子进程及其中的PowerPoint进程"""
+        if self._child_pid:
+            try:
+                os.kill(self._child_pid, signal.SIGTERM)
+                print(f"已结束PowerPoint进程 (PID {self._child_pid})")
+            except Exception as e:
+                print(f"结束PowerPoint进程失败: {e}")
+        if self._process is not None:
+            self._process.kill()
+            self._process.join(5)
+            print(f"已结束幻灯片导出子进程 (PID {self._process.pid})")
+        self._process = None
+        self._conn = None
+        self._child_pid = None
+        self.kills += 1
+
+    def _request(self, command, args, timeout, on_slide=None):
+        """
+        发送命令并等待结果；每收到一页结果，单页时限重新计时
+
+        Returns:
+        - 子进程返回的结果
+        """
+        self._ensure_started()
+        self._conn.send((command, args))
+        deadline = time.time() + timeout
+        callback_error = None
+        while True:
+            if self._deck_deadline is not None:
+                deadline = min(deadline, self._deck_deadline)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.kill()
+                raise SlideExportTimeout(f"幻灯片导出超时 (命令 {command})，已结束导出进程")
+            if not self._conn.poll(min(remaining, 0.5)):
+                if not self._process.is_alive():
+                    self._process = None
+                    self._conn = None
+                    raise RuntimeError(f"幻灯片导出子进程意外退出 (命令 {command})")
+                continue
+
+            message = self._conn.recv()
+            kind = message[0]
+            if kind == 'log':
+                sys.stdout.write(message[1])
+            elif kind == 'pid':
+                self._child_pid = message[1]
+            elif kind == 'slide':
+                if on_slide is not None and callback_error is None:
+                    try:
+                        on_slide(message[1], message[2])
+                    except Exception as e:
+                        # 继续读完本命令的剩余消息，否则下一个请求会把它们当作自己的回复
+                        callback_error = e
+                # 回调可能把页面交给下游处理，回调返回后再重新计时
+                deadline = time.time() + self.slide_timeout
+            elif kind == 'error':
+                if callback_error is not None:
+                    raise callback_error
+                print(message[2])
+                raise RuntimeError(message[1])
+            else:
+                if callback_error is not None:
+                    raise callback_error
+                return message[1]
+
+    def open(self, ppt_path):
+        """打开演示文稿，开始计算整份演示文稿的总时限，返回幻灯片数量"""
+        self._deck_deadline = time.time() + self.deck_timeout
+        return self._request('open', (ppt_path,), self.open_timeout)
+
+    def slide_text(self, index):
+        return self._request('text', (index,), self.slide_timeout)
+
+    def export_slides(self, slide_indices, output_dir, width=1920, height=1080, on_slide=None):
+        # 批量导出一次完成所有页面，第一页结果到达前按页数累加时限
+        timeout = self.slide_timeout * max(1, len(slide_indices))
+        return self._request('export', (list(slide_indices), output_dir, width, height), timeout, on_slide)
+
+    def close_presentation(self):
+        """关闭当前演示文稿，子进程和PowerPoint实例保留给下一个文件"""
+        self._deck_deadline = None
+        if self._process is None or not self._process.is_alive():
+            return
+        try:
+            self._request('close', (), self.slide_timeout)
+        except Exception as e:
+            print(f"关闭演示文稿失败: {e}")
+
+    def stop(self):
+        """退出子进程(及其中的PowerPoint)"""
+        self._deck_deadline = None
+        if self._process is not None and self._process.is_alive():
+            try:
+                self._request('quit', (), self.open_timeout)
+                self._process.join(10)
+            except Exception as e:
+                print(f"退出幻灯片导出子进程失败 ({e})，强制结束")
+                self.kill()
+        self._process = None
+        self._conn = None
+        if self.kills:
+            print(f"幻灯片导出子进程: 启动 {self.starts} 次, 因超时结束 {self.kills} 次")
+
+class WorkerSlideRenderer(SlideRenderer):
+    """通过 SlideExportWorker 在子进程中打开和导出演示文稿的渲染后端"""
+    name = 'worker'
+
+    def __init__(self, worker):
+        self.worker = worker
+        self._slide_count = 0
+
+    @property
+    def backend(self):
+        return self.worker.backend
+
+    def open(self, ppt_path):
+        self._slide_count = self.worker.open(ppt_path)
+        return self
+
+    @property
+    def slide_count(self):
+        return self._slide_count
+
+    def slide_text(self, index):
+        return self.worker.slide_text(index)
+
+    def export_slides(self, slide_indices, output_dir, width=1920, height=1080, on_slide=None):
+        return self.worker.export_slides(slide_indices, output_dir, width, height, on_slide)
+
+    def close(self):
+        self.worker.close_presentation()
@@ -24,7 +24,7 @@ a = Analysis(
         'numpy', 'scipy', 'scipy.io', 'scipy.signal',
         'pyttsx3', 'pyttsx3.drivers', 'pyttsx3.drivers.sapi5',
         'win32com', 'win32com.client',
-        'websocket', 'ssl', 'wave', 'hmac',
+        'websocket', 'websockets', 'asyncio', 'ssl', 'wave', 'hmac',
         'hashlib', 'urllib', 'urllib.parse', 'base64', 'datetime'
     ],  # 移除了gtts
     hookspath=[],
@@ -0,0 +1,156 @@
+"""
+旁白文字解析与预检
+
+演示文稿最后一页存放旁白文字，按 "page1: ..."、"page2: ..." 标记(或 "Slide 1." / "1." 编号)对应到前面的幻灯片。
+parse_narrations 是 ppt_to_video 使用的解析和数量校验逻辑；preflight_narrations 直接读取pptx的XML做同样的校验，
+不需要启动PowerPoint，批量转换开始前用 preflight_files 并行检查所有文件，旁白格式有误的文件在毫秒级被排除。
+"""
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from slide_renderer import read_pptx_slides, normalize_line_breaks
+
+# "pageX" 格式的旁白标记，"page1" 对应PPT下标0
+PAGE_PATTERN = re.compile(r'page(\d+)\s*[:：]\s*(.+?)(?=page\d+\s*[:：]|$)', re.DOTALL | re.IGNORECASE)
+# 没有page标记时按 "Slide 1." 或行首 "1." 拆分
+NUMBERED_PATTERN = re.compile(r'(?:Slide\s+\d+[\.:]|^\d+[\.:])\s*', re.MULTILINE)
+# 旁白开头残留的 "page n:" 前缀
+PAGE_PREFIX_PATTERN = re.compile(r'^page\s*\d+[:：]\s*', re.IGNORECASE)
+
+def _preview(text):
+    return f"{text[:30]}{'...' if len(text) > 30 else ''}"
+
+def parse_narrations(narration_text, slide_count, verbose=True):
+    """
+    把旁白页的文字拆分到各张幻灯片，并检查旁白数量是否与幻灯片数量一致
+
+    Parameters:
+    - narration_text: 旁白页(最后一页)的文字
+    - slide_count: 演示文稿的幻灯片总数(含旁白页)
+    - verbose: 是否打印解析过程
+
+    Returns:
+    - {PPT下标(从0开始): 旁白文字} 字典，覆盖除旁白页外的所有幻灯片
+
+    旁白缺失、多余或编号与幻灯片不一致时抛出 ValueError。
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    # 行首编号只在 \n 之后匹配，PowerPoint的段落以 \r 分隔
+    narration_text = normalize_line_breaks(narration_text)
+
+    if slide_count < 2:
+        raise ValueError("演示文稿必须至少包含两张幻灯片，最后一张用于存放旁白文字")
+
+    # 处理除最后一页外的所有幻灯片
+    slides_to_process = list(range(0, slide_count - 1))
+
+    page_matches = PAGE_PATTERN.findall(narration_text)
+    narrations = {}
+
+    if page_matches:
+        log("检测到page格式的旁白标记")
+
+        # 对匹配结果按页码排序
+        sorted_matches = sorted(page_matches, key=lambda x: int(x[0]))
+        page_numbers = [int(match[0]) for match in sorted_matches]
+        log(f"找到以下页面标记: {page_numbers}")
+
+        # "page1" 对应下标0
+        found_slides = set(page_number - 1 for page_number in page_numbers)
+        missing_pages = set(slides_to_process) - found_slides
+        if missing_pages:
+            error_msg = f"错误: 以下PPT索引缺少旁白标记: {sorted(missing_pages)}"
+            log(error_msg)
+            raise ValueError(error_msg)
+
+        for page_number, text in sorted_matches:
+            ppt_slide_idx = int(page_number) - 1
+            log(f"为幻灯片索引 {ppt_slide_idx} (对应page{page_number})设置旁白")
+            narrations[ppt_slide_idx] = text.strip()
+    else:
+        # 尝试其他拆分模式，按顺序对应到要处理的幻灯片
+        slide_texts = [text.strip() for text in NUMBERED_PATTERN.split(narration_text) if text.strip()]
+        if len(slide_texts) <= 1 or len(slide_texts) != len(slides_to_process):
+            error_msg = f"错误: 旁白数量 ({len(slide_texts)}) 与要处理的幻灯片数量 ({len(slides_to_process)}) 不匹配!"
+            log(error_msg)
+            raise ValueError(error_msg)
+        narrations = dict(zip(slides_to_process, slide_texts))
+
+    # 清理所有旁白文本中可能存在的"page n:"格式
+    for slide_idx in narrations:
+        narrations[slide_idx] = PAGE_PREFIX_PATTERN.sub('', narrations[slide_idx])
+        log(f"幻灯片 {slide_idx} 的旁白: {_preview(narrations[slide_idx])}")
+
+    log(f"解析得到 {len(narrations)} 段旁白文字")
+
+    # 强化检查: 旁白数量必须与要处理的幻灯片数量一致
+    if len(narrations) != len(slides_to_process):
+        error_message = (
+            f"错误: 旁白数量 ({len(narrations)}) 与要处理的幻灯片数量 ({len(slides_to_process)}) 不匹配!\n"
+            f"请检查PPT最后一页的旁白文本格式，确保:\n"
+            f"1. 每个幻灯片都有对应的旁白文本 (当前旁白不足)\n"
+            f"2. 没有多余的旁白文本 (当前旁白过多)\n"
+            f"3. 如使用page标记，确保编号与实际幻灯片数量一致"
+        )
+        log("\n" + "!"*50)
+        log(error_message)
+        log("!"*50 + "\n")
+        raise ValueError(error_message)
+
+    # 打印slide索引和narration的对应关系，帮助调试
+    log("幻灯片索引与旁白对应关系:")
+    for slide_idx in sorted(narrations):
+        log(f"  幻灯片索引 {slide_idx} -> 旁白: {_preview(narrations[slide_idx])}")
+
+    return narrations
+
+def preflight_narrations(ppt_path):
+    """
+    不启动PowerPoint，直接读取pptx检查旁白
+
+    Parameters:
+    - ppt_path: 演示文稿路径
+
+    Returns:
+    - {PPT下标: 旁白文字} 字典；不是pptx格式(例如旧版.ppt)无法预检时返回None
+
+    旁白格式有误时抛出 ValueError。
+    """
+    if not zipfile.is_zipfile(ppt_path):
+        return None
+    slides = read_pptx_slides(ppt_path)
+    narration_text = slides[-1][0] if slides else ""
+    return parse_narrations(narration_text, len(slides), verbose=False)
+
+def _preflight_one(ppt_path):
+    try:
+        preflight_narrations(ppt_path)
+        return None
+    except ValueError as e:
+        return str(e)
+    except Exception as e:
+        # 读取失败不代表PowerPoint也打不开，交给正式转换处理
+        print(f"预检 {os.path.basename(ppt_path)} 时无法读取文件 ({e})，跳过预检")
+        return None
+
+def preflight_files(ppt_files, max_workers=8):
+    """
+    并行预检多个文件的旁白
+
+    Parameters:
+    - ppt_files: 演示文稿路径列表
+    - max_workers: 并行线程数
+
+    Returns:
+    - {路径: 错误信息} 字典，只包含旁白格式有误的文件
+    """
+    if not ppt_files:
+        return {}
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ppt_files)))) as executor:
+        results = dict(zip(ppt_files, executor.map(_preflight_one, ppt_files)))
+    errors = {path: error for path, error in results.items() if error}
+    print(f"旁白预检完成: {len(ppt_files)} 个文件，{len(errors)} 个有误，耗时 {(time.time() - start_time) * 1000:.0f}毫秒")
+    return errors
@@ -0,0 +1,139 @@
+"""
+PowerPoint应用程序会话
+
+批量转换时在整个批次中复用同一个PowerPoint实例，每个文件只打开和关闭演示文稿，
+省去每个文件启动和退出PowerPoint的数秒时间。实例崩溃或被关闭后，下次使用时自动重新启动。
+"""
+import time
+import threading
+
+class PowerPointSession:
+    """
+    可复用的PowerPoint应用程序实例
+
+    PowerPoint在首次打开演示文稿时才启动；调用 close() 退出并打印统计信息。
+    COM对象只能在创建它的线程中使用，同一个会话应在同一个线程内使用。
+    """
+
+    def __init__(self):
+        self.app = None
+        self.launches = 0         # 启动PowerPoint的次数(含重启)
+        self.restarts = 0         # 因实例失效而重启的次数
+        self.opens = 0            # 打开演示文稿的次数
+        self.launch_seconds = 0.0 # 启动PowerPoint的总耗时
+        self._lock = threading.Lock()
+
+    def _launch(self):
+        import win32com.client
+
+        print("启动PowerPoint应用程序...")
+        start_time = time.time()
+        self.app = win32com.client.Dispatch("PowerPoint.Application")
+        # 不要设置 Visible = False，这会导致错误
+        # 让 PowerPoint 保持可见状态运行
+        elapsed = time.time() - start_time
+        self.launches += 1
+        self.launch_seconds += elapsed
+        print(f"PowerPoint应用程序启动成功，耗时 {elapsed:.2f}秒")
+
+    def process_id(self):
+        """返回PowerPoint进程的PID，用于卡死时强制结束；无法获取时返回None"""
+        if self.app is None:
+            return None
+        try:
+            import win32process
+            return win32process.GetWindowThreadProcessId(self.app.HWND)[1]
+        except Exception:
+            return None
+
+    def is_alive(self):
+        """PowerPoint实例是否仍可用；进程崩溃或被用户关闭后访问属性会抛出异常"""
+        if self.app is None:
+            return False
+        try:
+            self.app.Presentations.Count
+            return True
+        except Exception:
+            return False
+
+    def application(self):
+        """返回可用的PowerPoint实例，必要时启动或重启"""
+        with self._lock:
+            if self.app is not None and not self.is_alive():
+                print("PowerPoint实例已失效，重新启动...")
+                self.app = None
+                self.restarts += 1
+            if self.app is None:
+                self._launch()
+            return self.app
+
+    def open_presentation(self, ppt_path):
+        """
+        在复用的实例中打开演示文稿，打开失败且实例已失效时重启一次再试
+
+        Returns:
+        - Presentation COM对象
+        """
+        app = self.application()
+        print(f"打开演示文稿: {ppt_path}")
+        try:
+            # 移除 WithWindow=False 参数，使用默认参数打开演示文稿
+            presentation = app.Presentations.Open(ppt_path)
+        except Exception as e:
+            if self.is_alive():
+                raise
+            print(f"打开演示文稿时PowerPoint失效 ({e})，重启后重试...")
+            presentation = self.application().Presentations.Open(ppt_path)
+        self.opens += 1
+        print("演示文稿打开成功，开始处理...")
+        return presentation
+
+    def close_presentation(self, presentation):
+        """关闭演示文稿，保留PowerPoint实例"""
+        try:
+            presentation.Close()
+        except Exception as e:
+            print(f"关闭演示文稿时出错: {e}")
+
+    def stats(self):
+        """
+        返回会话统计
+
+        saved_seconds 按平均启动耗时估算: 每个文件单独启动PowerPoint时需要的启动次数与实际启动次数之差。
+        """
+        average_launch = self.launch_seconds / self.launches if self.launches else 0.0
+        return {
+            'launches': self.launches,
+            'restarts': self.restarts,
+            'opens': self.opens,
+            'launch_seconds': self.launch_seconds,
+            'saved_seconds': max(0, self.opens - self.launches) * average_launch
+        }
+
+    def print_stats(self):
+        """打印会话统计"""
+        stats = self.stats()
+        print(f"PowerPoint会话: 打开 {stats['opens']} 个演示文稿, 启动 {stats['launches']} 次 "
+              f"(重启 {stats['restarts']} 次), 启动耗时 {stats['launch_seconds']:.2f}秒, "
+              f"约节省 {stats['saved_seconds']:.2f}秒")
+
+    def close(self):
+        """退出PowerPoint"""
+        with self._lock:
+            if self.app is None:
+                return
+            print("关闭PowerPoint应用程序...")
+            try:
+                self.app.Quit()
+                print("PowerPoint应用程序已关闭")
+            except Exception as e:
+                print(f"关闭PowerPoint时出错: {e}")
+            finally:
+                self.app = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -4,24 +4,32 @@ import time
 from moviepy.editor import *
 import pyttsx3
 import re
-import win32com.client
 import sys
 import traceback
 import requests
 import numpy as np
-from PIL import Image as PILImage, ImageDraw as PILImageDraw, ImageFont as PILImageFont  # Rename all PIL imports
+from PIL import Image as PILImage
 import base64
 import json
 import websocket
 import wave
 import threading
+import multiprocessing
 import time
-import hmac
-import hashlib
-import urllib
-from urllib.parse import urlencode
-import datetime
 import ssl  # 添加ssl模块导入
+import asyncio
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, InvalidStateError
+from video_encoder import make_segment, encode_segments, encode_single_segment, concat_segment_files
+from disk_cache import make_cache_key
+from xfyun_client import XFyunWsParam, XFyunAsyncClient, XFYUN_ASYNC_AVAILABLE
+from subtitle_timing import silence_aligned_durations
+from subtitle_render import get_subtitle_font, font_cache_stats, apply_watermark, render_subtitle_band, subtitle_text_color, subtitle_font_name
+from subtitle_export import make_ass_style, collect_subtitle_events, write_subtitle_files, mux_subtitles
+from segment_cache import hash_file, make_segment_cache_key, fetch_cached_segment, store_cached_segment
+from slide_renderer import create_slide_renderer, hash_pptx_slides
+from narration_parser import parse_narrations
+from slide_pipeline import Stage, SlidePipeline, PipelineAborted
 
 # 添加字幕时长估算函数
 def estimate_line_duration(text, cn_char_duration=0.2048, en_word_duration=0.35, en_char_duration=0.1, digit_duration=0.3233, punctuation_factor=0.8251):
@@ -73,7 +81,321 @@ def estimate_line_duration(text, cn_char_duration=0.2048, en_word_duration=0.35,
 
     return line_duration
 
-def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=None, xfyun_params=None, ttsmaker_params=None, subtitle_params=None, pronunciation_dict=None, watermark_params=None):
+# Split text into lines based on punctuation and limit line length
+def split_into_lines(text, max_chars=28):  # 增加默认最大字符数
+    # Split by punctuation first
+    import re
+
+    # 调试输出
+    print(f"原始文本: {text}")
+
+    # 第一步: 首先标记所有可能的产品型号，确保它们不被分割
+    # 扩展产品型号匹配模式，确保一定能捕获"LP6286"这种格式
+    alphanumeric_patterns = []
+
+    # 使用多个特定的模式进行匹配
+    # 1. 标准格式: 字母+数字组合(如LP6286)
+    patterns = [
+        # 常见模式: 字母开头后跟数字(可能包含连字符、下划线或点)
+        r'[A-Za-z]+\d+(?:[A-Za-z0-9\-_\.]*)',
+        # 特殊处理带数字中缀的型号(如TPS7A47)
+        r'[A-Za-z]+\d+[A-Za-z]+\d+',
+        # 特殊处理SOT23-6等封装格式
+        r'SOT\d+-\d+',
+        # 处理以数字开头的型号(如1.8V, 3.3V)
+        r'\d+\.\d+[A-Za-z]+'
+    ]
+
+    # 先把文本复制一份用于处理
+    working_text = text
+
+    # 保存所有匹配到的模式及其位置
+    all_matches = []
+
+    # 用每个模式进行匹配
+    for pattern in patterns:
+        for match in re.finditer(pattern, working_text):
+            matched_text = match.group()
+            start_pos = match.start()
+            end_pos = match.end()
+            all_matches.append((matched_text, start_pos, end_pos))
+            print(f"找到产品型号: '{matched_text}' 位置: {start_pos}-{end_pos}")
+
+    # 按照起始位置降序排序，以避免替换时的位置偏移
+    all_matches.sort(key=lambda x: x[1], reverse=True)
+
+    # 在所有匹配结束后添加去重处理
+    all_matches_unique = []
+    seen_positions = set()
+    for match in all_matches:
+        matched_text, start_pos, end_pos = match
+        position_key = (start_pos, end_pos)  # 创建位置键
+        if position_key not in seen_positions:
+            all_matches_unique.append(match)
+            seen_positions.add(position_key)
+
+    all_matches = all_matches_unique  # 使用去重后的结果
+
+    # 替换所有匹配项为特殊标记
+    protected_text = text
+    replacement_map = {}  # 保存标记到原始文本的映射
+
+    for i, (pattern, start, end) in enumerate(all_matches):
+        marker = f"<P{i}>"
+        replacement_map[marker] = pattern
+        protected_text = protected_text[:start] + marker + protected_text[end:]
+
+    if all_matches:
+        print(f"保护的模式: {[m[0] for m in all_matches]}")
+        print(f"处理后的文本: {protected_text}")
+
+    # 再保护小数点，避免在小数点处断句
+    protected_text = re.sub(r'(\d+)\.(\d+)', r'\1<DECIMAL>\2', protected_text)
+
+    # 按标点分割文本(使用句号、问号等)
+    sentences = re.split(r'([。！？\.!?;；]+)', protected_text)
+
+    # 重组句子和标点
+    proper_sentences = []
+    for i in range(0, len(sentences) - 1, 2):
+        if i + 1 < len(sentences):
+            proper_sentences.append(sentences[i] + sentences[i + 1])
+        else:
+            proper_sentences.append(sentences[i])
+
+    # 处理最后一个元素
+    if len(sentences) % 2 == 1:
+        if proper_sentences:
+            proper_sentences[-1] += sentences[-1]
+        else:
+            proper_sentences.append(sentences[-1])
+
+    # 进一步分割长句子
+    result = []
+    for sentence in proper_sentences:
+        # 检查句子长度，如果短则直接添加
+        if len(sentence) <= max_chars:
+            # 直接恢复所有保护标记并添加
+            restored_sentence = restore_all_markers(sentence, replacement_map)
+            result.append(restored_sentence)
+        else:
+            # 对长句进行再切分，但避免打断保护标记
+            parts = split_with_marker_protection(sentence, max_chars, replacement_map)
+            result.extend(parts)
+
+    # 输出最终分行结果
+    print(f"分行结果 ({len(result)}行):")
+    for i, line in enumerate(result):
+        print(f"  行{i+1}: {line}")
+
+    return result
+
+# 恢复所有特殊标记为原始文本
+def restore_all_markers(text, replacement_map):
+    restored = text
+
+    # 先恢复产品型号标记
+    for marker, original in replacement_map.items():
+        restored = restored.replace(marker, original)
+
+    # 再恢复小数点
+    restored = restored.replace('<DECIMAL>', '.')
+
+    return restored
+
+# 安全地分割长文本，确保不会打断特殊标记
+def split_with_marker_protection(text, max_chars, replacement_map):
+    result_parts = []
+
+    # 先检查是否有保护标记
+    has_protected_markers = any(marker in text for marker in replacement_map.keys())
+
+    # 如果有保护标记，使用更安全的分割方法
+    if has_protected_markers:
+        # 修改：将文本根据逗号分割，但保留逗号作为每段的结尾
+        segments = []
+        last_end = 0
+
+        # 找到所有逗号位置并分段
+        for i, char in enumerate(text):
+            if (char in ',，;；'):
+                segments.append(text[last_end:i+1])  # 包含逗号
+                last_end = i+1
+
+        # 添加最后一段(如果有)
+        if last_end < len(text):
+            segments.append(text[last_end:])
+
+        current_line = ""
+        for segment in segments:
+            # 如果当前行加上这段不会太长
+            if len(current_line + segment) <= max_chars:
+                current_line += segment
+            else:
+                # 保存当前行并开始新行
+                if current_line:
+                    restored_line = restore_all_markers(current_line, replacement_map)
+                    result_parts.append(restored_line)
+
+                # 如果段落本身超过最大长度
+                if len(segment) > max_chars:
+                    # 检查是否包含保护标记
+                    marker_found = False
+                    start_idx = 0
+
+                    # 循环查找每个标记的位置
+                    for marker in replacement_map.keys():
+                        marker_pos = segment.find(marker)
+                        if marker_pos != -1:
+                            marker_found = True
+                            # 如果标记在max_chars附近，特殊处理
+                            if marker_pos < max_chars < marker_pos + len(marker):
+                                # 拆分点在标记之前
+                                restored_before = restore_all_markers(segment[:marker_pos], replacement_map)
+                                if restored_before:
+                                    result_parts.append(restored_before)
+
+                                # 标记和后面的内容放在下一行
+                                remaining = segment[marker_pos:]
+                                # 恢复保护标记
+                                restored_remaining = restore_all_markers(remaining, replacement_map)
+
+                                # 如果剩余部分仍然超长，再次递归分割
+                                if len(restored_remaining) > max_chars:
+                                    sub_parts = split_with_marker_protection(
+                                        restored_remaining, max_chars, {}  # 空映射，因为已经恢复了
+                                    )
+                                    result_parts.extend(sub_parts)
+                                else:
+                                    result_parts.append(restored_remaining)
+
+                                start_idx = len(segment)  # 标记已处理完整个部分
+                                break
+
+                    # 如果没有找到标记或标记位置不需要特殊处理
+                    if not marker_found or start_idx == 0:
+                        # 使用常规分割方法
+                        # 将该部分恢复所有标记后再分割
+                        restored_part = restore_all_markers(segment, replacement_map)
+
+                        # 尝试在空格处分割
+                        space_idx = restored_part.rfind(' ', 0, max_chars)
+                        if space_idx > 0:
+                            result_parts.append(restored_part[:space_idx+1])
+
+                            # 剩余部分如果超长，递归处理
+                            if len(restored_part) - space_idx - 1 > max_chars:
+                                sub_parts = split_with_marker_protection(
+                                    restored_part[space_idx+1:], max_chars, {}
+                                )
+                                result_parts.extend(sub_parts)
+                            else:
+                                result_parts.append(restored_part[space_idx+1:])
+                        else:
+                            # 如果找不到空格，就强制分割，最大程度避开标点符号
+                            segments = []
+
+                            # 查找所有可能的分割点(空格或标点)
+                            potential_breaks = []
+                            for j, char in enumerate(restored_part):
+                                if char in ' ，,。.;；':
+                                    potential_breaks.append(j)
+
+                            current_pos = 0
+                            while current_pos < len(restored_part):
+                                # 寻找最近的不超过max_chars的分割点
+                                next_break = None
+                                for pb in potential_breaks:
+                                    if current_pos < pb < current_pos + max_chars:
+                                        next_break = pb
+
+                                # 如果找到合适的分割点
+                                if next_break is not None:
+                                    segments.append(restored_part[current_pos:next_break+1])
+                                    current_pos = next_break + 1
+                                else:
+                                    # 没有找到合适分割点，只能强制分割
+                                    end_pos = min(current_pos + max_chars, len(restored_part))
+                                    segments.append(restored_part[current_pos:end_pos])
+                                    current_pos = end_pos
+
+                            result_parts.extend(segments)
+                else:
+                    # 段落长度合适，直接恢复标记并添加
+                    restored_part = restore_all_markers(segment, replacement_map)
+                    result_parts.append(restored_part)
+
+                # 重置当前行
+                current_line = ""
+
+        # 处理最后一行
+        if current_line:
+            restored_line = restore_all_markers(current_line, replacement_map)
+            result_parts.append(restored_line)
+    else:
+        # 没有保护标记，使用简单的分割逻辑
+        # 先恢复所有标记
+        restored_text = restore_all_markers(text, replacement_map)
+
+        # 使用修改后的辅助函数
+        result_parts = split_simple_text(restored_text, max_chars)
+
+    return result_parts
+
+# 简单文本分割，不考虑保护标记
+def split_simple_text(text, max_chars):
+    parts = []
+
+    # 修改：将文本根据逗号分割，但保留逗号作为每段的结尾
+    segments = []
+    last_end = 0
+
+    # 找到所有逗号位置并分段
+    for i, char in enumerate(text):
+        if char in ',，':
+            segments.append(text[last_end:i+1])  # 包含逗号
+            last_end = i+1
+
+    # 添加最后一段(如果有)
+    if last_end < len(text):
+        segments.append(text[last_end:])
+
+    current_line = ""
+    for segment in segments:
+        if len(current_line + segment) <= max_chars:
+            current_line += segment
+        else:
+            if current_line:
+                parts.append(current_line)
+
+            # 如果段落本身超过最大长度
+            if len(segment) > max_chars:
+                # 寻找合适的断句点
+                for j in range(0, len(segment), max_chars):
+                    end_idx = min(j + max_chars, len(segment))
+                    chunk = segment[j:end_idx]
+                    parts.append(chunk)
+                current_line = ""
+            else:
+                current_line = segment
+
+    # 添加最后一行
+    if current_line:
+        parts.append(current_line)
+
+    return parts
+
+# 新增函数：移除字符串末尾的标点符号
+def remove_ending_punctuation(text):
+    # 定义中英文标点符号列表
+    punctuation_marks = ['.', '。', ',', '，', '?', '？', '!', '！', ';', '；', ':', '：']
+
+    # 检查字符串是否以标点符号结尾
+    if text and text[-1] in punctuation_marks:
+        return text[:-1]  # 移除最后一个字符
+    return text
+
+def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=None, xfyun_params=None, ttsmaker_params=None, subtitle_params=None, pronunciation_dict=None, watermark_params=None, encoder_params=None, synthesis_params=None, render_params=None):
     """
     Convert PowerPoint presentation to video with narration.
     
@@ -88,12 +410,41 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
     - ttsmaker_params: Dictionary containing TTS Maker parameters (only used if tts_engine is 'ttsmaker')
                     Required keys: 'token', 'voice_id'
     - subtitle_params: Dictionary containing subtitle formatting parameters
-                    Optional keys: 'bg_color', 'font_size', 'font_color'
+                    Optional keys: 'bg_color', 'font_size', 'font_color', 'font_path' (TrueType file, default SimHei),
+                                   'timing_mode' ('estimate', 'precise' or 'silence'; defaults to 'precise' when 'precise_subtitle' is set),
+                                   'lead_pause', 'line_pause', 'tail_pause' (seconds of silence around lines in precise mode),
+                                   'render_backend' ('pil' draws subtitles on the frames, 'ass' burns an ASS track with ffmpeg,
+                                                     'none' leaves the frames clean),
+                                   'sidecar_formats' (e.g. ['srt', 'vtt'], written next to the output video),
+                                   'mux_subtitles' (embed the subtitles as a mov_text track)
     - pronunciation_dict: Dictionary mapping characters to their preferred pronunciation
                     Example: {'压': '鸭', '参': '餐'}
     - watermark_params: Dictionary containing watermark parameters
                     Required keys: 'image_path'
                     Optional keys: 'opacity' (0.0-1.0, default 0.3)
+    - encoder_params: Dictionary containing video encoding parameters
+                    Optional keys: 'backend' ('moviepy', 'ffmpeg_pipe' or 'ffmpeg_still', default 'moviepy'),
+                                   'fps' (default 24), 'fade_out' (seconds, default 0.5),
+                                   'segment_cache' (DiskLRUCache of encoded per-slide segments; unchanged slides are
+                                                    reused and only edited slides are synthesized and encoded)
+                                   'streaming_encode' (encode each slide as soon as it is rendered and concatenate the
+                                                       segments losslessly, default True; False encodes the whole deck at the end),
+                                   'parallel_segments', 'parallel_workers' (slides encoded concurrently),
+                                   'render_workers' (threads rendering subtitle frames, default 2),
+                                   'pipeline_queue_size' (slides buffered between pipeline stages, default 2)
+    - synthesis_params: Dictionary containing speech synthesis options
+                    Optional keys: 'cache' (DiskLRUCache used to reuse synthesized narration audio),
+                                   'max_workers' (concurrent network TTS requests, default 4),
+                                   'xfyun_async' (use the asyncio xfyun client when websockets is installed, default True)
+    - render_params: Dictionary selecting the slide renderer
+                    Optional keys: 'backend' ('powerpoint', 'libreoffice' or 'auto', default 'auto' which uses
+                                              PowerPoint on Windows and headless LibreOffice elsewhere),
+                                   'soffice_path' (LibreOffice executable), 'timeout' (seconds per LibreOffice conversion),
+                                   'raster_workers' (processes rasterizing PDF pages),
+                                   'powerpoint_session' (PowerPointSession kept alive by the caller across a batch;
+                                                         only the presentation is closed at the end of the conversion),
+                                   'export_worker' (SlideExportWorker that opens and exports the deck in a child
+                                                    process and kills it when PowerPoint hangs)
     """
     # Convert paths to absolute paths
     ppt_path = os.path.abspath(ppt_path)
@@ -119,6 +470,11 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
     if not os.path.exists(ppt_path):
         raise FileNotFoundError(f"PowerPoint file not found: {ppt_path}")
     
+    # 语音合成设置
+    if synthesis_params is None:
+        synthesis_params = {}
+    tts_cache = synthesis_params.get('cache')
+    
     # 设置默认字幕参数
     if subtitle_params is None:
         subtitle_params = {}
@@ -126,6 +482,15 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
     font_size = subtitle_params.get('font_size', 30)  # 默认字体大小为30
     bg_color_name = subtitle_params.get('bg_color', '白色半透明')  # 默认背景色
     font_color = subtitle_params.get('font_color', (38, 74, 145))  # 默认字体颜色为深蓝色
+    subtitle_font_path = subtitle_params.get('font_path')  # 为None时使用黑体，其次Arial
+    # 字幕渲染方式: 'pil' 在画面上逐行绘制, 'ass' 生成ASS字幕由ffmpeg在编码时烧录
+    subtitle_render_backend = subtitle_params.get('render_backend', 'pil')
+    # 'none': 画面不绘制字幕，通常配合内嵌字幕轨道或外挂字幕文件使用
+    if subtitle_render_backend not in ('pil', 'ass', 'none'):
+        subtitle_render_backend = 'pil'
+    subtitle_sidecar_formats = subtitle_params.get('sidecar_formats') or []  # 例如 ['srt', 'vtt']
+    subtitle_mux = subtitle_params.get('mux_subtitles', False)  # 以mov_text轨道内嵌字幕
+    subtitle_play_res = (1920, 1080)
     
     # 背景颜色映射
     bg_color_map = {
@@ -139,10 +504,20 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
     # 获取背景颜色
     bg_color = bg_color_map.get(bg_color_name, (255, 255, 255, 200))
     
-    print(f"字幕设置: 背景颜色={bg_color_name}, 字体大小={font_size}, 字体颜色=RGB{font_color}")
+    # 字幕时间轴模式: 'estimate' 按文本估算, 'precise' 逐行合成语音并拼接成整页音频,
+    # 'silence' 在估算基础上按整页音频中的停顿对齐
+    timing_mode = subtitle_params.get('timing_mode') or ('precise' if subtitle_params.get('precise_subtitle', False) else 'estimate')
+    line_pauses = (
+        subtitle_params.get('lead_pause', 0.5),  # 首行之前的停顿(秒)
+        subtitle_params.get('line_pause', 0.3),  # 行与行之间的停顿(秒)
+        subtitle_params.get('tail_pause', 0.6)   # 末行之后的停顿(秒)
+    )
+    
+    print(f"字幕设置: 背景颜色={bg_color_name}, 字体大小={font_size}, 字体颜色=RGB{font_color}, 时间轴模式={timing_mode}")
 
     # 处理水印参数
     watermark_image = None
+    watermark_path = None
     watermark_opacity = 0.3  # 默认透明度
     
     if watermark_params and 'image_path' in watermark_params:
@@ -159,26 +534,15 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
             print(f"加载水印图片时出错: {e}")
             watermark_image = None
 
-    # Create PowerPoint application
-    ppt_app = None
-    presentation = None
-    audio_clips = []  # Keep track of audio clips to ensure proper cleanup
+    # 幻灯片渲染后端: Windows上为PowerPoint，其他平台为无界面的LibreOffice
+    renderer = None
     
     try:
-        print(f"启动PowerPoint应用程序...")
-        ppt_app = win32com.client.Dispatch("PowerPoint.Application")
-        # 不要设置 Visible = False，这会导致错误
-        # 让 PowerPoint 保持可见状态运行
-        print(f"PowerPoint应用程序启动成功")
-        
-        # Open the presentation
-        print(f"打开演示文稿: {ppt_path}")
-        # 移除 WithWindow=False 参数，使用默认参数打开演示文稿
-        presentation = ppt_app.Presentations.Open(ppt_path)
-        print(f"演示文稿打开成功，开始处理...")
+        renderer = create_slide_renderer(render_params)
+        renderer.open(ppt_path)
         
         # Get total number of slides
-        total_slides = presentation.Slides.Count
+        total_slides = renderer.slide_count
         print(f"演示文稿共有 {total_slides} 张幻灯片")
         
         # 总幻灯片数保持不变，但注意python下标从0开始，所以最后一页的下标为total_slides-1
@@ -190,12 +554,9 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
         
         # Extract narration from the narration slide (default: last slide)
         print(f"从第 {narration_slide_index+1} 张幻灯片提取旁白文字...")  # 日志显示页码从1开始
-        narration_slide = presentation.Slides[narration_slide_index]
         narration_text = ""
         try:
-            for shape in narration_slide.Shapes:
-                if shape.HasTextFrame:
-                    narration_text += shape.TextFrame.TextRange.Text + "\n"
+            narration_text = renderer.slide_text(narration_slide_index)
         except Exception as e:
             print(f"提取文字时出错: {e}")
             
@@ -205,299 +566,193 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
         print("打印所有幻灯片数量和索引信息:")
         print(f"PowerPoint报告总幻灯片数: {total_slides}")
         for i in range(0, total_slides):
-            try:
-                slide = presentation.Slides[i]  # 直接使用0-based下标
-                slide_name = f"Slide {i+1}"
-                print(f"  索引 {i} -> 第 {i+1} 页: {slide_name}")
-            except Exception as e:
-                print(f"  索引 {i}: 访问出错 - {str(e)}")
+            slide_name = f"Slide {i+1}"
+            print(f"  索引 {i} -> 第 {i+1} 页: {slide_name}")
 
         # 确定要处理的幻灯片范围 - 处理除最后一页外的所有幻灯片
         slides_to_process = list(range(0, total_slides - 1))  # 从0到total_slides-2
         print(f"将处理以下幻灯片 (下标)： {slides_to_process}")
         
-        # 尝试识别格式化模式 - 检测是否使用"pageX"的格式
-        page_pattern = re.compile(r'page(\d+)\s*[:：]\s*(.+?)(?=page\d+\s*[:：]|$)', re.DOTALL | re.IGNORECASE)
-        page_matches = page_pattern.findall(narration_text)
-        
-        # Parse narration text to match with slides
-        narrations = {}  # 使用字典存储页码对应的旁白
-        raw_narrations = {}  # 用于保存原始文本，不带"page n"前缀
-        
-        # 如果找到"pageX"格式的内容，直接使用它们
-        if page_matches:
-            print("检测到page格式的旁白标记")
-            
-            # 对匹配结果按页码排序
-            sorted_matches = sorted(page_matches, key=lambda x: int(x[0]))
-            
-            # 详细打印页面匹配情况
-            page_numbers = [int(match[0]) for match in sorted_matches]
-            print(f"找到以下页面标记: {page_numbers}")
-            
-            # 检查是否缺少页码标记
-            all_slides_indices = set(slides_to_process)
-            
-            # 更正：从pageX转换为PowerPoint索引
-            # 现在“page1”对应下标0
-            found_slides = set(int(match[0]) - 1 for match in sorted_matches)
-            missing_pages = all_slides_indices - found_slides
-            
-            if missing_pages:
-                # print(f"警告: 以下PPT索引缺少旁白标记: {sorted(missing_pages)}")
-                # print("将为这些页面使用默认文本")
-                error_msg = f"错误: 以下PPT索引缺少旁白标记: {missing_pages}"
-                print(error_msg)
-                raise ValueError(error_msg)
-            
-            # 保存文本，去掉"page n"前缀
-            for match in sorted_matches:
-                page_num = int(match[0])  # "pageX"中的X
-                text = match[1].strip()
-                
-                # 使用页码作为PowerPoint的slide索引（"page1"对应下标0）
-                ppt_slide_idx = page_num - 1
-                print(f"为幻灯片索引 {ppt_slide_idx} (对应page{page_num})设置旁白")
-                narrations[ppt_slide_idx] = text
-                raw_narrations[ppt_slide_idx] = text
-
-        else:
-            # 尝试其他拆分模式
-            slide_texts = re.split(r'(?:Slide\s+\d+[\.:]|^\d+[\.:])\s*', narration_text, flags=re.MULTILINE)
-            # 清理提取的文本
-            narrations = [text.strip() for text in slide_texts if text.strip()]
-            raw_narrations = narrations.copy()  # 在这种情况下，原始文本和处理后的文本相同
-            
-            # 如果没有找到匹配的模式，尝试按行拆分
-            if len(narrations) <= 1 or len(narrations) != total_slides - 1:
-                error_msg = f"错误: 旁白数量 ({len(narrations)}) 与要处理的幻灯片数量 ({len(total_slides - 1)}) 不匹配!"
-                print(error_msg)
-                raise ValueError(error_msg)
-                # lines = [line.strip() for line in narration_text.split('\n') if line.strip()]
-                # if len(lines) >= total_slides - 1:
-                #     narrations = lines[:total_slides - 1]  # 仅使用与幻灯片数量匹配的行数
-                # else:
-                #     # 如果仍然没有足够的旁白，重复可用的或使用占位符
-                #     if len(narrations) > 0:
-                #         temp_narrations = []
-                #         for i in range(total_slides - 1):
-                #             temp_narrations.append(narrations[i % len(narrations)])
-                #         narrations = temp_narrations
-                #     else:
-                #         narrations = ["这是第 {} 张幻灯片".format(i+1) for i in range(total_slides - 1)]
-        
-        # 清理所有旁白文本中可能存在的"page n:"格式
-        for page_num in narrations.keys():
-            # 使用正则表达式移除"page n:"或"page n：" 的模式 - 同样忽略大小写
-            narrations[page_num] = re.sub(r'^page\s*\d+[:：]\s*', '', narrations[page_num], flags=re.IGNORECASE)
-            raw_narrations[page_num] = narrations[page_num]
-            print(f"幻灯片 {page_num} 的旁白: {narrations[page_num][:30]}{'...' if len(narrations[page_num]) > 30 else ''}")
-        
-        print(f"解析得到 {len(narrations)} 段旁白文字")
-        
-        # 强化检查: 在自动填充默认旁白前，先检查旁白数量是否匹配幻灯片数量
-        if len(narrations) != len(slides_to_process):
-            error_message = (
-                f"错误: 旁白数量 ({len(narrations)}) 与要处理的幻灯片数量 ({len(slides_to_process)}) 不匹配!\n"
-                f"请检查PPT最后一页的旁白文本格式，确保:\n"
-                f"1. 每个幻灯片都有对应的旁白文本 (当前旁白不足)\n"
-                f"2. 没有多余的旁白文本 (当前旁白过多)\n"
-                f"3. 如使用page标记，确保编号与实际幻灯片数量一致"
-            )
-            print("\n" + "!"*50)
-            print(error_message)
-            print("!"*50 + "\n")
-            # 抛出异常，中止处理当前文件
-            raise ValueError(error_message)
-            
-        # 为缺失的幻灯片自动添加旁白（如果严格检查已通过，这里只是为了向后兼容）
-        # 实际上在上面的检查通过后，这里不应该再有缺失
-        missing_narrations = []
-        for slide_idx in slides_to_process:
-            if slide_idx not in narrations:
-                missing_narrations.append(slide_idx)
-                default_text = f"这是第 {slide_idx+1} 张幻灯片"
-                narrations[slide_idx] = default_text
-                raw_narrations[slide_idx] = default_text
-                print(f"幻灯片 {slide_idx} 使用默认旁白文本: {default_text}")
-                
-        if missing_narrations:
-            print(f"警告: 自动为 {len(missing_narrations)} 个缺失旁白的幻灯片添加了默认文本")
-        
-        # 打印slide索引和narration的对应关系，帮助调试
-        print("幻灯片索引与旁白对应关系:")
-        for slide_idx in sorted(narrations.keys()):
-            print(f"  幻灯片索引 {slide_idx} -> 旁白: {narrations[slide_idx][:30]}{'...' if len(narrations[slide_idx]) > 30 else ''}")
+        # 解析旁白并检查数量，与批量预检使用同一套规则
+        narrations = parse_narrations(narration_text, total_slides)
+        raw_narrations = dict(narrations)  # 原始文本，不带"page n"前缀
             
         # Create temporary directory for slide images and audio files
         temp_dir = tempfile.mkdtemp()  # Using mkdtemp instead of TemporaryDirectory to avoid auto-cleanup issues
         try:
             print(f"创建临时目录: {temp_dir}")
-            
-            # Save slides as images
-            print("导出幻灯片为图片...")
-            for processed_idx, ppt_idx in enumerate(slides_to_process, 1):
-                try:
 
-                    slide = presentation.Slides[ppt_idx]
-                    slide_name = f"Slide {ppt_idx+1}"
-                    print(f"正在导出 PPT索引 {ppt_idx} (第 {ppt_idx+1} 页, {slide_name}) -> 处理序号 {processed_idx}")
-                    
-                    img_path = os.path.join(temp_dir, f"slide_{processed_idx}.png")
-                    
-                    # 导出前切换到该幻灯片
-                    presentation.Windows(1).View.GotoSlide(ppt_idx+1)
-                    time.sleep(0.5)
-                    
-                    # 导出幻灯片
-                    slide.Export(img_path, "PNG", 1920, 1080)
-                    print(f"导出幻灯片 {processed_idx}/{len(slides_to_process)} 成功 (第 {ppt_idx+1} 页)")
-                except Exception as e:
-                    print(f"导出幻灯片 PPT索引 {ppt_idx} 失败: {e}")
-                    print(traceback.format_exc())
-                    # 尝试使用替代方法导出
-                    try:
-                        print(f"尝试使用替代方法导出幻灯片 {ppt_idx}...")
-                        # 尝试使用PrintOut方法或其他屏幕截图方法
-                        # 这里我们简单地生成一个空白图片作为替代
-                        img = PILImage.new('RGB', (800, 600), color=(255, 255, 255))
-                        d = PILImageDraw.Draw(img)
-                        d.text((400, 300), f"幻灯片 {ppt_idx}", fill=(0, 0, 0))
-                        img.save(img_path)
-                        print(f"使用替代方法导出幻灯片 {ppt_idx} 成功")
-                    except Exception as e2:
-                        print(f"替代方法也失败: {e2}")
-                        raise
-            
-            # Close PowerPoint
-            print("关闭PowerPoint应用程序...")
-            if presentation:
-                presentation.Close()
-            if ppt_app:
-                ppt_app.Quit()
-            presentation = None
-            ppt_app = None
-            print("PowerPoint应用程序已关闭")
-            
-            clips = []
-            
-            # Process each slide that needs to be included in the video
-            print("开始生成音频...")
             # 创建一个映射表，记录处理序号到PPT索引的关系
             idx_to_ppt_map = {idx+1: ppt_idx for idx, ppt_idx in enumerate(slides_to_process)}
-            for processed_idx in range(1, len(slides_to_process) + 1):
+            last_processed_idx = len(slides_to_process)
+
+            # 增量渲染: 每页成片按内容哈希缓存，未改动的页面跳过语音合成和编码
+            encoder_params = dict(encoder_params or {})
+            segment_cache = encoder_params.get('segment_cache')
+            segment_render_fields = {
+                'timing_mode': timing_mode,
+                'line_pauses': line_pauses,
+                'subtitle': [font_size, bg_color_name, font_color, subtitle_font_path, subtitle_render_backend],
+                'watermark': [hash_file(watermark_path), watermark_opacity] if watermark_image is not None else None,
+                'encoder': [encoder_params.get('backend', 'moviepy'), encoder_params.get('fps'),
+                            encoder_params.get('fade_out')],
+                # 子进程导出时 renderer.name 为 'worker'，按实际的渲染后端区分
+                'renderer': renderer.backend
+            }
+            # pptx按文件内容计算各页的哈希，导出前即可查询片段缓存，命中的页面不再合成语音；
+            # 无法解析的文件(例如旧版.ppt)在导出后按图片查询
+            slide_hashes = None
+            if segment_cache is not None and zipfile.is_zipfile(ppt_path):
+                try:
+                    slide_hashes = hash_pptx_slides(ppt_path)
+                    if len(slide_hashes) != total_slides:
+                        print(f"幻灯片内容哈希的页数 ({len(slide_hashes)}) 与演示文稿不一致，改为按导出的图片查询片段缓存")
+                        slide_hashes = None
+                except Exception as e:
+                    print(f"计算幻灯片内容哈希失败，改为按导出的图片查询片段缓存: {e}")
+
+            if subtitle_render_backend == 'ass':
+                # 字幕样式与PIL绘制时使用的字体、颜色和背景一致；幻灯片按1920x1080导出
+                encoder_params['subtitle_style'] = make_ass_style(
+                    font_name=subtitle_font_name(font_size, subtitle_font_path),
+                    font_size=font_size,
+                    font_color=subtitle_text_color(font_color, bg_color_name),
+                    bg_color=bg_color,
+                    play_res=subtitle_play_res,
+                    fonts_dir=os.path.dirname(subtitle_font_path) if subtitle_font_path and os.path.isabs(subtitle_font_path) else None
+                )
+
+            # 流水线各阶段的并行数: 语音由 NarrationSynthesizer 在后台统一合成(所有页面合计不超过 max_workers)，
+            # 语音合成阶段只取回结果、拼接各行音频
+            synthesis_workers = synthesis_params.get('max_workers', 4)
+            tts_workers = max(1, min(synthesis_workers, last_processed_idx))
+            render_workers = encoder_params.get('render_workers', 2)
+            queue_size = encoder_params.get('pipeline_queue_size', 2)
+            # 逐页编码: 每页渲染完成后立即单独编码，最后无损拼接；关闭时所有页面渲染完后再整体编码
+            streaming_encode = encoder_params.get('streaming_encode', True)
+            encode_workers = 1
+            if encoder_params.get('parallel_segments', False):
+                encode_workers = encoder_params.get('parallel_workers') or multiprocessing.cpu_count()
+            encode_threads = max(1, multiprocessing.cpu_count() // encode_workers) if encode_workers > 1 else None
+            encode_pool = None
+            if streaming_encode and encode_workers > 1:
+                # moviepy逐帧处理受GIL限制，并行编码放到进程池中，流水线线程只负责提交和等待；
+                # 此时已有流水线和语音合成线程，用spawn启动子进程，避免fork复制其他线程持有的锁
+                encode_pool = ProcessPoolExecutor(max_workers=encode_workers, mp_context=multiprocessing.get_context('spawn'))
+                print(f"逐页编码: {encode_workers} 个进程，每个进程 {encode_threads} 个编码线程")
+            # 片段缓存在主进程中读写，不传给编码进程
+            pool_encoder_params = {key: value for key, value in encoder_params.items() if key != 'segment_cache'}
+            segments_dir = os.path.join(temp_dir, "segments")
+            os.makedirs(segments_dir, exist_ok=True)
+
+            def prepare_slide(processed_idx):
+                """整理一页的语音合成任务；旁白解析完成后即可进行，不依赖导出的图片"""
                 ppt_idx = idx_to_ppt_map[processed_idx]
-                img_path = os.path.join(temp_dir, f"slide_{processed_idx}.png")
-                
-                if not os.path.exists(img_path):
-                    print(f"警告: 幻灯片图片不存在: {img_path}")
-                    continue
-                    
-                # 使用PPT页码获取旁白文本
                 text_to_speak = narrations.get(ppt_idx, f"这是第 {ppt_idx+1} 张幻灯片")
-                subtitle_text = raw_narrations.get(ppt_idx, text_to_speak)
-                
-                print(f"处理幻灯片 {processed_idx}/{len(slides_to_process)} (对应PPT索引 {ppt_idx})")
-                
+                tts_text, engine_text = prepare_tts_text(text_to_speak, tts_engine, xfyun_params, pronunciation_dict)
                 audio_path = os.path.join(temp_dir, f"audio_{processed_idx}.mp3")
-                
-                # 生成用于语音合成的文本，应用多音字替换规则
-                tts_text = text_to_speak
-                if pronunciation_dict:
-                    # 应用所有替换规则
-                    for original, replacement in pronunciation_dict.items():
-                        tts_text = tts_text.replace(original, replacement)
-                    
-                    # 记录替换情况
-                    if tts_text != text_to_speak:
-                        print(f"已应用多音字优化，共替换 {sum(text_to_speak.count(orig) for orig in pronunciation_dict.keys())} 处")
-                
-                # Generate audio using the selected TTS engine
-                audio_generated = False
-                audio_clip = None
-                
-                # 先尝试使用指定的TTS引擎
+                slide = {
+                    'index': processed_idx,
+                    'ppt_idx': ppt_idx,
+                    'img_path': os.path.join(temp_dir, f"slide_{processed_idx}.png"),
+                    'audio_path': audio_path,
+                    'narration': raw_narrations.get(ppt_idx, text_to_speak),
+                    'tts_key': make_tts_cache_key(tts_text, tts_engine, xfyun_params, ttsmaker_params),
+                    'line_timings': None,
+                    'line_jobs': None
+                }
+                page_job = {
+                    'index': processed_idx,
+                    'tts_text': tts_text,
+                    'engine_text': engine_text,
+                    'audio_path': audio_path
+                }
+                slide['page_job'] = page_job
+                slide['tts_jobs'] = [page_job]
+                if processed_idx != last_processed_idx:
+                    lines = split_into_lines(slide['narration']) or [""]
+                    slide['lines'] = lines
+                    if timing_mode == 'precise':
+                        # 精准字幕模式下不合成整页音频，而是逐行合成一次，之后拼接成整页音轨
+                        line_jobs = []
+                        for i, line in enumerate(lines):
+                            line_text = line.strip()
+                            if not line_text:
+                                line_jobs.append(None)
+                                continue
+                            # 行间停顿在拼接时插入，送入引擎的文本不再添加停顿标记
+                            line_tts_text, _ = prepare_tts_text(line_text, tts_engine, xfyun_params, pronunciation_dict)
+                            line_jobs.append({
+                                'index': f"{processed_idx}-{i+1}",
+                                'tts_text': line_tts_text,
+                                'engine_text': line_tts_text,
+                                'audio_path': os.path.join(temp_dir, f"line_audio_{processed_idx}_{i}.mp3")
+                            })
+                        slide['line_jobs'] = line_jobs
+                        slide['tts_jobs'] = [job for job in line_jobs if job is not None]
+                return slide
+
+            def lookup_cached_segment(slide, slide_hash):
+                """按幻灯片内容的哈希查询片段缓存，命中时返回True"""
+                processed_idx = slide['index']
+                slide['cache_key'] = make_segment_cache_key(
+                    slide_hash,
+                    slide['tts_key'],
+                    processed_idx == last_processed_idx,
+                    dict(segment_render_fields, narration=slide['narration'])
+                )
+                cached_segment = fetch_cached_segment(segment_cache, slide['cache_key'], processed_idx, segments_dir)
+                if cached_segment is None:
+                    return False
+                print(f"幻灯片 {processed_idx} 未改动，复用缓存的视频片段")
+                slide['cached_segment'] = cached_segment
+                return True
+
+            def synthesize_slide(processed_idx):
+                """语音合成阶段: 取回后台合成的音频(精准字幕模式下拼接各行音频)"""
+                slide = slides[processed_idx]
+                img_path = slide['img_path']
+                audio_path = slide['audio_path']
+                if not os.path.exists(img_path):
+                    print(f"警告: 幻灯片图片不存在: {img_path}")
+                    if processed_idx in tts_futures:
+                        tts_futures[processed_idx].cancel()
+                    return None
+                if 'cached_segment' in slide:
+                    return slide
+
+                if segment_cache is not None and 'cache_key' not in slide:
+                    # 导出前无法计算内容哈希，按导出的图片查询，未命中时才合成语音
+                    if lookup_cached_segment(slide, hash_file(img_path)):
+                        return slide
+                if processed_idx not in tts_futures:
+                    tts_futures[processed_idx] = synthesizer.submit(processed_idx, slide['tts_jobs'])
+
+                print(f"取回幻灯片 {processed_idx}/{last_processed_idx} 的音频 (对应PPT索引 {slide['ppt_idx']})")
+                tts_results = tts_futures[processed_idx].result()
+                line_jobs = slide['line_jobs']
+                page_job = slide['page_job']
+                if line_jobs is not None:
+                    slide['line_timings'] = build_line_audio_track(line_jobs, tts_results, audio_path, line_pauses, tts_cache=tts_cache)
+                    audio_generated = slide['line_timings'] is not None
+                else:
+                    audio_generated = tts_results.get(processed_idx, False)
+                # 只缓存用选定引擎正常生成的片段，回退到系统TTS或无字幕的片段下次重新生成
+                slide['cacheable'] = audio_generated
+
                 try:
-                    if tts_engine.lower() == "xfyun" and xfyun_params:
-                        # 使用科大讯飞语音合成
-                        try:
-                            # 获取发音人
-                            voice_name = xfyun_params.get('voice_name', 'xiaoyan')
-                            
-                            # 添加停顿标记 - 根据不同发音人使用不同方式
-                            text_with_pause = tts_text
-                            cssml_voices = ['xiaoyan', 'xiaoyu', 'xiaofeng', 'xiaoqi', 'catherine', 'mary']
-                            
-                            # 检查是否需要使用CSSML方式添加停顿
-                            if voice_name in cssml_voices:
-                                # CSSML方式：添加<break>标签（开头和结尾）
-                                text_with_pause = '<break time="500ms"/>' + text_with_pause + '<break time="600ms"/>'
-                                # 设置ttp参数为cssml
-                                xfyun_params['ttp'] = 'cssml'
-                            else:
-                                # 简单标记方式：添加[p500]和[p600]
-                                text_with_pause =  '[p200]' + text_with_pause + '[p1000]'
-                            
-                            print(f"为旁白添加停顿标记，使用{'CSSML' if voice_name in cssml_voices else '简单'}标记方式")
-                            print(f"每页结尾添加600ms的停顿")
-                            
-                            tts_result = xfyun_tts(
-                                text_with_pause, 
-                                audio_path, 
-                                xfyun_params.get('app_id', ''), 
-                                xfyun_params.get('api_key', ''),
-                                xfyun_params.get('api_secret', ''),
-                                voice=voice_name,
-                                speed=xfyun_params.get('speed', 50),  # 使用可选的speed参数
-                                ttp=xfyun_params.get('ttp', 'text')  # 传递ttp参数
-                            )
-                            if tts_result:
-                                print(f"使用科大讯飞TTS生成音频成功")
-                                audio_generated = True
-                            else:
-                                print(f"科大讯飞TTS失败，将尝试使用系统TTS...")
-                        except Exception as xfyun_error:
-                            print(f"科大讯飞TTS失败，错误: {xfyun_error}，将尝试使用系统TTS...")
-                    
-                    elif tts_engine.lower() == "ttsmaker" and ttsmaker_params:
-                        # 使用马克配音TTS语音合成
-                        try:
-                            # 获取token和voice_id
-                            token = ttsmaker_params.get('token', 'ttsmaker_demo_token')
-                            voice_id = ttsmaker_params.get('voice_id', 1504)
-                            audio_speed = ttsmaker_params.get('audio_speed', 1.0)  # 获取语速参数
-                            
-                            print(f"使用马克配音TTS生成音频，voice_id: {voice_id}, 语速: {audio_speed}")
-                            
-                            tts_result = ttsmaker_tts(
-                                tts_text, 
-                                audio_path, 
-                                token=token,
-                                voice_id=voice_id,
-                                audio_speed=audio_speed  # 将语速参数传递给TTS函数
-                            )
-                            if tts_result:
-                                print(f"使用马克配音TTS生成音频成功")
-                                audio_generated = True
-                            else:
-                                print(f"马克配音TTS失败，将尝试使用系统TTS...")
-                        except Exception as ttsmaker_error:
-                            print(f"马克配音TTS失败，错误: {ttsmaker_error}，将尝试使用系统TTS...")
-                    
                     # 如果其他TTS失败或者原本就选择了系统TTS
-                    if not audio_generated or tts_engine.lower() == "pyttsx3":
-                        engine = pyttsx3.init()
-                        engine.save_to_file(tts_text, audio_path)
-                        engine.runAndWait()
+                    if not audio_generated:
+                        if tts_engine.lower() != "pyttsx3":
+                            print(f"{tts_engine} TTS失败，将尝试使用系统TTS...")
+                        with _system_tts_lock:
+                            synthesize_speech(page_job['tts_text'], audio_path, "pyttsx3", tts_cache=tts_cache)
                         print(f"使用系统TTS生成音频成功")
                         audio_generated = True
-                    
-                    # 等待文件写入完成
-                    time.sleep(1.0)
-                    
+
                     if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
                         raise FileNotFoundError("音频文件未生成或为空")
-                        
+
                 except Exception as e:
                     print(f"生成音频时出错: {e}")
                     print(traceback.format_exc())
@@ -511,617 +766,145 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
                         audio_generated = True
                     except Exception as silent_error:
                         print(f"创建无声音频失败: {silent_error}")
-                
-                if audio_generated:
+
+                slide['audio_generated'] = audio_generated
+                return slide
+
+            def render_slide(slide):
+                """渲染阶段: 按音频时长生成字幕画面，返回该页的片段"""
+                if 'cached_segment' in slide:
+                    return slide['cached_segment']
+                if not slide['audio_generated']:
+                    return None
+
+                processed_idx = slide['index']
+                ppt_idx = slide['ppt_idx']
+                img_path = slide['img_path']
+                audio_path = slide['audio_path']
+                line_timings = slide['line_timings']
+                segment_cacheable = slide['cacheable']
+                print(f"处理幻灯片 {processed_idx}/{last_processed_idx} (对应PPT索引 {ppt_idx})")
+
+                try:
+                    # Calculate duration based on audio length
+                    # 读取时长后立即关闭，不在整个转换期间占用ffmpeg读取进程和音频文件
+                    audio_clip = AudioFileClip(audio_path)
                     try:
-                        # Calculate duration based on audio length
-                        audio_clip = AudioFileClip(audio_path)
-                        audio_clips.append(audio_clip)  # Store for later cleanup
                         duration = audio_clip.duration
-                        
-                        print(f"音频时长: {duration}秒")
-                        
-                        # 检查是否为最后一页PPT，最后一页不添加字幕
-                        is_last_slide = (processed_idx == len(slides_to_process))
-                        
-                        if is_last_slide:
-                            # 最后一页PPT只播放声音，不显示字幕
-                            print(f"处理最后一页PPT (索引 {ppt_idx})：只有语音，无字幕")
-                            # 根据TTS引擎来决定是否需要剪裁音频
-                            if tts_engine.lower() == "xfyun":
-                                # 当使用科大讯飞TTS时，将原始音频剪去最后1秒
-                                # audio_duration = audio_clip.duration
-                                # if audio_duration > 1:
-                                #     trimmed_audio_clip = audio_clip.subclip(0, audio_duration - 1)
-                                #     print(f"使用科大讯飞TTS，剪裁最后1秒音频，从 {audio_duration}秒 减至 {trimmed_audio_clip.duration}秒")
-                                # else:
-                                #     trimmed_audio_clip = audio_clip  # 若音频长度小于等于1秒，则不剪裁
-                                #     print(f"使用科大讯飞TTS，音频时长不足1秒，保持原长度 {audio_duration}秒")
-                                
-                                # # 图像时长也相应减少1秒
-                                # img_clip = ImageClip(img_path).set_duration(trimmed_audio_clip.duration)
-                                
-                                # # 组合成视频片段
-                                # video_clip = img_clip.set_audio(trimmed_audio_clip)
-
-                                # 其他TTS引擎使用完整音频
-                                print(f"使用 {tts_engine} TTS，保持完整音频时长 {audio_clip.duration}秒")
-                                img_clip = ImageClip(img_path).set_duration(audio_clip.duration)
-                                video_clip = img_clip.set_audio(audio_clip)
-                            else:
-                                # 其他TTS引擎使用完整音频
-                                print(f"使用 {tts_engine} TTS，保持完整音频时长 {audio_clip.duration}秒")
-                                img_clip = ImageClip(img_path).set_duration(audio_clip.duration)
-                                video_clip = img_clip.set_audio(audio_clip)
+                    finally:
+                        audio_clip.close()
+                    
+                    print(f"音频时长: {duration}秒")
+                    
+                    # 检查是否为最后一页PPT，最后一页不添加字幕
+                    is_last_slide = (processed_idx == len(slides_to_process))
+                    
+                    if is_last_slide:
+                        # 最后一页PPT只播放声音，不显示字幕
+                        print(f"处理最后一页PPT (索引 {ppt_idx})：只有语音，无字幕")
+                        # 根据TTS引擎来决定是否需要剪裁音频
+                        if tts_engine.lower() == "xfyun":
+                            # 当使用科大讯飞TTS时，将原始音频剪去最后1秒
+                            # audio_duration = audio_clip.duration
+                            # if audio_duration > 1:
+                            #     trimmed_audio_clip = audio_clip.subclip(0, audio_duration - 1)
+                            #     print(f"使用科大讯飞TTS，剪裁最后1秒音频，从 {audio_duration}秒 减至 {trimmed_audio_clip.duration}秒")
+                            # else:
+                            #     trimmed_audio_clip = audio_clip  # 若音频长度小于等于1秒，则不剪裁
+                            #     print(f"使用科大讯飞TTS，音频时长不足1秒，保持原长度 {audio_duration}秒")
+                            
+                            # # 图像时长也相应减少1秒
+                            # img_clip = ImageClip(img_path).set_duration(trimmed_audio_clip.duration)
+                            
+                            # # 组合成视频片段
+                            # video_clip = img_clip.set_audio(trimmed_audio_clip)
 
-                            clips.append(video_clip)
+                            # 其他TTS引擎使用完整音频
+                            print(f"使用 {tts_engine} TTS，保持完整音频时长 {duration}秒")
+                            segment = make_segment(processed_idx, [(PILImage.open(img_path).convert('RGB'), duration)], audio_path, duration)
                         else:
-                            # 非最后一页，正常添加字幕
-                            # Use a simpler subtitle method with direct PIL drawing on the image
-                            try:
-                                # Load image and create a copy to draw on
-                                base_image = PILImage.open(img_path)
-                                
-                                # Function to apply watermark to an image
-                                def add_watermark_to_image(image, watermark, opacity=0.3):
-                                    if watermark is None:
-                                        return image
-                                        
-                                    # Make a copy of the image to avoid modifying the original
-                                    result = image.copy()
-                                    
-                                    # Check if we should fill the screen with watermark
-                                    
-                                    # Resize the watermark to match the image dimensions exactly
-                                    new_size = (result.width, result.height)
-                                    watermark = watermark.resize(new_size, PILImage.LANCZOS)
-                                    #print(f"水印已调整为铺满屏幕: {new_size[0]}x{new_size[1]}")
+                            # 其他TTS引擎使用完整音频
+                            print(f"使用 {tts_engine} TTS，保持完整音频时长 {duration}秒")
+                            segment = make_segment(processed_idx, [(PILImage.open(img_path).convert('RGB'), duration)], audio_path, duration)
 
-                                    
-                                    # Create an RGBA version of the watermark
-                                    if watermark.mode != 'RGBA':
-                                        watermark = watermark.convert('RGBA')
-                                    
-                                    # Create a transparent layer for compositing
-                                    transparent = PILImage.new('RGBA', result.size, (0, 0, 0, 0))
-                                    
-                                    # Calculate position to center the watermark
-                                    position = ((result.width - watermark.width) // 2,
-                                               (result.height - watermark.height) // 2)
-                                    
-                                    # Apply the watermark with desired opacity
-                                    # Adjust alpha channel
-                                    watermark_with_opacity = watermark.copy()
-                                    alpha = watermark_with_opacity.split()[3]
-                                    alpha = alpha.point(lambda x: int(x * opacity))
-                                    watermark_with_opacity.putalpha(alpha)
-                                    
-                                    # Paste watermark onto transparent layer
-                                    transparent.paste(watermark_with_opacity, position, watermark_with_opacity)
-                                    
-                                    # Convert result to RGBA if needed
-                                    if result.mode != 'RGBA':
-                                        result = result.convert('RGBA')
-                                    
-                                    # Composite the images
-                                    result = PILImage.alpha_composite(result, transparent)
-                                    
-                                    # Convert back to RGB if original was RGB
-                                    if image.mode == 'RGB':
-                                        result = result.convert('RGB')
-                                        
-                                    return result
-                                
-                                # 修改原来的 add_subtitles_to_image 函数，增加水印功能
-                                def add_subtitles_to_image(image, text, font_size=28, bg_color=None, bg_color_name='白色半透明', font_color=(38, 74, 145)):
-                                    # Make a copy to avoid modifying the original
-                                    img_with_text = image.copy()
-                                    
-                                    # Apply watermark if available
-                                    if watermark_image is not None:
-                                        img_with_text = add_watermark_to_image(img_with_text, watermark_image, watermark_opacity)
-                                        
-                                    draw = PILImageDraw.Draw(img_with_text)
-                                    
-                                    # Rest of original function remains the same
-                                    try:
-                                        font = PILImageFont.truetype('simhei.ttf', font_size)
-                                    except Exception:
-                                        try:
-                                            font = PILImageFont.truetype('arial.ttf', font_size)
-                                        except Exception:
-                                            font = PILImageFont.load_default()
-                                    
-                                    # Get text dimensions
-                                    if hasattr(font, 'getbbox'):
-                                        bbox = font.getbbox(text)
-                                        text_width = bbox[2] - bbox[0]
-                                        text_height = bbox[3] - bbox[1]
-                                    else:
-                                        text_width, text_height = font.getsize(text)
-                                    
-                                    # Position at bottom center
-                                    x_pos = (image.width - text_width) // 2
-                                    y_pos = image.height - text_height - 30
-                                    
-                                    # Draw background (仅当选择了背景颜色时)
-                                    if bg_color is not None:  # 根据设置决定是否绘制背景
-                                        bg_padding = 10
-                                        bg_left = x_pos - bg_padding
-                                        bg_right = x_pos + text_width + bg_padding
-                                        bg_top = y_pos - 5
-                                        bg_bottom = y_pos + text_height + 5
-                                        draw.rectangle([bg_left, bg_top, bg_right, bg_bottom], fill=bg_color)
-                                    
-                                    # Draw text (使用指定的字体颜色)
-                                    text_color = font_color
-                                    
-                                    # 根据背景调整文本颜色以确保足够的对比度
-                                    if bg_color_name in ['黑色半透明', '蓝色半透明']:
-                                        # 如果是深色背景但字体颜色也很深，则自动调整为白色
-                                        r, g, b = font_color
-                                        brightness = (0.299 * r + 0.587 * g + 0.114 * b) / 255
-                                        if brightness < 0.5:  # 如果字体颜色较暗
-                                            text_color = (255, 255, 255)  # 使用白色代替
-                                            print(f"自动调整字体颜色为白色，以提高在深色背景上的可见度")
-                                            
-                                    draw.text((x_pos, y_pos), text, fill=text_color, font=font)
-                                    
-                                    return img_with_text
-                                
-                                # Split text into lines based on punctuation and limit line length
-                                def split_into_lines(text, max_chars=28):  # 增加默认最大字符数
-                                    # Split by punctuation first
-                                    import re
-                                    
-                                    # 调试输出
-                                    print(f"原始文本: {text}")
-                                    
-                                    # 第一步: 首先标记所有可能的产品型号，确保它们不被分割
-                                    # 扩展产品型号匹配模式，确保一定能捕获"LP6286"这种格式
-                                    alphanumeric_patterns = []
-                                    
-                                    # 使用多个特定的模式进行匹配
-                                    # 1. 标准格式: 字母+数字组合(如LP6286)
-                                    patterns = [
-                                        # 常见模式: 字母开头后跟数字(可能包含连字符、下划线或点)
-                                        r'[A-Za-z]+\d+(?:[A-Za-z0-9\-_\.]*)',
-                                        # 特殊处理带数字中缀的型号(如TPS7A47)
-                                        r'[A-Za-z]+\d+[A-Za-z]+\d+',
-                                        # 特殊处理SOT23-6等封装格式
-                                        r'SOT\d+-\d+',
-                                        # 处理以数字开头的型号(如1.8V, 3.3V)
-                                        r'\d+\.\d+[A-Za-z]+'
-                                    ]
-                                    
-                                    # 先把文本复制一份用于处理
-                                    working_text = text
-                                    
-                                    # 保存所有匹配到的模式及其位置
-                                    all_matches = []
-                                    
-                                    # 用每个模式进行匹配
-                                    for pattern in patterns:
-                                        for match in re.finditer(pattern, working_text):
-                                            matched_text = match.group()
-                                            start_pos = match.start()
-                                            end_pos = match.end()
-                                            all_matches.append((matched_text, start_pos, end_pos))
-                                            print(f"找到产品型号: '{matched_text}' 位置: {start_pos}-{end_pos}")
-                                    
-                                    # 按照起始位置降序排序，以避免替换时的位置偏移
-                                    all_matches.sort(key=lambda x: x[1], reverse=True)
-
-                                    # 在所有匹配结束后添加去重处理
-                                    all_matches_unique = []
-                                    seen_positions = set()
-                                    for match in all_matches:
-                                        matched_text, start_pos, end_pos = match
-                                        position_key = (start_pos, end_pos)  # 创建位置键
-                                        if position_key not in seen_positions:
-                                            all_matches_unique.append(match)
-                                            seen_positions.add(position_key)
-                                            
-                                    all_matches = all_matches_unique  # 使用去重后的结果
-                                    
-                                    # 替换所有匹配项为特殊标记
-                                    protected_text = text
-                                    replacement_map = {}  # 保存标记到原始文本的映射
-                                    
-                                    for i, (pattern, start, end) in enumerate(all_matches):
-                                        marker = f"<P{i}>"
-                                        replacement_map[marker] = pattern
-                                        protected_text = protected_text[:start] + marker + protected_text[end:]
-                                    
-                                    if all_matches:
-                                        print(f"保护的模式: {[m[0] for m in all_matches]}")
-                                        print(f"处理后的文本: {protected_text}")
-                                    
-                                    # 再保护小数点，避免在小数点处断句
-                                    protected_text = re.sub(r'(\d+)\.(\d+)', r'\1<DECIMAL>\2', protected_text)
-                                    
-                                    # 按标点分割文本(使用句号、问号等)
-                                    sentences = re.split(r'([。！？\.!?;；]+)', protected_text)
-                                    
-                                    # 重组句子和标点
-                                    proper_sentences = []
-                                    for i in range(0, len(sentences) - 1, 2):
-                                        if i + 1 < len(sentences):
-                                            proper_sentences.append(sentences[i] + sentences[i + 1])
-                                        else:
-                                            proper_sentences.append(sentences[i])
-                                    
-                                    # 处理最后一个元素
-                                    if len(sentences) % 2 == 1:
-                                        if proper_sentences:
-                                            proper_sentences[-1] += sentences[-1]
-                                        else:
-                                            proper_sentences.append(sentences[-1])
-                                    
-                                    # 进一步分割长句子
-                                    result = []
-                                    for sentence in proper_sentences:
-                                        # 检查句子长度，如果短则直接添加
-                                        if len(sentence) <= max_chars:
-                                            # 直接恢复所有保护标记并添加
-                                            restored_sentence = restore_all_markers(sentence, replacement_map)
-                                            result.append(restored_sentence)
-                                        else:
-                                            # 对长句进行再切分，但避免打断保护标记
-                                            parts = split_with_marker_protection(sentence, max_chars, replacement_map)
-                                            result.extend(parts)
-                                    
-                                    # 输出最终分行结果
-                                    print(f"分行结果 ({len(result)}行):")
-                                    for i, line in enumerate(result):
-                                        print(f"  行{i+1}: {line}")
-                                                                        
-                                    return result
-                                
-                                # 恢复所有特殊标记为原始文本
-                                def restore_all_markers(text, replacement_map):
-                                    restored = text
-                                    
-                                    # 先恢复产品型号标记
-                                    for marker, original in replacement_map.items():
-                                        restored = restored.replace(marker, original)
-                                    
-                                    # 再恢复小数点
-                                    restored = restored.replace('<DECIMAL>', '.')
-                                    
-                                    return restored
-                                
-                                # 安全地分割长文本，确保不会打断特殊标记
-                                def split_with_marker_protection(text, max_chars, replacement_map):
-                                    result_parts = []
-                                    
-                                    # 先检查是否有保护标记
-                                    has_protected_markers = any(marker in text for marker in replacement_map.keys())
-                                    
-                                    # 如果有保护标记，使用更安全的分割方法
-                                    if has_protected_markers:
-                                        # 修改：将文本根据逗号分割，但保留逗号作为每段的结尾
-                                        segments = []
-                                        last_end = 0
-                                        
-                                        # 找到所有逗号位置并分段
-                                        for i, char in enumerate(text):
-                                            if (char in ',，;；'):
-                                                segments.append(text[last_end:i+1])  # 包含逗号
-                                                last_end = i+1
-                                        
-                                        # 添加最后一段(如果有)
-                                        if last_end < len(text):
-                                            segments.append(text[last_end:])
-                                        
-                                        current_line = ""
-                                        for segment in segments:
-                                            # 如果当前行加上这段不会太长
-                                            if len(current_line + segment) <= max_chars:
-                                                current_line += segment
-                                            else:
-                                                # 保存当前行并开始新行
-                                                if current_line:
-                                                    restored_line = restore_all_markers(current_line, replacement_map)
-                                                    result_parts.append(restored_line)
-                                                
-                                                # 如果段落本身超过最大长度
-                                                if len(segment) > max_chars:
-                                                    # 检查是否包含保护标记
-                                                    marker_found = False
-                                                    start_idx = 0
-                                                    
-                                                    # 循环查找每个标记的位置
-                                                    for marker in replacement_map.keys():
-                                                        marker_pos = segment.find(marker)
-                                                        if marker_pos != -1:
-                                                            marker_found = True
-                                                            # 如果标记在max_chars附近，特殊处理
-                                                            if marker_pos < max_chars < marker_pos + len(marker):
-                                                                # 拆分点在标记之前
-                                                                restored_before = restore_all_markers(segment[:marker_pos], replacement_map)
-                                                                if restored_before:
-                                                                    result_parts.append(restored_before)
-                                                                
-                                                                # 标记和后面的内容放在下一行
-                                                                remaining = segment[marker_pos:]
-                                                                # 恢复保护标记
-                                                                restored_remaining = restore_all_markers(remaining, replacement_map)
-                                                                
-                                                                # 如果剩余部分仍然超长，再次递归分割
-                                                                if len(restored_remaining) > max_chars:
-                                                                    sub_parts = split_with_marker_protection(
-                                                                        restored_remaining, max_chars, {}  # 空映射，因为已经恢复了
-                                                                    )
-                                                                    result_parts.extend(sub_parts)
-                                                                else:
-                                                                    result_parts.append(restored_remaining)
-                                                                
-                                                                start_idx = len(segment)  # 标记已处理完整个部分
-                                                                break
-                                                    
-                                                    # 如果没有找到标记或标记位置不需要特殊处理
-                                                    if not marker_found or start_idx == 0:
-                                                        # 使用常规分割方法
-                                                        # 将该部分恢复所有标记后再分割
-                                                        restored_part = restore_all_markers(segment, replacement_map)
-                                                        
-                                                        # 尝试在空格处分割
-                                                        space_idx = restored_part.rfind(' ', 0, max_chars)
-                                                        if space_idx > 0:
-                                                            result_parts.append(restored_part[:space_idx+1])
-                                                            
-                                                            # 剩余部分如果超长，递归处理
-                                                            if len(restored_part) - space_idx - 1 > max_chars:
-                                                                sub_parts = split_with_marker_protection(
-                                                                    restored_part[space_idx+1:], max_chars, {}
-                                                                )
-                                                                result_parts.extend(sub_parts)
-                                                            else:
-                                                                result_parts.append(restored_part[space_idx+1:])
-                                                        else:
-                                                            # 如果找不到空格，就强制分割，最大程度避开标点符号
-                                                            segments = []
-                                                            
-                                                            # 查找所有可能的分割点(空格或标点)
-                                                            potential_breaks = []
-                                                            for j, char in enumerate(restored_part):
-                                                                if char in ' ，,。.;；':
-                                                                    potential_breaks.append(j)
-                                                            
-                                                            current_pos = 0
-                                                            while current_pos < len(restored_part):
-                                                                # 寻找最近的不超过max_chars的分割点
-                                                                next_break = None
-                                                                for pb in potential_breaks:
-                                                                    if current_pos < pb < current_pos + max_chars:
-                                                                        next_break = pb
-                                                                
-                                                                # 如果找到合适的分割点
-                                                                if next_break is not None:
-                                                                    segments.append(restored_part[current_pos:next_break+1])
-                                                                    current_pos = next_break + 1
-                                                                else:
-                                                                    # 没有找到合适分割点，只能强制分割
-                                                                    end_pos = min(current_pos + max_chars, len(restored_part))
-                                                                    segments.append(restored_part[current_pos:end_pos])
-                                                                    current_pos = end_pos
-                                                            
-                                                            result_parts.extend(segments)
-                                                else:
-                                                    # 段落长度合适，直接恢复标记并添加
-                                                    restored_part = restore_all_markers(segment, replacement_map)
-                                                    result_parts.append(restored_part)
-                                                    
-                                                # 重置当前行
-                                                current_line = ""
-                                        
-                                        # 处理最后一行
-                                        if current_line:
-                                            restored_line = restore_all_markers(current_line, replacement_map)
-                                            result_parts.append(restored_line)
-                                    else:
-                                        # 没有保护标记，使用简单的分割逻辑
-                                        # 先恢复所有标记
-                                        restored_text = restore_all_markers(text, replacement_map)
-                                        
-                                        # 使用修改后的辅助函数
-                                        result_parts = split_simple_text(restored_text, max_chars)
-                                    
-                                    return result_parts
-                                
-                                # 简单文本分割，不考虑保护标记
-                                def split_simple_text(text, max_chars):
-                                    parts = []
-                                    
-                                    # 修改：将文本根据逗号分割，但保留逗号作为每段的结尾
-                                    segments = []
-                                    last_end = 0
-                                    
-                                    # 找到所有逗号位置并分段
-                                    for i, char in enumerate(text):
-                                        if char in ',，':
-                                            segments.append(text[last_end:i+1])  # 包含逗号
-                                            last_end = i+1
-                                    
-                                    # 添加最后一段(如果有)
-                                    if last_end < len(text):
-                                        segments.append(text[last_end:])
-                                    
-                                    current_line = ""
-                                    for segment in segments:
-                                        if len(current_line + segment) <= max_chars:
-                                            current_line += segment
-                                        else:
-                                            if current_line:
-                                                parts.append(current_line)
-                                            
-                                            # 如果段落本身超过最大长度
-                                            if len(segment) > max_chars:
-                                                # 寻找合适的断句点
-                                                for j in range(0, len(segment), max_chars):
-                                                    end_idx = min(j + max_chars, len(segment))
-                                                    chunk = segment[j:end_idx]
-                                                    parts.append(chunk)
-                                                current_line = ""
-                                            else:
-                                                current_line = segment
-                                    
-                                    # 添加最后一行
-                                    if current_line:
-                                        parts.append(current_line)
-                                    
-                                    return parts
+                        if segment_cacheable and 'cache_key' in slide:
+                            segment['cache_key'] = slide['cache_key']
+                        return segment
+                    else:
+                        # 非最后一页，正常添加字幕
+                        # Use a simpler subtitle method with direct PIL drawing on the image
+                        segment_subtitles = []  # 本页的字幕事件，时间相对于本页开头
+                        try:
+                            # Load image and create a copy to draw on
+                            base_image = PILImage.open(img_path).convert('RGB')
+                            
+                            # 水印只在每页底图上叠加一次，各行字幕共用
+                            if watermark_image is not None:
+                                base_image = apply_watermark(base_image, watermark_image, watermark_opacity, watermark_path)
+                            
+                            # 在底图(已叠加水印)上绘制一行字幕，返回BandedFrame
+                            def add_subtitles_to_image(image, text, font_size=28, bg_color=None, bg_color_name='白色半透明', font_color=(38, 74, 145)):
+                                # 字体在进程内按 (字体路径, 字号) 缓存
+                                font = get_subtitle_font(font_size, subtitle_font_path)
                                 
-                                # 新增函数：移除字符串末尾的标点符号
-                                def remove_ending_punctuation(text):
-                                    # 定义中英文标点符号列表
-                                    punctuation_marks = ['.', '。', ',', '，', '?', '？', '!', '！', ';', '；', ':', '：']
-                                    
-                                    # 检查字符串是否以标点符号结尾
-                                    if text and text[-1] in punctuation_marks:
-                                        return text[:-1]  # 移除最后一个字符
-                                    return text
+                                # 根据背景调整文本颜色以确保足够的对比度
+                                text_color = subtitle_text_color(font_color, bg_color_name)
+                                if text_color != tuple(font_color):
+                                    print(f"自动调整字体颜色为白色，以提高在深色背景上的可见度")
                                 
-                                # 修改：不再使用整个音频时长估计显示时间，而是逐行生成音频并测量实际时长
-                                lines = split_into_lines(subtitle_text)
-                                if not lines:
-                                    lines = [""]  # Ensure we have at least one line
-                                    
-                                print(f"该页分成 {len(lines)} 行字幕")
+                                # 只渲染底部的字幕条，底图由同一页的各行共用
+                                return render_subtitle_band(image, text, font, bg_color=bg_color, text_color=text_color)
+                            
+                            lines = slide['lines']
+                            print(f"该页分成 {len(lines)} 行字幕")
+                            
+                            if line_timings is not None:
+                                # 精准字幕模式: 整页音频由各行音频拼接而成，行边界即为字幕切换时间
+                                print("使用精准字幕模式，按各行音频的实际起止时间切换字幕")
+                                real_line_durations = line_display_durations(line_timings, duration)
+                                for i, (start, end) in enumerate(line_timings):
+                                    print(f"  行 {i+1}: {start:.2f}-{end:.2f}秒, 显示 {real_line_durations[i]:.2f}秒")
+                            else:
+                                # 估算字幕模式: 使用estimate_line_duration函数估算每行时长
+                                print("使用估算字幕模式，计算每行估计时长...")
                                 
-                                # 存储每行的音频片段和对应时长
-                                line_audio_clips = []
                                 line_durations = []
                                 total_line_duration = 0.0
                                 
-                                # 根据精准字幕设置选择处理方式
-                                use_precise_subtitles = subtitle_params.get('precise_subtitle', False)
-                                print(f"字幕模式: {'精准字幕' if use_precise_subtitles else '估算字幕'}")
-                                
-                                if use_precise_subtitles:
-                                    # 精准字幕模式: 为每行单独生成音频，并获取实际时长
-                                    print("使用精准字幕模式，开始逐行生成音频...")
-                                    
-                                    for i, line in enumerate(lines):
-                                        line_text = line.strip()
-                                        if not line_text:
-                                            continue
-                                            
-                                        line_audio_path = os.path.join(temp_dir, f"line_audio_{processed_idx}_{i}.mp3")
-                                        
-                                        # 为科大讯飞TTS添加特殊处理（首句句首和尾句句尾添加停顿）
-                                        line_tts_text = line_text
-                                        if tts_engine.lower() == "xfyun":
-                                            # 为第一行添加句首停顿
-                                            if i == 0:
-                                                if xfyun_params.get('ttp') == 'cssml':
-                                                    line_tts_text = '<break time="500ms"/>' + line_tts_text
-                                                else:
-                                                    line_tts_text = line_tts_text                                        
-                                            # 为最后一行添加句尾停顿
-                                            elif i == len(lines) - 1:
-                                                if xfyun_params.get('ttp') == 'cssml':
-                                                    line_tts_text = line_tts_text + '<break time="600ms"/>'
-                                                else:
-                                                    line_tts_text = line_tts_text + '[p800]'
-                                            else:            
-                                                if xfyun_params.get('ttp') == 'cssml':
-                                                    line_tts_text = line_tts_text + '<break time="100ms"/>'
-                                                else:
-                                                    line_tts_text = line_tts_text
-
-                                        # 应用多音字替换规则
-                                        if pronunciation_dict:
-                                            for original, replacement in pronunciation_dict.items():
-                                                line_tts_text = line_tts_text.replace(original, replacement)
-                                        
-                                        # 生成该行的音频
-                                        line_audio_generated = False
-                                        
-                                        if tts_engine.lower() == "xfyun" and xfyun_params:
-                                            # 使用科大讯飞
-                                            tts_result = xfyun_tts(
-                                                line_tts_text, 
-                                                line_audio_path, 
-                                                xfyun_params.get('app_id', ''), 
-                                                xfyun_params.get('api_key', ''),
-                                                xfyun_params.get('api_secret', ''),
-                                                voice=xfyun_params.get('voice_name', 'xiaoyan'),
-                                                speed=xfyun_params.get('speed', 50),
-                                                ttp=xfyun_params.get('ttp', 'text')
-                                            )
-                                            line_audio_generated = tts_result
-                                        elif tts_engine.lower() == "ttsmaker" and ttsmaker_params:
-                                            # 使用马克配音
-                                            tts_result = ttsmaker_tts(
-                                                line_tts_text, 
-                                                line_audio_path, 
-                                                token=ttsmaker_params.get('token', 'ttsmaker_demo_token'),
-                                                voice_id=ttsmaker_params.get('voice_id', 1504),
-                                                audio_speed=ttsmaker_params.get('audio_speed', 1.0)
-                                            )
-                                            line_audio_generated = tts_result
-                                        else:
-                                            # 使用系统TTS
-                                            engine = pyttsx3.init()
-                                            engine.save_to_file(line_tts_text, line_audio_path)
-                                            engine.runAndWait()
-                                            line_audio_generated = True
-                                            time.sleep(0.5)  # 等待文件写入
-                                            
-                                        # 检查音频是否生成成功
-                                        if line_audio_generated and os.path.exists(line_audio_path) and os.path.getsize(line_audio_path) > 0:
-                                            # 读取音频并获取时长
-                                            line_audio_clip = AudioFileClip(line_audio_path)
-                                            line_audio_clips.append(line_audio_clip)
-                                            line_duration = line_audio_clip.duration
-                                            line_durations.append(line_duration)
-                                            total_line_duration += line_duration
-                                            print(f"  行 {i+1}: '{line_text[:30]}{'...' if len(line_text) > 30 else ''}' - 音频时长: {line_duration:.2f}秒")
-                                        else:
-                                            # 音频生成失败时添加默认时长
-                                            print(f"  行 {i+1}: 音频生成失败，使用默认时长")
-                                            line_durations.append(2.0)  # 默认2秒
-                                            total_line_duration += 2.0
-                                else:
-                                    # 估算字幕模式: 使用estimate_line_duration函数估算每行时长
-                                    print("使用估算字幕模式，计算每行估计时长...")
-                                    
-                                    # 为每行估算时长
-                                    for i, line in enumerate(lines):
-                                        line_text = line.strip()
-                                        if not line_text:
-                                            # 空行使用最小时长
-                                            estimated_duration = 0.5  # 0.5秒为空行
-                                            line_durations.append(estimated_duration)
-                                            total_line_duration += estimated_duration
-                                            print(f"  行 {i+1}: [空行] - 估计时长: {estimated_duration:.2f}秒")
-                                            continue
-                                            
-                                        # 使用estimate_line_duration函数估算时长
-                                        estimated_duration = estimate_line_duration(line_text)
-                                        # 应用衰减系数，每行递增4%，但最多增加20%
-                                        decay_factor = min(1.2, 1.0 + (i * 0.04))
-                                        estimated_duration *= decay_factor
+                                # 为每行估算时长
+                                for i, line in enumerate(lines):
+                                    line_text = line.strip()
+                                    if not line_text:
+                                        # 空行使用最小时长
+                                        estimated_duration = 0.5  # 0.5秒为空行
                                         line_durations.append(estimated_duration)
                                         total_line_duration += estimated_duration
+                                        print(f"  行 {i+1}: [空行] - 估计时长: {estimated_duration:.2f}秒")
+                                        continue
                                         
-                                        print(f"  行 {i+1}: '{line_text[:30]}{'...' if len(line_text) > 30 else ''}' - 估计时长: {estimated_duration:.2f}秒")
-                                
+                                    # 使用estimate_line_duration函数估算时长
+                                    estimated_duration = estimate_line_duration(line_text)
+                                    # 应用衰减系数，每行递增4%，但最多增加20%
+                                    decay_factor = min(1.2, 1.0 + (i * 0.04))
+                                    estimated_duration *= decay_factor
+                                    line_durations.append(estimated_duration)
+                                    total_line_duration += estimated_duration
+                                    
+                                    print(f"  行 {i+1}: '{line_text[:30]}{'...' if len(line_text) > 30 else ''}' - 估计时长: {estimated_duration:.2f}秒")
+                            
                                 # 连接所有音频片段
-                                print("使用整体音频，总时长:", audio_clip.duration, "秒")
+                                print("使用整体音频，总时长:", duration, "秒")
                                 
                                 # 首先获取整页音频的总时长，作为参考
-                                actual_audio_duration = audio_clip.duration
+                                actual_audio_duration = duration
                                 
                                 # 根据各行时长占比，计算实际时长
                                 real_line_durations = []
                                 
                                 if total_line_duration > 0:
                                     # 按比例计算每行实际时长
-                                    for i, duration in enumerate(line_durations):
-                                        proportion = duration / total_line_duration
+                                    for i, line_duration in enumerate(line_durations):
+                                        proportion = line_duration / total_line_duration
                                         real_duration = proportion * actual_audio_duration
                                         real_line_durations.append(real_duration)
                                         print(f"  行 {i+1} 占比: {proportion:.2%}, 实际时长: {real_duration:.2f}秒")
@@ -1131,174 +914,191 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
                                     real_line_durations = [equal_duration] * len(lines)
                                     print(f"  无法计算时长占比，每行平均分配: {equal_duration:.2f}秒")
                                 
-                                # Calculate frame counts for each line
-                                fps = 24   #字幕略微提前
-                                frame_counts = [int(d * fps) for d in real_line_durations]
-                                total_frames = sum(frame_counts)
-                                
-                                # Create frames directory
-                                frames_dir = os.path.join(temp_dir, f"frames_{processed_idx}")
-                                os.makedirs(frames_dir, exist_ok=True)
-                                
-                                # Generate frames for each line
-                                frame_files = []
-                                frame_idx = 0
-                                
-                                print(f"生成字幕帧，共 {len(lines)} 行文本")
-                                for i, (line, frames_for_line) in enumerate(zip(lines, frame_counts)):
-                                    line_text = line.strip()
-                                    
-                                    # 去除行尾标点符号
-                                    line_text = remove_ending_punctuation(line_text)
-                                    
-                                    if not line_text:
-                                        # For empty lines, just use base image
-                                        frame_img = base_image.copy()
-                                    else:
-                                        frame_img = add_subtitles_to_image(
-                                            base_image, 
-                                            line_text,
-                                            font_size=font_size,     # 传递字体大小
-                                            bg_color=bg_color,       # 传递背景颜色
-                                            bg_color_name=bg_color_name,  # 传递背景颜色名称
-                                            font_color=font_color    # 传递字体颜色
-                                        )
-                                    
-                                    # Save each frame for this line
-                                    for _ in range(frames_for_line):
-                                        frame_path = os.path.join(frames_dir, f"frame_{frame_idx:04d}.png")
-                                        frame_img.save(frame_path)
-                                        frame_files.append(frame_path)
-                                        frame_idx += 1
-                                    
-                                    print(f"  第 {i+1}/{len(lines)} 行: {line_text[:20]}{'...' if len(line_text) > 20 else ''} - {frames_for_line} 帧")
-                                
-                                # If we have fewer frames than needed, repeat the last frame
-                                while len(frame_files) < total_frames:
-                                    frame_path = os.path.join(frames_dir, f"frame_{frame_idx:04d}.png")
-                                    if frame_files:
-                                        # Copy the last frame
-                                        shutil.copy(frame_files[-1], frame_path)
-                                    else:
-                                        # Use base image if no frames were created
-                                        base_image.save(frame_path)
-                                    frame_files.append(frame_path)
-                                    frame_idx += 1
-                                
-                                # Create a clip from image sequence
-                                video_clip = ImageSequenceClip(frame_files, fps=fps)
-                                
-                                # Add audio
-                                video_clip = video_clip.set_audio(audio_clip)
-                                print("字幕已添加到视频，按行显示")
+                                if timing_mode == 'silence':
+                                    # 静音检测模式: 将估算的行边界吸附到整页音频中的句间停顿
+                                    aligned_durations = silence_aligned_durations(audio_path, real_line_durations, actual_audio_duration)
+                                    if aligned_durations is not None:
+                                        real_line_durations = aligned_durations
+                                        for i, line_duration in enumerate(real_line_durations):
+                                            print(f"  行 {i+1} 对齐停顿后时长: {line_duration:.2f}秒")
+                            
+                            # 每行字幕只渲染一张图片，按该行时长保持显示，不再逐帧写入PNG
+                            # 使用ASS字幕或软字幕时画面保持为底图，字幕事件交给ffmpeg处理
+                            subtitle_frames = []
+                            line_start = 0.0
+
+                            print(f"生成字幕{'画面' if subtitle_render_backend == 'pil' else '事件'}，共 {len(lines)} 行文本")
+                            for i, (line, line_duration) in enumerate(zip(lines, real_line_durations)):
+                                line_text = line.strip()
+
+                                # 去除行尾标点符号
+                                line_text = remove_ending_punctuation(line_text)
+
+                                # 记录字幕事件，用于ASS烧录、外挂字幕文件和内嵌字幕轨道
+                                if line_text:
+                                    segment_subtitles.append((line_start, line_start + line_duration, line_text))
+
+                                if subtitle_render_backend != 'pil':
+                                    frame_img = base_image
+                                elif not line_text:
+                                    # For empty lines, just use base image
+                                    frame_img = base_image
+                                else:
+                                    frame_img = add_subtitles_to_image(
+                                        base_image, 
+                                        line_text,
+                                        font_size=font_size,     # 传递字体大小
+                                        bg_color=bg_color,       # 传递背景颜色
+                                        bg_color_name=bg_color_name,  # 传递背景颜色名称
+                                        font_color=font_color    # 传递字体颜色
+                                    )
                                 
-                            except Exception as subtitle_error:
-                                print(f"添加字幕时出错: {subtitle_error}")
-                                print(traceback.format_exc())
-                                # Fallback to no subtitles
-                                img_clip = ImageClip(img_path).set_duration(duration)
-                                video_clip = img_clip.set_audio(audio_clip)
+                                subtitle_frames.append((frame_img, line_duration))
+                                line_start += line_duration
+
+                                print(f"  第 {i+1}/{len(lines)} 行: {line_text[:20]}{'...' if len(line_text) > 20 else ''} - {line_duration:.2f} 秒")
+
+                            # 每行画面按时长保持显示，交给编码后端处理
+                            segment_frames = subtitle_frames
+                            if subtitle_render_backend != 'pil':
+                                segment_frames = [(base_image, sum(real_line_durations))]
+                            print("字幕已添加到视频，按行显示")
                             
-                            # 获取原始时长
-                            original_duration = video_clip.duration
-                            audio_duration = audio_clip.duration
-
-                            # 确保视频和音频足够长才进行裁剪
-                            if original_duration > 0.9 and audio_duration > 0.9:
-                                # 同时裁剪视频和音频
-                                video_clip = video_clip.subclip(0, original_duration - 0.9)
-                                audio_clip = audio_clip.subclip(0, audio_duration - 0.9)
-                                print(f"视频和音频时长已缩短0.9秒，当前时长: {video_clip.duration:.2f}秒")
-
-                            # 然后设置音频
-                            video_clip = video_clip.set_audio(audio_clip)
-                            clips.append(video_clip)
-                    except Exception as clip_error:
-                        print(f"处理视频剪辑时出错: {clip_error}")
-                        print(traceback.format_exc())
+                        except Exception as subtitle_error:
+                            print(f"添加字幕时出错: {subtitle_error}")
+                            print(traceback.format_exc())
+                            # Fallback to no subtitles
+                            segment_frames = [(PILImage.open(img_path).convert('RGB'), duration)]
+                            segment_subtitles = []
+                            segment_cacheable = False
                         
-                        # Fallback to simpler approach without subtitles
-                        try:
-                            img_clip = ImageClip(img_path).set_duration(duration)
-                            video_clip = img_clip.set_audio(audio_clip)
-                            clips.append(video_clip)
-                        except Exception as fallback_error:
-                            print(f"使用备选方案时出错: {fallback_error}")
-            
-            # Concatenate all clips
-            if clips:
-                print(f"合成 {len(clips)} 个片段为最终视频...")
-                
-                try:
-                    # 移除交叉淡入淡出效果，因为它会导致黑屏问题
-                    # 直接拼接视频片段，依靠音频中的静音缓冲区避免噪音
-                    final_clip = concatenate_videoclips(clips, method="compose")  # 仅使用compose方法而非crossfade
-                    
-                    # 添加整体淡入淡出效果
-                    if final_clip.duration > 2.0:
-                        final_clip = final_clip.fadein(0.0).fadeout(0.5)
+                        # 确保视频和音频足够长才进行裁剪
+                        # 精准字幕模式的整页音频末尾停顿由拼接参数控制，不再裁剪
+                        segment_duration = duration
+                        if line_timings is None and duration > 0.9:
+                            # 同时裁剪视频和音频
+                            segment_duration = duration - 0.9
+                            print(f"视频和音频时长已缩短0.9秒，当前时长: {segment_duration:.2f}秒")
+
+                        segment = make_segment(processed_idx, segment_frames, audio_path, segment_duration, segment_subtitles)
+                        if segment_cacheable and 'cache_key' in slide:
+                            segment['cache_key'] = slide['cache_key']
+                        return segment
+                except Exception as clip_error:
+                    print(f"处理视频剪辑时出错: {clip_error}")
+                    print(traceback.format_exc())
                     
+                    # Fallback to simpler approach without subtitles
+                    try:
+                        return make_segment(processed_idx, [(PILImage.open(img_path).convert('RGB'), duration)], audio_path, duration)
+                    except Exception as fallback_error:
+                        print(f"使用备选方案时出错: {fallback_error}")
+
+            def encode_slide(segment):
+                """编码阶段: 把一页的片段单独编码为MP4，存入片段缓存后释放画面"""
+                if segment.get('encoded_path'):
+                    return segment
+                segment_path = os.path.join(segments_dir, f"segment_{segment['index']:04d}.mp4")
+                is_last_segment = (segment['index'] == last_processed_idx)
+                if encode_pool is not None:
+                    encode_pool.submit(encode_single_segment, segment, segment_path, segments_dir, pool_encoder_params,
+                                       is_last_segment, encode_threads).result()
+                else:
+                    encode_single_segment(segment, segment_path, segments_dir, encoder_params,
+                                          is_last=is_last_segment, threads=encode_threads)
+                if segment.get('cache_key'):
+                    store_cached_segment(segment_cache, segment['cache_key'], segment, segment_path)
+                segment['encoded_path'] = segment_path
+                segment['frames'] = []
+                return segment
+
+            # 旁白解析完成后即开始在后台合成语音，网络TTS的等待时间与幻灯片导出重叠；
+            # 按页码顺序提交，靠前的页面先合成完，流水线不必等待。片段缓存命中的页面不提交
+            slides = {processed_idx: prepare_slide(processed_idx) for processed_idx in idx_to_ppt_map}
+            synthesizer = NarrationSynthesizer(tts_engine, xfyun_params, ttsmaker_params, tts_cache,
+                                               synthesis_workers, synthesis_params.get('xfyun_async', True)).start()
+            tts_futures = {}
+            try:
+                for processed_idx in sorted(slides):
+                    slide = slides[processed_idx]
+                    if segment_cache is not None:
+                        if slide_hashes is None:
+                            continue  # 导出后按图片查询片段缓存
+                        if lookup_cached_segment(slide, slide_hashes[slide['ppt_idx']]):
+                            continue
+                    tts_futures[processed_idx] = synthesizer.submit(processed_idx, slide['tts_jobs'])
+                print(f"开始在后台合成 {len(tts_futures)} 页语音，与幻灯片导出同时进行")
+
+                # 导出 → 语音合成 → 渲染 → 编码: 导出在当前线程进行(COM对象只能在创建它的线程中使用)，
+                # 每导出一页就送入流水线，语音合成阶段取回后台已合成的音频；导出阶段之后的队列不限容量，避免下游较慢时拖住导出的看门狗
+                stages = [
+                    Stage("语音合成", synthesize_slide, tts_workers, queue_size=0),
+                    Stage("渲染", render_slide, render_workers, queue_size=queue_size)
+                ]
+                if streaming_encode:
+                    stages.append(Stage("编码", encode_slide, encode_workers, queue_size=queue_size))
+                pipeline = SlidePipeline(stages).start()
+
+                exported_slides = set()
+                def on_slide_exported(processed_idx, result):
+                    exported_slides.add(processed_idx)
+                    pipeline.put(processed_idx, processed_idx)
+
+                try:
+                    # Save slides as images
+                    print("导出幻灯片为图片...")
+                    renderer.export_slides(slides_to_process, temp_dir, 1920, 1080, on_slide=on_slide_exported)
+                    prefetched = sum(1 for future in list(tts_futures.values()) if future.done())
+                    print(f"幻灯片导出完成时已合成 {prefetched}/{len(tts_futures)} 页语音")
+
+                    # 图片导出后即可关闭PowerPoint(或清理LibreOffice的工作目录)
+                    renderer.close()
+                    renderer = None
+
+                    for processed_idx in range(1, last_processed_idx + 1):
+                        if processed_idx not in exported_slides:
+                            print(f"警告: 幻灯片 {processed_idx} 没有导出图片，已跳过")
+                except Exception as export_error:
+                    # 导出失败时停止流水线，等各阶段线程退出后抛出导出的异常
+                    pipeline.abort(export_error)
+                    try:
+                        pipeline.finish()
+                    except PipelineAborted:
+                        pass
+                    raise
+                # 等待流水线处理完已导出的页面；任一阶段出错时抛出异常
+                segments_by_index = pipeline.finish()
+            finally:
+                # 出错时不再合成尚未开始的页面，等正在进行的请求结束后再清理临时目录
+                synthesizer.cancel()
+                synthesizer.close()
+                if encode_pool is not None:
+                    encode_pool.shutdown(wait=True)
+            segments = [segments_by_index[processed_idx] for processed_idx in sorted(segments_by_index)]
+
+            # Encode all segments
+            if segments:
+                print(f"合成 {len(segments)} 个片段为最终视频...")
+
+                try:
                     # 先输出到临时文件，成功后再复制到最终位置
                     print(f"开始导出视频到临时位置: {temp_output_path}")
+                    if streaming_encode:
+                        concat_segment_files([segment['encoded_path'] for segment in segments], temp_output_path, temp_dir)
+                    else:
+                        encode_segments(segments, temp_output_path, temp_dir, encoder_params)
                     
-                    try:
-                        # 首先尝试使用多线程导出
-                        import multiprocessing
-                        cpu_count = multiprocessing.cpu_count()
-                        threads = max(2, min(12, int(cpu_count * 0.75)))
-                        print(f"检测到 {cpu_count} 个CPU核心，将使用 {threads} 个线程进行视频导出")
-                        
-                        ffmpeg_params = [
-                            "-preset", "medium",
-                            "-crf", "21",
-                            "-movflags", "+faststart",
-                            "-profile:v", "high",
-                            "-tune", "stillimage"
-                        ]
-                        
-                        # 添加安全参数以处理特殊字符
-                        ffmpeg_params.extend(["-ignore_unknown", "-strict", "experimental"])
-                        
-                        final_clip.write_videofile(
-                            temp_output_path, 
-                            fps=24, 
-                            codec='libx264', 
-                            audio_codec='aac', 
-                            audio_bitrate='192k',
-                            threads=threads,
-                            ffmpeg_params=ffmpeg_params,
-                            logger=None,
-                            verbose=False
-                        )
-                        print(f"视频成功导出到临时位置")
-                    except Exception as e:
-                        print(f"多线程导出失败 ({e})，将使用单线程导出...")
-                        
+                    subtitle_events = collect_subtitle_events(segments)
+                    if subtitle_mux and subtitle_events and os.path.exists(temp_output_path):
+                        # 以mov_text轨道内嵌字幕，只复制音视频流
                         try:
-                            # 简化参数的单线程备选方案
-                            final_clip.write_videofile(
-                                temp_output_path, 
-                                fps=24, 
-                                codec='libx264', 
-                                audio_codec='aac',
-                                verbose=False,
-                                logger=None
-                            )
-                            print(f"单线程导出成功")
-                        except Exception as e2:
-                            print(f"单线程导出也失败 ({e2})，尝试使用最简单的设置...")
-                            
-                            # 最后的备选方法 - 使用最简单的设置
-                            try:
-                                final_clip.write_videofile(
-                                    temp_output_path,
-                                    verbose=False,
-                                    logger=None
-                                )
-                                print(f"使用最简单设置导出成功")
-                            except Exception as e3:
-                                print(f"所有导出方法都失败: {e3}")
-                                raise
+                            srt_path = write_subtitle_files(os.path.join(temp_dir, "subtitles"), subtitle_events, ('srt',))['srt']
+                            muxed_path = os.path.join(temp_dir, "muxed_output.mp4")
+                            mux_subtitles(temp_output_path, srt_path, muxed_path)
+                            os.replace(muxed_path, temp_output_path)
+                            print(f"已内嵌字幕轨道 ({len(subtitle_events)} 条)")
+                        except Exception as mux_error:
+                            print(f"内嵌字幕失败: {mux_error}")
                     
                     # 如果临时文件成功生成，复制到最终位置
                     if os.path.exists(temp_output_path):
@@ -1333,24 +1133,34 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
                             output_video_path = temp_output_path
                     
                     print(f"视频创建成功: {output_video_path}")
+                    
+                    # 在视频旁边写出外挂字幕文件
+                    if subtitle_sidecar_formats and subtitle_events:
+                        try:
+                            written = write_subtitle_files(os.path.splitext(output_video_path)[0], subtitle_events, subtitle_sidecar_formats)
+                            for subtitle_path in written.values():
+                                print(f"字幕文件已生成: {subtitle_path}")
+                        except Exception as sidecar_error:
+                            print(f"写出字幕文件失败: {sidecar_error}")
                 except Exception as concat_error:
                     print(f"合成视频失败: {concat_error}")
                     print(traceback.format_exc())
                     raise Exception(f"合成视频失败: {str(concat_error)}")
             else:
-                # 如果clips列表为空，提供更明确的错误信息
+                # 如果segments列表为空，提供更明确的错误信息
                 print(f"错误: 没有成功创建任何视频片段。以下是处理过的幻灯片索引: {slides_to_process}")
                 raise ValueError("没有处理任何幻灯片。请检查是否正确提取了旁白文字和导出了幻灯片图片。")
         finally:
+            # 输出TTS缓存统计
+            if tts_cache is not None:
+                tts_cache.print_stats()
+            if encoder_params and encoder_params.get('segment_cache') is not None:
+                encoder_params['segment_cache'].print_stats()
+            stats = font_cache_stats()
+            print(f"字体缓存: 加载 {stats['loads']} 次, 命中 {stats['hits']} 次, 缓存 {stats['cached']} 个字体")
+            
             # Clean up resources before removing temp directory
             print("清理资源...")
-            # Close all audio clips
-            for clip in audio_clips:
-                try:
-                    clip.close()
-                except:
-                    pass
-            
             # Clean up temporary directory manually
             try:
                 # Wait a bit to ensure files are released
@@ -1388,13 +1198,8 @@ def ppt_to_video(ppt_path, output_video_path, tts_engine="ttsmaker", language=No
         print(f"转换过程中出错: {e}")
         print(traceback.format_exc())
         # Ensure PowerPoint is closed even if there's an error
-        try:
-            if presentation:
-                presentation.Close()
-            if ppt_app:
-                ppt_app.Quit()
-        except Exception as cleanup_error:
-            print(f"关闭PowerPoint时出错: {cleanup_error}")
+        if renderer is not None:
+            renderer.close()
         raise Exception(f"转换失败: {str(e)}")
 
 def xfyun_tts(text, output_file, app_id, api_key, api_secret, voice="xiaoyan", speed=50, volume=50, ttp="text"):
@@ -1415,95 +1220,94 @@ def xfyun_tts(text, output_file, app_id, api_key, api_secret, voice="xiaoyan", s
     Returns:
     - 成功返回True，失败返回False
     """
+    try:
+        pcm_data = xfyun_synthesize_pcm(text, app_id, api_key, api_secret, voice=voice, speed=speed, volume=volume, ttp=ttp)
+        if not pcm_data:
+            return False
+        
+        print(f"语音合成成功，PCM大小: {len(pcm_data)} 字节")
+        write_pcm_audio(pcm_data, output_file)
+        print(f"音频文件已生成: {output_file}")
+        return True
+    except Exception as e:
+        print(f"语音合成过程中出错: {e}")
+        print(traceback.format_exc())
+        return False
+
+def write_pcm_audio(pcm_data, output_file, sample_rate=16000):
+    """
+    将16位单声道PCM数据按输出文件扩展名写为MP3、WAV或原始PCM
+    
+    中间文件以输出文件名为前缀，多个合成任务同时运行时互不干扰。
+    """
+    if output_file.lower().endswith('.wav'):
+        with wave.open(output_file, 'wb') as wf:
+            wf.setnchannels(1)  # 单声道
+            wf.setsampwidth(2)  # 16位
+            wf.setframerate(sample_rate)
+            wf.writeframes(pcm_data)
+    elif output_file.lower().endswith('.mp3'):
+        # PCM -> WAV -> MP3 转换
+        temp_wav = output_file + ".pcm.wav"
+        write_pcm_audio(pcm_data, temp_wav, sample_rate)
+        try:
+            audio_clip = AudioFileClip(temp_wav)
+            try:
+                audio_clip.write_audiofile(output_file, bitrate="192k", fps=sample_rate, verbose=False, logger=None)
+            finally:
+                audio_clip.close()
+        finally:
+            try:
+                if os.path.exists(temp_wav):
+                    os.remove(temp_wav)
+            except Exception as e:
+                print(f"清理临时文件失败: {e}")
+    else:
+        # 直接写入原始PCM数据
+        with open(output_file, 'wb') as f:
+            f.write(pcm_data)
+
+def xfyun_timeout_for_text(text, base_timeout=10.0, seconds_per_char=0.15, max_timeout=180.0):
+    """
+    根据文本长度估算科大讯飞合成的等待超时时间
+
+    Parameters:
+    - text: 待合成文本
+    - base_timeout: 建立连接与首包的基础等待时间(秒)
+    - seconds_per_char: 每个字符额外等待的时间(秒)
+    - max_timeout: 超时上限(秒)
+
+    Returns:
+    - 超时时间(秒)
+    """
+    return min(max_timeout, base_timeout + seconds_per_char * len(text or ""))
+
+def xfyun_synthesize_pcm(text, app_id, api_key, api_secret, voice="xiaoyan", speed=50, volume=50, ttp="text"):
+    """
+    调用科大讯飞WebSocket API合成语音，返回16kHz 16位单声道PCM数据
+    
+    音频数据只保存在本次调用自己的内存缓冲区中，可在多个线程中同时调用。
+    
+    Returns:
+    - 成功返回PCM字节串，失败返回None
+    """
     print(f"使用科大讯飞WebSocket API生成语音...")
     print(f"APPID: {app_id}, 发音人: {voice}, 语速: {speed}, 文本类型: {ttp}")
     print(f"文本长度: {len(text)} 字符")
     
-    # 删除之前可能存在的临时PCM文件
-    temp_pcm = os.path.join(tempfile.gettempdir(), "xfyun_temp.pcm")
-    if os.path.exists(temp_pcm):
-        try:
-            os.remove(temp_pcm)
-        except:
-            pass
+    # 本次调用的PCM数据块
+    pcm_chunks = []
     
     # 保存运行状态和结果
     tts_success = False
-    tts_done = False
     tts_error = None
     audio_received = False  # 新增: 跟踪是否接收到音频数据
-    
-    # 从wsgiref.handlers导入时间格式化函数
-    from wsgiref.handlers import format_date_time
-    from time import mktime
-    
-    class XFyunWsParam:
-        """科大讯飞WebSocket参数类"""
-        def __init__(self, app_id, api_key, api_secret, text):
-            self.APPID = app_id
-            self.APIKey = api_key
-            self.APISecret = api_secret
-            self.Text = text
-            
-            # 公共参数
-            self.CommonArgs = {"app_id": self.APPID}
-            
-            # 业务参数 - 按照官方格式设置
-            self.BusinessArgs = {
-                "aue": "raw",  # 使用raw格式，便于后续处理
-                "auf": "audio/L16;rate=16000",  # 音频采样率
-                "vcn": voice,  # 发音人
-                "tte": "utf8",  # 文本编码
-                "speed": speed,  # 语速
-                "volume": volume,  # 音量
-                "ttp": ttp  # 文本类型，普通文本或CSSML
-            }
-            
-            # 数据
-            self.Data = {
-                "status": 2,  # 2表示一次性发送全部数据
-                "text": str(base64.b64encode(self.Text.encode('utf-8')), "UTF8")
-            }
-        
-        def create_url(self):
-            """生成鉴权URL"""
-            url = 'wss://tts-api.xfyun.cn/v2/tts'
-            
-            # 生成RFC1123格式的时间戳
-            now = datetime.datetime.now()
-            date = format_date_time(mktime(now.timetuple()))
-            
-            # 拼接字符串
-            signature_origin = "host: " + "ws-api.xfyun.cn" + "\n"
-            signature_origin += "date: " + date + "\n"
-            signature_origin += "GET " + "/v2/tts " + "HTTP/1.1"
-            
-            print(f"签名原始字符串: \n{signature_origin}")
-            
-            # 进行hmac-sha256加密
-            signature_sha = hmac.new(self.APISecret.encode('utf-8'), 
-                                      signature_origin.encode('utf-8'),
-                                      digestmod=hashlib.sha256).digest()
-            signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding='utf-8')
-            
-            authorization_origin = f'api_key="{self.APIKey}", algorithm="hmac-sha256", headers="host date request-line", signature="{signature_sha_base64}"'
-            authorization = base64.b64encode(authorization_origin.encode('utf-8')).decode(encoding='utf-8')
-            
-            # 将请求的鉴权参数组合为字典
-            v = {
-                "authorization": authorization,
-                "date": date,
-                "host": "ws-api.xfyun.cn"
-            }
-            
-            # 拼接鉴权参数，生成url
-            url = url + '?' + urlencode(v)
-            print(f"WebSocket URL: {url.split('?')[0]}?authorization=***&date={date}&host=ws-api.xfyun.cn")
-            return url
+    # 完成、出错或连接关闭时置位，主线程据此结束等待
+    done_event = threading.Event()
     
     # WebSocket回调函数
     def on_message(ws, message):
-        nonlocal tts_success, tts_done, tts_error, audio_received
+        nonlocal tts_success, tts_error, audio_received
         try:
             message = json.loads(message)
             code = message["code"]
@@ -1513,7 +1317,7 @@ def xfyun_tts(text, output_file, app_id, api_key, api_secret, voice="xiaoyan", s
                 error_msg = message.get("message", "未知错误")
                 print(f"错误信息: {error_msg}, 代码: {code}")
                 tts_error = f"科大讯飞错误: {error_msg} (代码: {code})"
-                tts_done = True
+                done_event.set()
                 return
             
             # 只有成功的响应才会有data字段
@@ -1523,60 +1327,51 @@ def xfyun_tts(text, output_file, app_id, api_key, api_secret, voice="xiaoyan", s
                 
                 if audio:
                     audio_received = True
-                    # 解码音频数据并保存
-                    audio_data = base64.b64decode(audio)
-                    with open(temp_pcm, 'ab') as f:
-                        f.write(audio_data)
+                    # 解码音频数据并保存到本次调用的缓冲区
+                    pcm_chunks.append(base64.b64decode(audio))
                     
                     print(f"已接收音频数据片段，当前状态: {status}")
                 
                 if status == 2:  # 所有数据接收完成
                     print("WebSocket数据传输完成")
                     tts_success = audio_received  # 只有在接收到音频数据时才算成功
-                    tts_done = True
+                    done_event.set()
                     ws.close()
         except Exception as e:
             print(f"处理WebSocket消息时出错: {e}")
             print(traceback.format_exc())
             tts_error = str(e)
-            tts_done = True
+            done_event.set()
     
     def on_error(ws, error):
-        nonlocal tts_done, tts_error
+        nonlocal tts_error
         print(f"WebSocket错误: {error}")
         tts_error = f"WebSocket错误: {error}"
-        tts_done = True
+        done_event.set()
     
     def on_close(ws, close_status_code, close_msg):
-        nonlocal tts_done
+        nonlocal tts_success
         print(f"WebSocket连接关闭: 状态码={close_status_code}, 消息={close_msg}")
-        if not tts_done:  # 如果不是正常完成导致的关闭
-            tts_done = True
+        if not done_event.is_set():  # 如果不是正常完成导致的关闭
             # 如果连接提前关闭但已接收部分数据，可能也是成功的
             if audio_received and not tts_success:
                 tts_success = True  # 添加缺失的代码块 - 将连接标记为成功
+            done_event.set()
     
     def on_open(ws):
         print("WebSocket连接已建立，发送数据...")
         
         def run(*args):
             try:
-                # 组装消息数据
-                data = {
-                    "common": ws_param.CommonArgs,
-                    "business": ws_param.BusinessArgs,
-                    "data": ws_param.Data
-                }
-                
                 # 发送JSON数据
-                ws.send(json.dumps(data))
+                ws.send(ws_param.create_request())
                 print("文本数据已发送，等待响应...")
             except Exception as e:
                 print(f"发送数据时出错: {e}")
                 print(traceback.format_exc())
-                nonlocal tts_error, tts_done
+                nonlocal tts_error
                 tts_error = f"发送数据时出错: {e}"
-                tts_done = True
+                done_event.set()
                 ws.close()
         
         # 启动线程发送数据
@@ -1587,7 +1382,7 @@ def xfyun_tts(text, output_file, app_id, api_key, api_secret, voice="xiaoyan", s
     # 主要处理逻辑 - 使用新的try块
     try:
         # 初始化WebSocket参数
-        ws_param = XFyunWsParam(app_id, api_key, api_secret, text)
+        ws_param = XFyunWsParam(app_id, api_key, api_secret, text, voice=voice, speed=speed, volume=volume, ttp=ttp)
         ws_url = ws_param.create_url()
         
         # 启用跟踪以便调试
@@ -1614,75 +1409,30 @@ def xfyun_tts(text, output_file, app_id, api_key, api_secret, voice="xiaoyan", s
         ws_thread.daemon = True
         ws_thread.start()
         
-        # 等待处理完成，最多等待30秒
-        timeout = 30
-        start_time = time.time()
-        print(f"等待WebSocket响应，超时时间: {timeout}秒...")
-        while not tts_done and (time.time() - start_time < timeout):
-            time.sleep(0.1)
+        # 等待完成事件，超时时间随文本长度增长
+        timeout = xfyun_timeout_for_text(text)
+        print(f"等待WebSocket响应，超时时间: {timeout:.0f}秒...")
         
         # 如果超时但未完成，则标记为错误
-        if not tts_done:
-            print(f"WebSocket请求超时（{timeout}秒）")
-            tts_error = f"请求超时（{timeout}秒）"
+        if not done_event.wait(timeout):
+            print(f"WebSocket请求超时（{timeout:.0f}秒）")
+            tts_error = f"请求超时（{timeout:.0f}秒）"
             ws.close()
         
-        # 检查是否成功，并进行后续处理
-        if tts_success and os.path.exists(temp_pcm) and os.path.getsize(temp_pcm) > 0:
-            print(f"语音合成成功，PCM大小: {os.path.getsize(temp_pcm)} 字节")
-            
-            # 根据输出格式进行处理
-            if output_file.lower().endswith('.mp3'):
-                # PCM -> MP3 转换
-                print("转换PCM到MP3格式...")
-                
-                # 将PCM数据转换为WAV格式
-                print("创建临时WAV文件...")
-                temp_wav = temp_pcm + ".wav"
-                with wave.open(temp_wav, 'wb') as wf:
-                    wf.setnchannels(1)  # 单声道
-                    wf.setsampwidth(2)  # 16位
-                    wf.setframerate(16000)  # 16kHz
-                    with open(temp_pcm, 'rb') as pcm_file:
-                        wf.writeframes(pcm_file.read())
-                
-                # 将WAV转换为MP3
-                print("将WAV转换为MP3...")
-                audio_clip = AudioFileClip(temp_wav)
-                audio_clip.write_audiofile(output_file, bitrate="192k", fps=16000, verbose=False, logger=None)
-                
-                # 清理临时文件
-                try:
-                    if os.path.exists(temp_wav):
-                        os.remove(temp_wav)
-                    if os.path.exists(temp_pcm):
-                        os.remove(temp_pcm)
-                except Exception as e:
-                    print(f"清理临时文件失败: {e}")
-            else:
-                # 直接复制PCM文件到目标路径
-                import shutil
-                shutil.copy(temp_pcm, output_file)
-                # 删除临时PCM文件
-                try:
-                    if os.path.exists(temp_pcm):
-                        os.remove(temp_pcm)
-                except:
-                    pass
-            
-            print(f"音频文件已生成: {output_file}")
-            return True
+        # 检查是否成功
+        if tts_success and pcm_chunks:
+            return b"".join(pcm_chunks)
         else:
             if tts_error:
                 print(f"语音合成失败: {tts_error}")
             else:
                 print("语音合成失败，未生成有效音频数据")
                 
-            return False
+            return None
     except Exception as e:
         print(f"语音合成过程中出错: {e}")
         print(traceback.format_exc())
-        return False
+        return None
 
 def ttsmaker_tts(text, output_file, token="ttsmaker_demo_token", voice_id=1504, audio_format='mp3', audio_speed=1.0, audio_volume=0):
     """
@@ -1851,3 +1601,438 @@ def ttsmaker_tts(text, output_file, token="ttsmaker_demo_token", voice_id=1504,
         print(f"马克配音TTS调用过程中出现异常: {e}")
         print(traceback.format_exc())
         return False
+
+def prepare_tts_text(text, tts_engine, xfyun_params=None, pronunciation_dict=None):
+    """
+    生成整页旁白送入TTS引擎的文本
+
+    Parameters:
+    - text: 旁白原文
+    - tts_engine: 使用的TTS引擎
+    - xfyun_params: 科大讯飞参数字典，使用CSSML发音人时会设置其'ttp'
+    - pronunciation_dict: 多音字替换字典
+
+    Returns:
+    - (tts_text, engine_text): 应用多音字替换后的文本，以及实际送入引擎的文本（科大讯飞会加上停顿标记）
+    """
+    # 生成用于语音合成的文本，应用多音字替换规则
+    tts_text = text
+    if pronunciation_dict:
+        # 应用所有替换规则
+        for original, replacement in pronunciation_dict.items():
+            tts_text = tts_text.replace(original, replacement)
+        
+        # 记录替换情况
+        if tts_text != text:
+            print(f"已应用多音字优化，共替换 {sum(text.count(orig) for orig in pronunciation_dict.keys())} 处")
+
+    engine_text = tts_text
+    if tts_engine.lower() == "xfyun" and xfyun_params:
+        # 获取发音人
+        voice_name = xfyun_params.get('voice_name', 'xiaoyan')
+        
+        # 添加停顿标记 - 根据不同发音人使用不同方式
+        cssml_voices = ['xiaoyan', 'xiaoyu', 'xiaofeng', 'xiaoqi', 'catherine', 'mary']
+        
+        # 检查是否需要使用CSSML方式添加停顿
+        if voice_name in cssml_voices:
+            # CSSML方式：添加<break>标签（开头和结尾）
+            engine_text = '<break time="500ms"/>' + engine_text + '<break time="600ms"/>'
+            # 设置ttp参数为cssml
+            xfyun_params['ttp'] = 'cssml'
+        else:
+            # 简单标记方式：添加[p500]和[p600]
+            engine_text = '[p200]' + engine_text + '[p1000]'
+
+    return tts_text, engine_text
+
+def build_line_audio_track(line_jobs, tts_results, output_path, pauses=(0.5, 0.3, 0.6), tts_cache=None):
+    """
+    将逐行合成的音频按停顿设置拼接为整页音轨
+
+    合成失败的行先尝试系统TTS，仍失败则用按文本估算时长的静音占位，保证字幕时间轴完整。
+
+    Parameters:
+    - line_jobs: 各行的合成任务列表，空行为None
+    - tts_results: NarrationSynthesizer.submit 的结果，{index: 是否成功} 字典
+    - output_path: 整页音频输出路径
+    - pauses: (首行前停顿, 行间停顿, 末行后停顿)，单位秒
+    - tts_cache: DiskLRUCache 实例，可为None
+
+    Returns:
+    - 每行语音的 (开始时间, 结束时间) 列表，失败返回None
+    """
+    from moviepy.audio.AudioClip import AudioClip
+    
+    lead_pause, line_pause, tail_pause = pauses
+    
+    def silence(seconds):
+        return AudioClip(lambda t: 0, duration=seconds)
+    
+    parts = []
+    line_clips = []
+    timings = []
+    position = 0.0
+    try:
+        if lead_pause > 0:
+            parts.append(silence(lead_pause))
+            position += lead_pause
+        
+        for i, job in enumerate(line_jobs):
+            if i > 0 and line_pause > 0:
+                parts.append(silence(line_pause))
+                position += line_pause
+            
+            if job is None:
+                timings.append((position, position))
+                continue
+            
+            line_ok = tts_results.get(job['index'], False)
+            if not line_ok:
+                print(f"第 {job['index']} 行语音合成失败，尝试使用系统TTS...")
+                try:
+                    with _system_tts_lock:
+                        line_ok = synthesize_speech(job['tts_text'], job['audio_path'], "pyttsx3", tts_cache=tts_cache)
+                except Exception as e:
+                    print(f"系统TTS生成第 {job['index']} 行失败: {e}")
+                    line_ok = False
+            
+            if line_ok and os.path.exists(job['audio_path']) and os.path.getsize(job['audio_path']) > 0:
+                clip = AudioFileClip(job['audio_path'])
+                line_clips.append(clip)
+            else:
+                placeholder = max(0.5, estimate_line_duration(job['tts_text']))
+                print(f"第 {job['index']} 行使用 {placeholder:.2f}秒 静音占位")
+                clip = silence(placeholder)
+            
+            parts.append(clip)
+            timings.append((position, position + clip.duration))
+            position += clip.duration
+        
+        if tail_pause > 0:
+            parts.append(silence(tail_pause))
+            position += tail_pause
+        
+        if not line_clips:
+            print("该页所有行的语音合成均失败")
+            return None
+        
+        page_audio = concatenate_audioclips(parts)
+        page_audio.write_audiofile(output_path, fps=line_clips[0].fps, logger=None)
+        print(f"已拼接 {len(line_jobs)} 行音频，整页时长 {position:.2f}秒")
+        return timings
+    except Exception as e:
+        print(f"拼接逐行音频失败: {e}")
+        print(traceback.format_exc())
+        return None
+    finally:
+        for clip in line_clips:
+            try:
+                clip.close()
+            except:
+                pass
+
+def line_display_durations(line_timings, total_duration):
+    """
+    根据每行语音的起止时间计算字幕显示时长
+
+    每行从自身语音开始显示到下一行语音开始，首行从0秒开始，末行持续到音频结束。
+    """
+    if not line_timings:
+        return []
+    starts = [0.0] + [start for start, _ in line_timings[1:]]
+    ends = starts[1:] + [max(total_duration, starts[-1])]
+    return [max(0.0, end - start) for start, end in zip(starts, ends)]
+
+def _fetch_xfyun_cached_audio(job, xfyun_params, tts_cache):
+    """
+    按 synthesize_speech 相同的键查询科大讯飞音频缓存
+
+    Returns:
+    - (是否命中, 缓存键)；未使用缓存时缓存键为None
+    """
+    if tts_cache is None:
+        return False, None
+    output_format = os.path.splitext(job['audio_path'])[1].lstrip('.').lower()
+    cache_key = make_tts_cache_key(job['engine_text'], "xfyun", xfyun_params, None, output_format)
+    return tts_cache.fetch(cache_key, job['audio_path']), cache_key
+
+def _write_xfyun_job_audio(job, pcm_data, cache_key, tts_cache):
+    """写出一个合成任务的音频并存入缓存，返回是否成功"""
+    if not pcm_data:
+        return False
+    try:
+        write_pcm_audio(pcm_data, job['audio_path'])
+    except Exception as e:
+        print(f"第 {job['index']} 页音频写入失败: {e}")
+        return False
+    if cache_key is not None:
+        tts_cache.store(cache_key, job['audio_path'])
+    return True
+
+def _make_xfyun_async_client(xfyun_params, max_concurrency):
+    return XFyunAsyncClient(
+        xfyun_params.get('app_id', ''),
+        xfyun_params.get('api_key', ''),
+        xfyun_params.get('api_secret', ''),
+        voice=xfyun_params.get('voice_name', 'xiaoyan'),
+        speed=xfyun_params.get('speed', 50),
+        ttp=xfyun_params.get('ttp', 'text'),
+        max_concurrency=max_concurrency,
+        timeout_func=xfyun_timeout_for_text
+    )
+
+class NarrationSynthesizer:
+    """
+    在后台按页合成旁白，所有页面共用一个并发上限
+
+    科大讯飞在安装了websockets库时由一个asyncio客户端在同一个事件循环上并发请求所有页面的所有任务；
+    其他网络TTS共用一个有界线程池；系统TTS逐个合成。submit() 提交一页的任务并返回 Future，
+    该页的任务全部完成后得到结果，流水线可以逐页取回，不必等待全部页面。
+    """
+
+    def __init__(self, tts_engine, xfyun_params=None, ttsmaker_params=None, tts_cache=None, max_workers=4, use_async=True):
+        """
+        Parameters:
+        - tts_engine: 使用的TTS引擎
+        - xfyun_params: 科大讯飞参数字典
+        - ttsmaker_params: 马克配音参数字典
+        - tts_cache: DiskLRUCache 实例，可为None
+        - max_workers: 所有页面合计的最大并发数
+        - use_async: 科大讯飞是否使用asyncio客户端
+        """
+        self.engine = tts_engine.lower()
+        self.xfyun_params = xfyun_params
+        self.ttsmaker_params = ttsmaker_params
+        self.tts_cache = tts_cache
+        self.concurrent = bool((self.engine == "xfyun" and xfyun_params) or (self.engine == "ttsmaker" and ttsmaker_params))
+        self.max_workers = max(1, max_workers) if self.concurrent else 1
+        self.use_async = use_async and self.engine == "xfyun" and bool(xfyun_params) and XFYUN_ASYNC_AVAILABLE
+        self.futures = {}
+        self._cancelled = threading.Event()
+        self._pool = None
+        self._loop = None
+        self._client = None
+        self._thread = None
+        self._start_time = None
+
+    def start(self):
+        """启动后台线程池(科大讯飞asyncio客户端另启动事件循环线程)"""
+        self._start_time = time.time()
+        # asyncio客户端的缓存读写和MP3转换是阻塞操作，放到线程池中进行
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="narration-synthesizer")
+        if self.use_async:
+            self._loop = asyncio.new_event_loop()
+            self._client = _make_xfyun_async_client(self.xfyun_params, self.max_workers)
+            self._thread = threading.Thread(target=self._loop.run_forever, name="narration-synthesizer-loop", daemon=True)
+            self._thread.start()
+        print(f"语音合成: 并发数 {self.max_workers}{'，使用asyncio客户端' if self.use_async else ''}")
+        return self
+
+    def submit(self, key, jobs):
+        """
+        提交一页的合成任务，按提交顺序进行
+
+        Parameters:
+        - key: 页键
+        - jobs: 任务列表，每项包含 'index'、'engine_text'、'audio_path'
+
+        Returns:
+        - Future，结果为该页的 {任务index: 是否成功} 字典；出错的任务记为失败
+        """
+        jobs = list(jobs)
+        if self.use_async:
+            # 客户端的信号量按等待顺序放行，先提交的页面先合成
+            future = asyncio.run_coroutine_threadsafe(self._run_page_async(jobs), self._loop)
+        else:
+            future = Future()
+            job_futures = [self._pool.submit(self._run_pool_job, job) for job in jobs]
+            remaining = [len(job_futures)]
+            lock = threading.Lock()
+
+            def job_done(_):
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0]:
+                        return
+                results = {job['index']: (not job_future.cancelled() and job_future.result())
+                           for job, job_future in zip(jobs, job_futures)}
+                try:
+                    future.set_result(results)
+                except InvalidStateError:
+                    pass  # 已被取消
+
+            if not job_futures:
+                future.set_result({})
+            for job_future in job_futures:
+                job_future.add_done_callback(job_done)
+        self.futures[key] = future
+        return future
+
+    def _run_job(self, job):
+        if self._cancelled.is_set():
+            return False
+        try:
+            return synthesize_speech(
+                job['engine_text'],
+                job['audio_path'],
+                self.engine,
+                xfyun_params=self.xfyun_params,
+                ttsmaker_params=self.ttsmaker_params,
+                tts_cache=self.tts_cache
+            )
+        except Exception as e:
+            print(f"第 {job['index']} 页语音合成出错: {e}")
+            print(traceback.format_exc())
+            return False
+
+    def _run_pool_job(self, job):
+        if self.concurrent:
+            return self._run_job(job)
+        # 系统TTS与语音合成阶段中的回退共用本机语音引擎
+        with _system_tts_lock:
+            return self._run_job(job)
+
+    async def _run_async_job(self, job):
+        if self._cancelled.is_set():
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            hit, cache_key = await loop.run_in_executor(self._pool, _fetch_xfyun_cached_audio, job, self.xfyun_params, self.tts_cache)
+            if hit:
+                return True
+            pcm_data = await self._client.synthesize(job['engine_text'])
+            return await loop.run_in_executor(self._pool, _write_xfyun_job_audio, job, pcm_data, cache_key, self.tts_cache)
+        except Exception as e:
+            print(f"第 {job['index']} 页语音合成出错: {e}")
+            print(traceback.format_exc())
+            return False
+
+    async def _run_page_async(self, jobs):
+        results = await asyncio.gather(*(self._run_async_job(job) for job in jobs))
+        return {job['index']: success for job, success in zip(jobs, results)}
+
+    def cancel(self):
+        """不再开始新的合成任务，尚无结果的页面被取消"""
+        self._cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+    def close(self):
+        """等待已提交的页面合成结束(正在进行的请求完成后)，停止后台线程"""
+        for future in list(self.futures.values()):
+            try:
+                future.result()
+            except Exception:
+                pass  # 已取消
+        if self._loop is not None:
+            # 取消的页面在事件循环中收尾后再停止
+            async def drain():
+                pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+                await asyncio.gather(*pending, return_exceptions=True)
+            asyncio.run_coroutine_threadsafe(drain(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        failed_count = sum(1 for future in self.futures.values()
+                           if not future.cancelled() and not all(future.result().values()))
+        print(f"语音合成完成: {len(self.futures)} 页，耗时 {time.time() - self._start_time:.2f}秒，{failed_count} 页有失败的片段")
+
+def make_tts_cache_key(text, tts_engine, xfyun_params=None, ttsmaker_params=None, output_format='mp3'):
+    """
+    计算TTS音频缓存键
+
+    键由实际送入引擎的文本（已应用多音字替换和停顿标记）、引擎、发音人、语速、
+    文本类型(ttp)和输出格式共同决定，任一项变化都会重新合成。
+    """
+    engine = tts_engine.lower()
+    fields = {
+        'version': 1,  # 修改音频后处理方式时递增，使旧缓存失效
+        'text': text,
+        'engine': engine,
+        'format': output_format
+    }
+    if engine == "xfyun" and xfyun_params:
+        fields['voice'] = xfyun_params.get('voice_name', 'xiaoyan')
+        fields['speed'] = xfyun_params.get('speed', 50)
+        fields['ttp'] = xfyun_params.get('ttp', 'text')
+    elif engine == "ttsmaker" and ttsmaker_params:
+        fields['voice'] = ttsmaker_params.get('voice_id', 1504)
+        fields['speed'] = ttsmaker_params.get('audio_speed', 1.0)
+    else:
+        # 系统TTS的发音人和语速取决于本机设置
+        fields['engine'] = "pyttsx3"
+        try:
+            engine = pyttsx3.init()
+            fields['voice'] = engine.getProperty('voice')
+            fields['speed'] = engine.getProperty('rate')
+        except Exception as e:
+            print(f"读取系统TTS设置失败: {e}")
+    return make_cache_key(fields)
+
+# 系统TTS依赖本机语音引擎，流水线中多个线程回退到系统TTS时逐个合成
+_system_tts_lock = threading.Lock()
+
+def synthesize_speech(text, output_file, tts_engine, xfyun_params=None, ttsmaker_params=None, tts_cache=None):
+    """
+    使用指定的TTS引擎合成语音，提供缓存时优先复用已合成的音频
+
+    Parameters:
+    - text: 送入TTS引擎的文本（已应用多音字替换和停顿标记）
+    - output_file: 输出的音频文件路径
+    - tts_engine: 'xfyun'、'ttsmaker' 或 'pyttsx3'，缺少对应参数时使用系统TTS
+    - xfyun_params: 科大讯飞参数字典
+    - ttsmaker_params: 马克配音参数字典
+    - tts_cache: DiskLRUCache 实例，为None时不使用缓存
+
+    Returns:
+    - 成功返回True，失败返回False
+    """
+    engine = tts_engine.lower()
+    if engine == "xfyun" and not xfyun_params:
+        engine = "pyttsx3"
+    elif engine == "ttsmaker" and not ttsmaker_params:
+        engine = "pyttsx3"
+
+    cache_key = None
+    if tts_cache is not None:
+        output_format = os.path.splitext(output_file)[1].lstrip('.').lower()
+        cache_key = make_tts_cache_key(text, engine, xfyun_params, ttsmaker_params, output_format)
+        if tts_cache.fetch(cache_key, output_file):
+            print(f"命中TTS缓存，跳过语音合成: {text[:20]}{'...' if len(text) > 20 else ''}")
+            return True
+
+    if engine == "xfyun":
+        result = xfyun_tts(
+            text,
+            output_file,
+            xfyun_params.get('app_id', ''),
+            xfyun_params.get('api_key', ''),
+            xfyun_params.get('api_secret', ''),
+            voice=xfyun_params.get('voice_name', 'xiaoyan'),
+            speed=xfyun_params.get('speed', 50),
+            ttp=xfyun_params.get('ttp', 'text')
+        )
+    elif engine == "ttsmaker":
+        result = ttsmaker_tts(
+            text,
+            output_file,
+            token=ttsmaker_params.get('token', 'ttsmaker_demo_token'),
+            voice_id=ttsmaker_params.get('voice_id', 1504),
+            audio_speed=ttsmaker_params.get('audio_speed', 1.0)
+        )
+    else:
+        tts = pyttsx3.init()
+        tts.save_to_file(text, output_file)
+        tts.runAndWait()
+        result = True
+
+    # 只缓存引擎成功生成的音频，备用静音等不写入缓存
+    if result and cache_key is not None and os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+        tts_cache.store(cache_key, output_file)
+
+    return result
@@ -0,0 +1,85 @@
+"""
+按页缓存编码好的视频片段(增量渲染)
+
+每页的成片(画面、音频和烧录的字幕)编码为独立的MP4，以内容哈希为键存入 DiskLRUCache。
+键由幻灯片内容、旁白及TTS设置、字幕/水印参数和编码参数共同决定，任一项变化该页都会重新生成；
+pptx的幻灯片内容哈希直接从文件中计算(slide_renderer.hash_pptx_slides)，导出前即可查到缓存，命中的页面不再合成语音；
+无法解析的文件(例如旧版.ppt)改用导出图片的哈希。
+未改动的页面直接复用缓存的MP4，最后用concat demuxer无损拼接。
+片段的时长和字幕事件另存为同一个键的JSON文件，外挂字幕和内嵌字幕轨道仍可按整段视频生成。
+"""
+import os
+import json
+import hashlib
+from disk_cache import make_cache_key
+from video_encoder import make_segment
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """计算文件内容的SHA-256，文件不存在时返回None"""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_segment_cache_key(slide_hash, tts_key, is_last, render_fields):
+    """
+    计算单页片段的缓存键
+
+    Parameters:
+    - slide_hash: 幻灯片内容的哈希(pptx的幻灯片内容哈希，或导出图片的 hash_file)
+    - tts_key: 该页旁白的TTS缓存键(make_tts_cache_key)，包含送入引擎的文本、发音人和语速
+    - is_last: 是否为最后一页；最后一页不加字幕且带结尾淡出
+    - render_fields: 字幕、水印和编码参数字典，值需可被JSON序列化
+
+    Returns:
+    - 十六进制SHA-256字符串
+    """
+    return make_cache_key({
+        'version': 2,  # 修改片段的生成方式时递增，使旧缓存失效
+        'slide': slide_hash,
+        'tts': tts_key,
+        'is_last': bool(is_last),
+        'render': render_fields
+    })
+
+def fetch_cached_segment(cache, key, index, output_dir):
+    """
+    从缓存中取出已编码的片段
+
+    Returns:
+    - 命中时返回片段字典，'encoded_path' 为复制到output_dir的MP4；未命中返回None
+    """
+    meta_path = os.path.join(output_dir, f"cached_{index:04d}.json")
+    video_path = os.path.join(output_dir, f"cached_{index:04d}.mp4")
+    if not cache.fetch(key, meta_path) or not cache.fetch(key, video_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        subtitles = [(start, end, text) for start, end, text in meta.get('subtitles', [])]
+        segment = make_segment(index, [], None, meta['duration'], subtitles)
+    except Exception as e:
+        print(f"读取片段缓存信息失败: {e}")
+        return None
+    segment['encoded_path'] = video_path
+    segment['cache_key'] = key
+    return segment
+
+def store_cached_segment(cache, key, segment, encoded_path):
+    """将编码好的片段及其时长、字幕事件存入缓存"""
+    meta_path = f"{os.path.splitext(encoded_path)[0]}.json"
+    try:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'duration': segment['duration'],
+                'subtitles': [list(event) for event in segment.get('subtitles') or []]
+            }, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"写出片段缓存信息失败: {e}")
+        return
+    # 先存视频再存信息文件，读取时两者都命中才算命中
+    cache.store(key, encoded_path)
+    cache.store(key, meta_path)
@@ -0,0 +1,149 @@
+"""
+幻灯片批量导出
+
+用 Presentation.Export 一次性把整个演示文稿导出到图片文件夹，不再逐页切换窗口并等待。
+导出的文件名随PowerPoint界面语言变化(Slide1.PNG、幻灯片1.PNG 等)，按文件名末尾的编号对应页码。
+批量导出失败或缺页时，对缺少的页面单独调用 Slide.Export，仍失败则生成占位图片。
+"""
+import os
+import re
+import time
+import shutil
+import traceback
+from PIL import Image as PILImage, ImageDraw as PILImageDraw
+
+PP_SAVE_AS_PNG = 18  # PpSaveAsFileType.ppSaveAsPNG
+
+_SLIDE_NUMBER_PATTERN = re.compile(r'(\d+)$')
+
+def slide_number_from_file(file_name):
+    """从导出的文件名中取出页码(从1开始)，无法识别时返回None"""
+    stem, ext = os.path.splitext(file_name)
+    if ext.lower() != '.png':
+        return None
+    match = _SLIDE_NUMBER_PATTERN.search(stem)
+    return int(match.group(1)) if match else None
+
+def bulk_export_presentation(presentation, export_dir, width=1920, height=1080):
+    """
+    将整个演示文稿导出为PNG图片
+
+    Parameters:
+    - presentation: PowerPoint Presentation COM对象
+    - export_dir: 导出目录
+    - width, height: 图片尺寸
+
+    Returns:
+    - {页码(从1开始): 图片路径} 字典，导出失败时为空字典
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    try:
+        presentation.Export(export_dir, "PNG", width, height)
+    except Exception as e:
+        print(f"Presentation.Export 导出失败 ({e})，改用 SaveAs 导出...")
+        try:
+            presentation.SaveAs(export_dir, PP_SAVE_AS_PNG)
+        except Exception as e2:
+            print(f"SaveAs 导出也失败: {e2}")
+            return {}
+
+    exported = {}
+    # SaveAs 可能在目标路径下再建一层同名文件夹，一并扫描
+    for root, _, files in os.walk(export_dir):
+        for file_name in files:
+            number = slide_number_from_file(file_name)
+            if number is not None and number not in exported:
+                exported[number] = os.path.join(root, file_name)
+    return exported
+
+def write_placeholder_image(path, ppt_idx, width, height):
+    """导出失败时生成的空白占位图片"""
+    img = PILImage.new('RGB', (width, height), color=(255, 255, 255))
+    d = PILImageDraw.Draw(img)
+    d.text((width // 2, height // 2), f"幻灯片 {ppt_idx}", fill=(0, 0, 0))
+    img.save(path)
+
+def _move_to(source_path, target_path, width, height):
+    """移动导出的图片，尺寸不符时(例如SaveAs按幻灯片原始尺寸导出)缩放到目标尺寸"""
+    with PILImage.open(source_path) as img:
+        size = img.size
+        if size != (width, height):
+            img.convert('RGB').resize((width, height), PILImage.LANCZOS).save(target_path)
+            return
+    shutil.move(source_path, target_path)
+
+def export_slides(presentation, slide_indices, output_dir, width=1920, height=1080, on_slide=None):
+    """
+    导出指定的幻灯片，保存为 output_dir/slide_{处理序号}.png
+
+    Parameters:
+    - presentation: PowerPoint Presentation COM对象
+    - slide_indices: 要导出的PPT下标列表(从0开始)，处理序号按列表顺序从1开始
+    - output_dir: 输出目录
+    - width, height: 图片尺寸
+    - on_slide: 每页导出完成后调用 on_slide(处理序号, (图片路径, 导出方式, 耗时秒数))
+
+    Returns:
+    - {处理序号: (图片路径, 导出方式, 耗时秒数)} 字典，导出方式为 'bulk'、'single'、'pdf' 或 'placeholder'
+    """
+    results = {}
+
+    def finish(processed_idx, result):
+        results[processed_idx] = result
+        if on_slide is not None:
+            on_slide(processed_idx, result)
+
+    print(f"批量导出 {len(slide_indices)} 张幻灯片...")
+    bulk_dir = os.path.join(output_dir, "bulk_export")
+    start_time = time.time()
+    exported = bulk_export_presentation(presentation, bulk_dir, width, height)
+    bulk_elapsed = time.time() - start_time
+    # 批量导出无法得到单页耗时，按导出的文件数平均
+    bulk_per_slide = bulk_elapsed / max(len(exported), 1)
+    print(f"批量导出完成: {len(exported)} 张图片，耗时 {bulk_elapsed:.2f}秒")
+
+    for processed_idx, ppt_idx in enumerate(slide_indices, 1):
+        img_path = os.path.join(output_dir, f"slide_{processed_idx}.png")
+        source_path = exported.get(ppt_idx + 1)
+        if source_path:
+            try:
+                move_start = time.time()
+                _move_to(source_path, img_path, width, height)
+                finish(processed_idx, (img_path, 'bulk', bulk_per_slide + time.time() - move_start))
+                continue
+            except Exception as e:
+                print(f"处理批量导出的幻灯片 {ppt_idx + 1} 失败: {e}")
+
+        # 单页导出，不切换窗口
+        slide_start = time.time()
+        try:
+            presentation.Slides[ppt_idx].Export(img_path, "PNG", width, height)
+            finish(processed_idx, (img_path, 'single', time.time() - slide_start))
+            print(f"单独导出幻灯片 PPT索引 {ppt_idx} (第 {ppt_idx + 1} 页) 成功")
+        except Exception as e:
+            print(f"导出幻灯片 PPT索引 {ppt_idx} 失败: {e}")
+            print(traceback.format_exc())
+            try:
+                write_placeholder_image(img_path, ppt_idx, width, height)
+                finish(processed_idx, (img_path, 'placeholder', time.time() - slide_start))
+                print(f"使用占位图片代替幻灯片 {ppt_idx}")
+            except Exception as e2:
+                print(f"生成占位图片也失败: {e2}")
+                raise
+
+    shutil.rmtree(bulk_dir, ignore_errors=True)
+    print_export_report(results, slide_indices)
+    return results
+
+def print_export_report(results, slide_indices):
+    """打印每页的导出方式和耗时"""
+    method_names = {'bulk': '批量', 'single': '单独', 'pdf': 'PDF', 'placeholder': '占位'}
+    total = 0.0
+    print("幻灯片导出耗时:")
+    for processed_idx, ppt_idx in enumerate(slide_indices, 1):
+        if processed_idx not in results:
+            continue
+        _, method, elapsed = results[processed_idx]
+        total += elapsed
+        print(f"  第 {ppt_idx + 1} 页 -> 处理序号 {processed_idx}: {method_names[method]} {elapsed:.3f}秒")
+    print(f"导出 {len(results)}/{len(slide_indices)} 张幻灯片，合计 {total:.2f}秒")
@@ -0,0 +1,141 @@
+"""
+逐页流水线
+
+ppt_to_video 把每页幻灯片的处理分成若干阶段(语音合成 → 画面渲染 → 编码)，
+各阶段在自己的线程中运行，阶段之间用有界队列连接: 第N页在渲染时，第N+1页可以同时在合成语音，
+第N+2页仍在导出。整份演示文稿的耗时接近最慢的单个阶段，而不是各阶段之和。
+队列已满时上游阶段等待，渲染好的画面不会在内存中无限堆积。
+"""
+import queue
+import threading
+import time
+import traceback
+
+_STOP = object()  # 通知阶段线程退出的标记
+
+class PipelineAborted(Exception):
+    """流水线中某个阶段出错，流水线已停止"""
+    pass
+
+class Stage:
+    """
+    流水线的一个阶段
+
+    Parameters:
+    - name: 阶段名称，用于日志和耗时统计
+    - func: 处理函数 func(item)，返回值交给下一阶段；返回None表示该页到此为止
+    - workers: 并行线程数
+    - queue_size: 该阶段输入队列的容量，0表示不限
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=2):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers or 1))
+        self.queue = queue.Queue(maxsize=max(0, queue_size))
+        self.busy_seconds = 0.0
+        self.items = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+class SlidePipeline:
+    """
+    由多个阶段组成的线程流水线
+
+    put() 把一页送入第一个阶段，finish() 等待所有页面处理完毕，返回最后一个阶段的结果。
+    任一阶段抛出异常时流水线停止，put() 和 finish() 抛出 PipelineAborted。
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.results = {}
+        self.error = None
+        self._aborted = threading.Event()
+        self._start_time = None
+
+    def start(self):
+        """启动所有阶段的线程"""
+        self._start_time = time.time()
+        for position, stage in enumerate(self.stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._run_stage, args=(position,),
+                                          name=f"pipeline-{stage.name}-{i + 1}", daemon=True)
+                thread.start()
+                stage._threads.append(thread)
+        print("流水线已启动: " + " → ".join(f"{stage.name}({stage.workers})" for stage in self.stages))
+        return self
+
+    def _put(self, stage, message):
+        """放入队列；队列已满时等待，流水线中止后放弃"""
+        while not self._aborted.is_set():
+            try:
+                stage.queue.put(message, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_stage(self, position):
+        stage = self.stages[position]
+        next_stage = self.stages[position + 1] if position + 1 < len(self.stages) else None
+        while True:
+            message = stage.queue.get()
+            if message is _STOP:
+                return
+            if self._aborted.is_set():
+                continue
+            key, item = message
+            start_time = time.time()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                self.abort(e, f"流水线阶段 {stage.name} 处理第 {key} 项时出错: {e}\n{traceback.format_exc()}")
+                continue
+            finally:
+                with stage._lock:
+                    stage.busy_seconds += time.time() - start_time
+                    stage.items += 1
+            if result is None:
+                continue
+            if next_stage is None:
+                self.results[key] = result
+            else:
+                self._put(next_stage, (key, result))
+
+    def put(self, key, item):
+        """把一页送入第一个阶段"""
+        if not self._put(self.stages[0], (key, item)):
+            raise PipelineAborted(f"流水线已停止: {self.error}")
+
+    def abort(self, error, message=None):
+        """停止流水线，已排队的页面不再处理"""
+        if self.error is None:
+            self.error = error
+            if message:
+                print(message)
+        self._aborted.set()
+
+    def finish(self):
+        """
+        等待所有阶段处理完毕并停止线程
+
+        Returns:
+        - {key: 最后一个阶段的返回值} 字典
+        """
+        for stage in self.stages:
+            # 上游阶段全部结束后再通知本阶段退出，保证队列中的页面都已送达
+            for _ in stage._threads:
+                stage.queue.put(_STOP)
+            for thread in stage._threads:
+                thread.join()
+        self.print_stats()
+        if self.error is not None:
+            raise PipelineAborted(f"流水线已停止: {self.error}") from self.error
+        return self.results
+
+    def print_stats(self):
+        """打印各阶段的累计处理耗时"""
+        elapsed = time.time() - self._start_time if self._start_time else 0.0
+        print(f"流水线总耗时 {elapsed:.2f}秒，各阶段累计处理耗时:")
+        for stage in self.stages:
+            print(f"  {stage.name}: {stage.items} 项, {stage.busy_seconds:.2f}秒 ({stage.workers} 个线程)")
@@ -0,0 +1,571 @@
+"""
+幻灯片渲染后端
+
+ppt_to_video 通过 SlideRenderer 接口读取幻灯片数量、页面文字并导出页面图片:
+- PowerPointRenderer: 通过COM调用PowerPoint，仅限安装了Office的Windows
+- LibreOfficeRenderer: 用无界面的LibreOffice (soffice --convert-to pdf) 转为PDF，再光栅化为PNG；
+  页面文字直接从pptx的XML中读取，可在Linux服务器和CI中运行
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import datetime
+import importlib.util
+import zipfile
+import tempfile
+import posixpath
+import subprocess
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image as PILImage
+from slide_export import export_slides, write_placeholder_image, print_export_report
+from powerpoint_session import PowerPointSession
+
+SLIDE_RENDERERS = ('powerpoint', 'libreoffice')
+
+# 与PowerPoint的导出保持一致，隐藏的幻灯片也导出到PDF (LibreOffice 7.4 起支持JSON格式的过滤器选项)
+LIBREOFFICE_PDF_FILTER = 'pdf:impress_pdf_Export:{"ExportHiddenSlides":{"type":"boolean","value":"true"}}'
+
+# 并行光栅化时每个进程至少分到的页数
+MIN_PAGES_PER_WORKER = 4
+
+def normalize_line_breaks(text):
+    """把PowerPoint的段落分隔符(\\r)和段内换行(\\x0b)统一为 \\n，与从pptx读取的文字一致"""
+    return text.replace("\r\n", "\n").replace("\r", "\n").replace("\x0b", "\n")
+
+class SlideRenderer:
+    """
+    幻灯片渲染后端接口
+
+    使用顺序: open() -> slide_count / slide_text() / export_slides() -> close()，也可用作上下文管理器。
+    """
+    name = None
+
+    @property
+    def backend(self):
+        """实际渲染页面的后端名称('powerpoint' 或 'libreoffice')，用于区分不同后端导出的画面"""
+        return self.name
+
+    def open(self, ppt_path):
+        """打开演示文稿"""
+        raise NotImplementedError
+
+    @property
+    def slide_count(self):
+        """幻灯片总数"""
+        raise NotImplementedError
+
+    def slide_text(self, index):
+        """返回第index张(从0开始)幻灯片中所有文本框的文字，每个文本框以换行结尾"""
+        raise NotImplementedError
+
+    def export_slides(self, slide_indices, output_dir, width=1920, height=1080, on_slide=None):
+        """
+        导出指定的幻灯片，保存为 output_dir/slide_{处理序号}.png
+
+        每页完成后调用 on_slide(处理序号, (图片路径, 导出方式, 耗时秒数))，便于流式处理。
+
+        Returns:
+        - {处理序号: (图片路径, 导出方式, 耗时秒数)} 字典
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """关闭演示文稿并释放资源，可重复调用"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+class PowerPointRenderer(SlideRenderer):
+    """
+    通过COM调用PowerPoint打开和导出演示文稿
+
+    传入 PowerPointSession 时复用会话中的PowerPoint实例，close() 只关闭演示文稿；
+    否则单独启动一个实例，close() 时退出。
+    """
+    name = 'powerpoint'
+
+    def __init__(self, session=None):
+        self.session = session
+        self._owns_session = session is None
+        self.presentation = None
+
+    def open(self, ppt_path):
+        if self.session is None:
+            self.session = PowerPointSession()
+        self.presentation = self.session.open_presentation(ppt_path)
+        return self
+
+    @property
+    def slide_count(self):
+        return self.presentation.Slides.Count
+
+    def slide_text(self, index):
+        text = ""
+        for shape in self.presentation.Slides[index].Shapes:
+            if shape.HasTextFrame:
+                text += normalize_line_breaks(shape.TextFrame.TextRange.Text) + "\n"
+        return text
+
+    def export_slides(self, slide_indices, output_dir, width=1920, height=1080, on_slide=None):
+        return export_slides(self.presentation, slide_indices, output_dir, width, height, on_slide)
+
+    def close(self):
+        if self.presentation is not None:
+            self.session.close_presentation(self.presentation)
+            self.presentation = None
+        if self._owns_session and self.session is not None:
+            self.session.close()
+            self.session = None
+
+_PPTX_NS = {
+    'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'
+}
+_RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+_PACKAGE_RELATIONSHIP = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+
+# 不影响页面画面的关系，计算幻灯片内容哈希时不跟随
+_NON_VISUAL_RELATIONSHIPS = ('/notesSlide', '/comments', '/commentAuthors', '/tags')
+
+def _resolve_part(base_dir, target):
+    """把关系的Target解析为包内的部件路径"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+def _relationships(package, part_path):
+    """读取部件的关系，返回 [(关系ID, 类型, 部件路径)]，不含外部链接"""
+    rels_path = posixpath.join(posixpath.dirname(part_path), '_rels', posixpath.basename(part_path) + '.rels')
+    if rels_path not in package.namelist():
+        return []
+    base_dir = posixpath.dirname(part_path)
+    return [(rel.get('Id'), rel.get('Type') or '', _resolve_part(base_dir, rel.get('Target')))
+            for rel in ET.fromstring(package.read(rels_path)).iter(_PACKAGE_RELATIONSHIP)
+            if rel.get('TargetMode') != 'External']
+
+def _slide_part_paths(package):
+    """按播放顺序返回各张幻灯片在包内的路径"""
+    presentation = ET.fromstring(package.read('ppt/presentation.xml'))
+    targets = {rel_id: path for rel_id, _, path in _relationships(package, 'ppt/presentation.xml')}
+    slide_id_list = presentation.find('p:sldIdLst', _PPTX_NS)
+    return [targets[slide_id.get(_RELATIONSHIP_ID)] for slide_id in (slide_id_list if slide_id_list is not None else [])]
+
+def read_pptx_slides(pptx_path):
+    """
+    按播放顺序读取pptx中每张幻灯片的文字和隐藏状态
+
+    Returns:
+    - [(文字, 是否隐藏), ...]，文字的格式与 PowerPointRenderer.slide_text 一致
+    """
+    slides = []
+    with zipfile.ZipFile(pptx_path) as package:
+        for slide_path in _slide_part_paths(package):
+            slide = ET.fromstring(package.read(slide_path))
+
+            text = ""
+            # 与PowerPoint的 Slide.Shapes 一致，只读取顶层形状，组合内的文本框不参与
+            shape_tree = slide.find('p:cSld/p:spTree', _PPTX_NS)
+            for shape in (shape_tree.findall('p:sp', _PPTX_NS) if shape_tree is not None else []):
+                body = shape.find('p:txBody', _PPTX_NS)
+                if body is None:
+                    continue
+                paragraphs = []
+                for paragraph in body.findall('a:p', _PPTX_NS):
+                    parts = []
+                    for node in paragraph:
+                        if node.tag == f"{{{_PPTX_NS['a']}}}br":
+                            parts.append("\n")
+                        else:
+                            parts.extend(t.text or "" for t in node.iter(f"{{{_PPTX_NS['a']}}}t"))
+                    paragraphs.append("".join(parts))
+                text += "\n".join(paragraphs) + "\n"
+            slides.append((text, slide.get('show') == '0'))
+    return slides
+
+def _package_closure(package, names, part_path):
+    """部件及其(递归)引用的所有影响画面的部件"""
+    visited = set()
+    pending = [part_path]
+    while pending:
+        part_path = pending.pop()
+        if part_path in visited or part_path not in names:
+            continue
+        visited.add(part_path)
+        for _, rel_type, target in _relationships(package, part_path):
+            if not rel_type.endswith(_NON_VISUAL_RELATIONSHIPS):
+                pending.append(target)
+    return visited
+
+def hash_pptx_slides(pptx_path):
+    """
+    按播放顺序计算pptx中每张幻灯片的内容哈希，不需要导出图片
+
+    哈希覆盖幻灯片XML及其引用的版式、母版、主题、图片等部件、演示文稿的页面尺寸和嵌入的字体，备注和批注不参与。
+    幻灯片中含有字段(a:fld)时，页码随位置变化，另计入该页的页码；含日期字段时计入当天日期。
+    渲染后端版本和本机字体不在其中，由调用方按需加入缓存键。
+
+    Returns:
+    - [十六进制SHA-256, ...]
+    """
+    hashes = []
+    with zipfile.ZipFile(pptx_path) as package:
+        names = set(package.namelist())
+        presentation = ET.fromstring(package.read('ppt/presentation.xml'))
+        slide_size = presentation.find('p:sldSz', _PPTX_NS)
+        size_fields = sorted(slide_size.attrib.items()) if slide_size is not None else []
+        first_slide_number = int(presentation.get('firstSlideNum', 1))
+        # 嵌入的字体挂在演示文稿上，任一页都可能用到
+        font_parts = [path for _, rel_type, path in _relationships(package, 'ppt/presentation.xml')
+                      if rel_type.endswith('/font')]
+        part_hashes = {}
+        def part_hash(part_path):
+            if part_path not in part_hashes:
+                part_hashes[part_path] = hashlib.sha256(package.read(part_path)).hexdigest() if part_path in names else None
+            return part_hashes[part_path]
+
+        for position, slide_path in enumerate(_slide_part_paths(package)):
+            digest = hashlib.sha256(repr(size_fields).encode('utf-8'))
+            fields = ET.fromstring(package.read(slide_path)).iter(f"{{{_PPTX_NS['a']}}}fld")
+            field_types = {(field.get('type') or '') for field in fields}
+            if field_types:
+                digest.update(f"slide number {first_slide_number + position}".encode('utf-8'))
+                if any(field_type.startswith('datetime') for field_type in field_types):
+                    digest.update(f"date {datetime.date.today().isoformat()}".encode('utf-8'))
+            # 每个部件按 (内容哈希, 各关系的ID/类型/目标内容哈希) 计入，不依赖部件路径:
+            # PowerPoint保存时按顺序重新编号 slideN.xml，调换顺序不应使未改动的页面失效
+            entries = []
+            for part_path in _package_closure(package, names, slide_path).union(font_parts):
+                relationships = sorted((rel_id, rel_type.rsplit('/', 1)[-1], part_hash(target))
+                                       for rel_id, rel_type, target in _relationships(package, part_path)
+                                       if not rel_type.endswith(_NON_VISUAL_RELATIONSHIPS))
+                entries.append(repr((part_hash(part_path), relationships)))
+            for entry in sorted(entries):
+                digest.update(entry.encode('utf-8'))
+            hashes.append(digest.hexdigest())
+    return hashes
+
+def find_soffice():
+    """查找LibreOffice的命令行程序，找不到时返回None"""
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path:
+            return path
+    candidates = [
+        r"C:\Program Files\LibreOffice\program\soffice.exe",
+        r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+        "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+        "/usr/lib/libreoffice/program/soffice",
+        "/opt/libreoffice/program/soffice"
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+def _import_pymupdf():
+    """导入PyMuPDF，未安装时返回None"""
+    try:
+        import pymupdf
+        return pymupdf
+    except ImportError:
+        pass
+    try:
+        import fitz
+        return fitz
+    except ImportError:
+        return None
+
+def pdf_page_count(pdf_path):
+    """返回PDF的页数，优先使用PyMuPDF，其次pdfinfo"""
+    pymupdf = _import_pymupdf()
+    if pymupdf is not None:
+        with pymupdf.open(pdf_path) as document:
+            return document.page_count
+    result = subprocess.run(["pdfinfo", pdf_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split(":", 1)[1])
+    raise RuntimeError(f"无法读取PDF页数: {result.stderr.decode('utf-8', errors='replace')[-500:]}")
+
+def _rasterize_chunk(job):
+    """
+    在当前进程中光栅化一组页面，PDF只打开一次
+
+    输出路径为None的页面以原始RGB数据返回，供需要内存图片的调用方使用。
+
+    Returns:
+    - {页码: (耗时秒数, None 或 (尺寸, RGB字节串))}
+    """
+    pdf_path, pages, width, height = job
+    results = {}
+    pymupdf = _import_pymupdf()
+    if pymupdf is not None:
+        with pymupdf.open(pdf_path) as document:
+            for page_number, output_path in pages:
+                start_time = time.time()
+                page = document[page_number]
+                matrix = pymupdf.Matrix(width / page.rect.width, height / page.rect.height)
+                pixmap = page.get_pixmap(matrix=matrix, alpha=False)
+                raw = None
+                if output_path:
+                    pixmap.save(output_path)
+                else:
+                    raw = ((pixmap.width, pixmap.height), pixmap.samples)
+                results[page_number] = (time.time() - start_time, raw)
+        return results
+
+    pdftoppm = shutil.which("pdftoppm")
+    if pdftoppm is None:
+        raise RuntimeError("未安装PyMuPDF或pdftoppm，无法将PDF转为图片")
+    temp_dir = None
+    try:
+        for page_number, output_path in pages:
+            start_time = time.time()
+            target_path = output_path
+            if not target_path:
+                temp_dir = temp_dir or tempfile.mkdtemp(prefix="ppt_raster_")
+                target_path = os.path.join(temp_dir, f"page_{page_number}.png")
+            cmd = [
+                pdftoppm, "-png", "-singlefile",
+                "-f", str(page_number + 1), "-l", str(page_number + 1),
+                "-scale-to-x", str(width), "-scale-to-y", str(height),
+                pdf_path, os.path.splitext(target_path)[0]
+            ]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise RuntimeError(f"pdftoppm失败 (返回码 {result.returncode}): "
+                                   f"{result.stderr.decode('utf-8', errors='replace')[-500:]}")
+            raw = None
+            if not output_path:
+                with PILImage.open(target_path) as img:
+                    img = img.convert('RGB')
+                    raw = (img.size, img.tobytes())
+            results[page_number] = (time.time() - start_time, raw)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return results
+
+def _rasterize(pdf_path, pages, width, height, workers=None):
+    """按页数和CPU核心数决定是否使用进程池，页面交错分配给各进程以均衡负载"""
+    if workers is None:
+        # 每个进程至少分到几页，避免进程启动的开销超过渲染本身
+        workers = min(multiprocessing.cpu_count(), max(1, len(pages) // MIN_PAGES_PER_WORKER))
+    workers = max(1, min(workers, len(pages)))
+    if workers == 1:
+        return _rasterize_chunk((pdf_path, pages, width, height))
+
+    jobs = [(pdf_path, pages[i::workers], width, height) for i in range(workers)]
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_results in pool.map(_rasterize_chunk, jobs):
+            results.update(chunk_results)
+    return results
+
+def rasterize_pdf_pages(pdf_path, pages, width=1920, height=1080, workers=None):
+    """
+    将PDF的指定页面光栅化为PNG
+
+    优先使用PyMuPDF(进程内渲染，无需启动子进程)，未安装时使用poppler的pdftoppm。
+    页数较多时在进程池中并行渲染，每个进程只打开一次PDF。
+
+    Parameters:
+    - pdf_path: PDF文件路径
+    - pages: [(页码(从0开始), 输出路径), ...]
+    - width, height: 输出图片尺寸，页面按此尺寸缩放
+    - workers: 并行进程数，默认按页数和CPU核心数决定，为1时在当前进程中渲染
+
+    Returns:
+    - {页码: 耗时秒数}
+    """
+    start_time = time.time()
+    results = _rasterize(pdf_path, list(pages), width, height, workers)
+    print(f"光栅化 {len(results)} 页PDF，耗时 {time.time() - start_time:.2f}秒")
+    return {page_number: elapsed for page_number, (elapsed, _) in results.items()}
+
+def rasterize_pdf_images(pdf_path, page_numbers, width=1920, height=1080, workers=None):
+    """
+    将PDF的指定页面光栅化为内存中的RGB图片，参数同 rasterize_pdf_pages
+
+    Returns:
+    - {页码: PIL图片}
+    """
+    results = _rasterize(pdf_path, [(page_number, None) for page_number in page_numbers], width, height, workers)
+    return {page_number: PILImage.frombytes('RGB', size, data)
+            for page_number, (_, (size, data)) in results.items()}
+
+class LibreOfficeRenderer(SlideRenderer):
+    """
+    用无界面的LibreOffice把演示文稿转为PDF，再光栅化为图片
+
+    .ppt 等非pptx格式先由LibreOffice转为pptx，以便读取页面文字。
+    每个实例使用独立的LibreOffice用户配置目录，多个转换可以同时运行。
+    """
+    name = 'libreoffice'
+
+    def __init__(self, soffice_path=None, timeout=300, raster_workers=None):
+        self.soffice_path = soffice_path or find_soffice()
+        if not self.soffice_path:
+            raise RuntimeError("未找到LibreOffice (soffice)，请安装LibreOffice或指定soffice路径")
+        self.timeout = timeout
+        self.raster_workers = raster_workers
+        self.ppt_path = None
+        self.pptx_path = None
+        self.pdf_path = None
+        self.work_dir = None
+        self._slides = []
+
+    def _convert(self, source_path, target_format):
+        """调用soffice转换文件格式，返回输出文件路径"""
+        profile_dir = os.path.join(self.work_dir, "lo_profile")
+        cmd = [
+            self.soffice_path, "--headless", "--norestore", "--nolockcheck", "--nodefault",
+            f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+            "--convert-to", target_format, "--outdir", self.work_dir, source_path
+        ]
+        start_time = time.time()
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"LibreOffice转换超时 ({self.timeout}秒): {source_path}")
+        output_path = os.path.join(self.work_dir, f"{Path(source_path).stem}.{target_format.split(':')[0]}")
+        if result.returncode != 0 or not os.path.exists(output_path):
+            error_output = (result.stderr or result.stdout).decode('utf-8', errors='replace')
+            raise RuntimeError(f"LibreOffice转换失败 (返回码 {result.returncode}): {error_output[-1000:]}")
+        print(f"LibreOffice转换为 {target_format.split(':')[0]} 完成，耗时 {time.time() - start_time:.2f}秒")
+        return output_path
+
+    def open(self, ppt_path):
+        self.ppt_path = ppt_path
+        self.work_dir = tempfile.mkdtemp(prefix="ppt_lo_")
+        print(f"使用LibreOffice打开演示文稿: {ppt_path}")
+        self.pptx_path = ppt_path
+        if not zipfile.is_zipfile(ppt_path):
+            self.pptx_path = self._convert(ppt_path, "pptx")
+        self._slides = read_pptx_slides(self.pptx_path)
+        print("演示文稿打开成功，开始处理...")
+        return self
+
+    @property
+    def slide_count(self):
+        return len(self._slides)
+
+    def slide_text(self, index):
+        return self._slides[index][0]
+
+    def export_pdf(self):
+        """将演示文稿转为PDF(只转换一次)，返回PDF路径"""
+        if self.pdf_path is None:
+            self.pdf_path = self._convert(self.pptx_path, LIBREOFFICE_PDF_FILTER)
+        return self.pdf_path
+
+    def page_map(self):
+        """
+        返回 {幻灯片下标: PDF页码}
+
+        旧版LibreOffice不支持导出隐藏的幻灯片，此时PDF只包含可见页面，隐藏页面不在映射中。
+        """
+        page_count = pdf_page_count(self.export_pdf())
+        if page_count == len(self._slides):
+            return {index: index for index in range(len(self._slides))}
+        visible = [index for index, (_, hidden) in enumerate(self._slides) if not hidden]
+        if page_count != len(visible):
+            raise RuntimeError(f"PDF页数 ({page_count}) 与幻灯片数量 ({len(self._slides)}) 不一致")
+        return {index: page for page, index in enumerate(visible)}
+
+    def export_slides(self, slide_indices, output_dir, width=1920, height=1080, on_slide=None):
+        print(f"通过LibreOffice导出 {len(slide_indices)} 张幻灯片...")
+        start_time = time.time()
+        pages = self.page_map()
+        convert_elapsed = time.time() - start_time
+
+        targets = {}
+        for processed_idx, ppt_idx in enumerate(slide_indices, 1):
+            targets[processed_idx] = (ppt_idx, os.path.join(output_dir, f"slide_{processed_idx}.png"))
+
+        jobs = [(pages[ppt_idx], img_path) for ppt_idx, img_path in targets.values() if ppt_idx in pages]
+        timings = rasterize_pdf_pages(self.pdf_path, jobs, width, height, self.raster_workers)
+        # PDF转换的耗时按页平均计入每页
+        convert_per_slide = convert_elapsed / max(len(jobs), 1)
+
+        results = {}
+        for processed_idx, (ppt_idx, img_path) in targets.items():
+            page = pages.get(ppt_idx)
+            if page is not None and page in timings:
+                results[processed_idx] = (img_path, 'pdf', convert_per_slide + timings[page])
+            else:
+                print(f"幻灯片 PPT索引 {ppt_idx} 未包含在PDF中(可能是隐藏页)，使用占位图片")
+                write_placeholder_image(img_path, ppt_idx, width, height)
+                results[processed_idx] = (img_path, 'placeholder', 0.0)
+            if on_slide is not None:
+                on_slide(processed_idx, results[processed_idx])
+
+        print_export_report(results, slide_indices)
+        return results
+
+    def slide_images(self, slide_indices, width=1920, height=1080):
+        """
+        将指定的幻灯片光栅化为内存中的图片，不写出文件
+
+        Returns:
+        - {PPT下标: PIL图片}，不在PDF中的隐藏页面不包含在结果中
+        """
+        pages = self.page_map()
+        page_numbers = [pages[ppt_idx] for ppt_idx in slide_indices if ppt_idx in pages]
+        images = rasterize_pdf_images(self.pdf_path, page_numbers, width, height, self.raster_workers)
+        return {ppt_idx: images[pages[ppt_idx]] for ppt_idx in slide_indices if ppt_idx in pages}
+
+    def close(self):
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+def default_renderer_name():
+    """Windows上且安装了pywin32时使用PowerPoint，否则使用LibreOffice"""
+    if sys.platform == 'win32' and importlib.util.find_spec('win32com') is not None:
+        return 'powerpoint'
+    return 'libreoffice'
+
+def resolve_renderer_name(backend):
+    """把 'auto' 解析为本机实际使用的渲染后端名称"""
+    return default_renderer_name() if backend == 'auto' else backend
+
+def create_slide_renderer(render_params=None):
+    """
+    按参数创建渲染后端
+
+    Parameters:
+    - render_params: 渲染参数字典
+                    Optional keys: 'backend' ('powerpoint'、'libreoffice' 或 'auto'，默认 'auto'),
+                                   'soffice_path' (LibreOffice程序路径，默认自动查找),
+                                   'timeout' (LibreOffice单次转换的超时秒数，默认300),
+                                   'raster_workers' (PDF并行光栅化的进程数，默认按页数和CPU核心数决定),
+                                   'powerpoint_session' (PowerPointSession，批量转换时复用同一个PowerPoint实例),
+                                   'export_worker' (SlideExportWorker，设置后在带超时看门狗的子进程中打开和导出)
+
+    Returns:
+    - 未打开的 SlideRenderer 实例
+    """
+    render_params = render_params or {}
+    if render_params.get('export_worker') is not None:
+        from export_worker import WorkerSlideRenderer
+        print("幻灯片在独立的子进程中导出")
+        return WorkerSlideRenderer(render_params['export_worker'])
+    backend = resolve_renderer_name(render_params.get('backend', 'auto'))
+    if backend not in SLIDE_RENDERERS:
+        raise ValueError(f"未知的幻灯片渲染后端: {backend}")
+    print(f"幻灯片渲染后端: {backend}")
+    if backend == 'libreoffice':
+        return LibreOfficeRenderer(render_params.get('soffice_path'), render_params.get('timeout', 300),
+                                   render_params.get('raster_workers'))
+    return PowerPointRenderer(render_params.get('powerpoint_session'))
@@ -0,0 +1,218 @@
+"""
+字幕文件导出
+
+把 ppt_to_video 计算出的逐行字幕时间轴写成字幕文件:
+- ASS: 供ffmpeg的subtitles滤镜在编码时直接烧录
+- SRT/WebVTT: 作为外挂字幕，或以mov_text轨道封装进MP4；修改字幕后只需 -c copy 重新封装
+"""
+import os
+import subprocess
+
+def collect_subtitle_events(segments):
+    """
+    将各片段内的字幕事件换算为整段视频时间轴上的事件
+
+    Parameters:
+    - segments: make_segment 创建的片段列表，片段的 'subtitles' 为 [(开始秒, 结束秒, 文字), ...]，时间相对于片段开头
+
+    Returns:
+    - [(开始秒, 结束秒, 文字), ...]
+    """
+    events = []
+    offset = 0.0
+    for segment in segments:
+        for start, end, text in segment.get('subtitles') or []:
+            start = min(start, segment['duration'])
+            end = min(end, segment['duration'])
+            if end > start and text:
+                events.append((offset + start, offset + end, text))
+        offset += segment['duration']
+    return events
+
+def make_ass_style(font_name="SimHei", font_size=30, font_color=(38, 74, 145), bg_color=None,
+                   play_res=(1920, 1080), margin_v=30, box_padding=5, fonts_dir=None):
+    """
+    创建ASS字幕样式
+
+    Parameters:
+    - font_name: 字体名称(字体族名)
+    - font_size: 字号，单位与画面像素一致
+    - font_color: 字体颜色 (R, G, B)
+    - bg_color: 字幕背景 (R, G, B, A)，为None时不绘制背景
+    - play_res: 画面分辨率，字号和边距都以此为基准
+    - margin_v: 字幕距画面底部的距离
+    - box_padding: 背景框与文字的间距
+    - fonts_dir: 额外的字体目录，传给subtitles滤镜
+
+    Returns:
+    - 样式字典
+    """
+    return {
+        'font_name': font_name,
+        'font_size': font_size,
+        'font_color': tuple(font_color),
+        'bg_color': tuple(bg_color) if bg_color is not None else None,
+        'play_res': tuple(play_res),
+        'margin_v': margin_v,
+        'box_padding': box_padding,
+        'fonts_dir': fonts_dir
+    }
+
+def _ass_color(rgb, alpha=255):
+    """(R, G, B) 与不透明度转换为ASS的 &HAABBGGRR 格式，ASS中00为不透明"""
+    r, g, b = rgb[:3]
+    return f"&H{255 - alpha:02X}{b:02X}{g:02X}{r:02X}"
+
+def _ass_time(seconds):
+    """秒数转换为ASS时间格式 H:MM:SS.cc"""
+    centiseconds = int(round(max(0.0, seconds) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+def _ass_text(text):
+    """转义ASS中有特殊含义的字符"""
+    return text.replace('\\', '＼').replace('{', '｛').replace('}', '｝').replace('\n', '\\N')
+
+def build_ass_document(events, style):
+    """
+    生成ASS字幕文本
+
+    有背景颜色时使用 BorderStyle 3 (不透明背景框)，背景颜色和透明度取自样式中的bg_color。
+    """
+    width, height = style['play_res']
+    bg_color = style.get('bg_color')
+    if bg_color is not None:
+        border_style = 3
+        outline = style.get('box_padding', 5)
+        back_color = _ass_color(bg_color, bg_color[3] if len(bg_color) > 3 else 255)
+    else:
+        border_style = 1
+        outline = 0
+        back_color = _ass_color((0, 0, 0), 0)
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{style['font_name']},{style['font_size']},{_ass_color(style['font_color'])},"
+        f"{_ass_color(style['font_color'])},{back_color},{back_color},0,0,0,0,100,100,0,0,"
+        f"{border_style},{outline},0,2,10,10,{style.get('margin_v', 30)},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+    for start, end, text in events:
+        lines.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{_ass_text(text)}")
+    return "\n".join(lines) + "\n"
+
+def write_ass_file(path, events, style):
+    """写出ASS字幕文件(UTF-8带BOM，兼容Windows上的字幕工具)"""
+    with open(path, 'w', encoding='utf-8-sig') as f:
+        f.write(build_ass_document(events, style))
+    return path
+
+def _escape_filter_value(value):
+    """转义ffmpeg滤镜参数中的路径，Windows路径中的反斜杠和盘符冒号需要处理"""
+    return value.replace('\\', '/').replace(':', '\\:').replace("'", "'\\''")
+
+def subtitles_filter(ass_path, style=None):
+    """生成烧录ASS字幕的ffmpeg subtitles滤镜参数"""
+    value = f"subtitles='{_escape_filter_value(os.path.abspath(ass_path))}'"
+    fonts_dir = (style or {}).get('fonts_dir')
+    if fonts_dir:
+        value += f":fontsdir='{_escape_filter_value(os.path.abspath(fonts_dir))}'"
+    return value
+
+def _timestamp(seconds, separator):
+    """秒数转换为 HH:MM:SS{separator}mmm"""
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+def build_srt_document(events):
+    """生成SRT字幕文本"""
+    blocks = []
+    for number, (start, end, text) in enumerate(events, 1):
+        blocks.append(f"{number}\n{_timestamp(start, ',')} --> {_timestamp(end, ',')}\n{text}\n")
+    return "\n".join(blocks)
+
+def build_vtt_document(events):
+    """生成WebVTT字幕文本"""
+    blocks = ["WEBVTT\n"]
+    for start, end, text in events:
+        # "-->" 在WebVTT正文中不允许出现
+        blocks.append(f"{_timestamp(start, '.')} --> {_timestamp(end, '.')}\n{text.replace('-->', '->')}\n")
+    return "\n".join(blocks)
+
+def write_subtitle_files(base_path, events, formats=('srt', 'vtt')):
+    """
+    按 base_path 写出外挂字幕文件
+
+    Parameters:
+    - base_path: 不含扩展名的输出路径，通常与视频文件同名
+    - events: [(开始秒, 结束秒, 文字), ...]
+    - formats: 要写出的格式，可选 'srt'、'vtt'
+
+    Returns:
+    - {格式: 文件路径} 字典
+    """
+    builders = {'srt': build_srt_document, 'vtt': build_vtt_document}
+    written = {}
+    for subtitle_format in formats:
+        builder = builders.get(subtitle_format)
+        if builder is None:
+            print(f"不支持的字幕格式: {subtitle_format}")
+            continue
+        path = f"{base_path}.{subtitle_format}"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(builder(events))
+        written[subtitle_format] = path
+    return written
+
+def mux_subtitles(video_path, subtitle_path, output_path, language='chi'):
+    """
+    将SRT/VTT字幕以mov_text轨道封装进MP4，音视频流直接复制不重新编码
+
+    视频中原有的字幕轨道会被替换，因此也可用于修改字幕后重新封装。
+    """
+    from video_encoder import get_ffmpeg_binary
+
+    cmd = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-i", video_path, "-i", subtitle_path,
+        "-map", "0:v", "-map", "0:a?", "-map", "1:0",
+        "-c:v", "copy", "-c:a", "copy", "-c:s", "mov_text",
+        "-metadata:s:s:0", f"language={language}",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error_output = result.stderr.decode('utf-8', errors='replace')
+        raise Exception(f"封装字幕失败 (返回码 {result.returncode}): {error_output[-1000:]}")
+    return output_path
+
+def remux_subtitles(video_path, subtitle_path, language='chi'):
+    """
+    用新的字幕文件替换视频中的字幕轨道，原地更新视频文件
+
+    只复制音视频流，几秒内即可完成，适合修改字幕后更新已发布的视频。
+    """
+    base, ext = os.path.splitext(video_path)
+    temp_path = f"{base}_remux{ext}"
+    mux_subtitles(video_path, subtitle_path, temp_path, language)
+    os.replace(temp_path, video_path)
+    print(f"字幕已重新封装: {video_path}")
+    return video_path
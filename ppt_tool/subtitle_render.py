@@ -0,0 +1,203 @@
+"""
+字幕渲染辅助
+
+字体按 (字体路径, 字号) 缓存在进程内，回退顺序只解析一次，避免每行字幕都重新读取数MB的中文字体文件。
+水印图层按 (水印, 画面尺寸, 不透明度) 缓存，每页只在底图上叠加一次。
+字幕只渲染底部的横条，同一页各行共用底图。
+"""
+import threading
+from PIL import Image as PILImage, ImageDraw as PILImageDraw, ImageFont as PILImageFont
+from video_encoder import BandedFrame
+
+# 未指定字体或指定字体无法加载时依次尝试
+DEFAULT_FONT_CANDIDATES = ('simhei.ttf', 'arial.ttf')
+
+_font_lock = threading.Lock()
+_fonts = {}            # (请求的字体路径, 字号) -> 字体对象
+_resolved_paths = {}   # 请求的字体路径 -> 实际可用的字体路径(None表示使用PIL默认字体)
+_font_stats = {'loads': 0, 'hits': 0, 'failures': 0}
+
+def _font_candidates(font_path):
+    candidates = [font_path] if font_path else []
+    return candidates + [path for path in DEFAULT_FONT_CANDIDATES if path != font_path]
+
+def get_subtitle_font(font_size, font_path=None):
+    """
+    获取字幕字体，同一 (字体路径, 字号) 在进程内只加载一次
+
+    Parameters:
+    - font_size: 字号
+    - font_path: 字体文件路径或字体名，为None时使用默认字体(黑体，其次Arial)
+
+    Returns:
+    - PIL字体对象，所有候选字体都无法加载时返回PIL默认字体
+    """
+    key = (font_path, font_size)
+    with _font_lock:
+        font = _fonts.get(key)
+        if font is not None:
+            _font_stats['hits'] += 1
+            return font
+
+        if font_path in _resolved_paths:
+            candidates = [_resolved_paths[font_path]]
+        else:
+            candidates = _font_candidates(font_path)
+
+        font = None
+        for candidate in candidates:
+            if candidate is None:
+                break
+            try:
+                font = PILImageFont.truetype(candidate, font_size)
+                _font_stats['loads'] += 1
+                _resolved_paths[font_path] = candidate
+                break
+            except Exception:
+                _font_stats['failures'] += 1
+
+        if font is None:
+            if font_path not in _resolved_paths:
+                print(f"无法加载字体 {', '.join(_font_candidates(font_path))}，使用默认字体")
+            _resolved_paths[font_path] = None
+            font = PILImageFont.load_default()
+            _font_stats['loads'] += 1
+
+        _fonts[key] = font
+        return font
+
+def font_cache_stats():
+    """返回字体缓存统计: loads(实际加载次数)、hits(命中次数)、failures(加载失败次数)、cached(缓存字体数)"""
+    with _font_lock:
+        stats = dict(_font_stats)
+        stats['cached'] = len(_fonts)
+        return stats
+
+def clear_font_cache():
+    """清空字体缓存和统计，更换字体文件后使用"""
+    with _font_lock:
+        _fonts.clear()
+        _resolved_paths.clear()
+        for name in _font_stats:
+            _font_stats[name] = 0
+
+_watermark_lock = threading.Lock()
+_watermark_layers = {}  # (水印标识, 画面尺寸, 不透明度) -> (RGB水印图, 透明度蒙版)
+_MAX_WATERMARK_LAYERS = 8
+
+def get_watermark_layer(watermark, size, opacity=0.3, cache_key=None):
+    """
+    获取铺满画面的水印图层，同一 (水印, 尺寸, 不透明度) 只缩放和计算一次
+
+    Parameters:
+    - watermark: 水印PIL图片
+    - size: 画面尺寸 (宽, 高)
+    - opacity: 不透明度 0.0-1.0
+    - cache_key: 水印标识(通常为图片路径)，为None时使用图片对象的id
+
+    Returns:
+    - (RGB水印图, L模式透明度蒙版)
+    """
+    key = (cache_key if cache_key is not None else id(watermark), tuple(size), round(opacity, 4))
+    with _watermark_lock:
+        layer = _watermark_layers.get(key)
+        if layer is not None:
+            return layer
+
+    # 水印缩放到与画面相同的尺寸
+    resized = watermark.resize(tuple(size), PILImage.LANCZOS)
+    if resized.mode != 'RGBA':
+        resized = resized.convert('RGBA')
+    # 用查找表一次性缩放透明度通道
+    resized.putalpha(resized.getchannel('A').point([int(x * opacity) for x in range(256)]))
+    # 与原先逐行叠加时的合成方式保持一致：先以自身为蒙版贴到透明图层上
+    transparent = PILImage.new('RGBA', resized.size, (0, 0, 0, 0))
+    transparent.paste(resized, (0, 0), resized)
+    layer = (transparent.convert('RGB'), transparent.getchannel('A'))
+
+    with _watermark_lock:
+        if len(_watermark_layers) >= _MAX_WATERMARK_LAYERS:
+            _watermark_layers.clear()
+        _watermark_layers[key] = layer
+    return layer
+
+def apply_watermark(image, watermark, opacity=0.3, cache_key=None):
+    """
+    将水印叠加到图片上，返回新的RGB图片；watermark为None时原样返回
+    """
+    if watermark is None:
+        return image
+    rgb, alpha = get_watermark_layer(watermark, image.size, opacity, cache_key)
+    result = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+    result.paste(rgb, (0, 0), alpha)
+    return result
+
+def render_subtitle_band(image, text, font, bg_color=None, text_color=(38, 74, 145)):
+    """
+    在底图底部居中绘制一行字幕，只生成字幕所在的横条
+
+    Parameters:
+    - image: 底图(RGB)，不会被修改
+    - text: 字幕文字
+    - font: PIL字体对象
+    - bg_color: 字幕背景颜色，为None时不绘制背景
+    - text_color: 字体颜色
+
+    Returns:
+    - BandedFrame，与在整张底图上直接绘制的结果逐像素相同
+    """
+    # Get text dimensions
+    if hasattr(font, 'getbbox'):
+        bbox = font.getbbox(text)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+        ink_top, ink_bottom = bbox[1], bbox[3]
+    else:
+        text_width, text_height = font.getsize(text)
+        ink_top, ink_bottom = 0, text_height
+
+    # Position at bottom center
+    x_pos = (image.width - text_width) // 2
+    y_pos = image.height - text_height - 30
+
+    # 字幕条覆盖背景矩形和文字的全部像素，上下各留2像素余量
+    band_top = max(0, min(y_pos - 5, y_pos + ink_top) - 2)
+    band_bottom = min(image.height, max(y_pos + text_height + 5 + 1, y_pos + ink_bottom) + 2)
+
+    band = image.crop((0, band_top, image.width, band_bottom))
+    if band.mode != 'RGB':
+        band = band.convert('RGB')
+    draw = PILImageDraw.Draw(band)
+
+    # Draw background (仅当选择了背景颜色时)
+    if bg_color is not None:
+        bg_padding = 10
+        bg_left = x_pos - bg_padding
+        bg_right = x_pos + text_width + bg_padding
+        bg_top = y_pos - 5 - band_top
+        bg_bottom = y_pos + text_height + 5 - band_top
+        draw.rectangle([bg_left, bg_top, bg_right, bg_bottom], fill=bg_color)
+
+    draw.text((x_pos, y_pos - band_top), text, fill=text_color, font=font)
+
+    return BandedFrame(image, band, band_top)
+
+def subtitle_text_color(font_color, bg_color_name):
+    """
+    根据背景调整文本颜色以确保足够的对比度
+
+    深色背景(黑色、蓝色半透明)上的深色字体自动改为白色。
+    """
+    if bg_color_name in ['黑色半透明', '蓝色半透明']:
+        r, g, b = font_color
+        brightness = (0.299 * r + 0.587 * g + 0.114 * b) / 255
+        if brightness < 0.5:  # 如果字体颜色较暗
+            return (255, 255, 255)  # 使用白色代替
+    return tuple(font_color)
+
+def subtitle_font_name(font_size, font_path=None):
+    """返回字幕字体的字体族名，用于ASS样式"""
+    font = get_subtitle_font(font_size, font_path)
+    if hasattr(font, 'getname'):
+        return font.getname()[0]
+    return "SimHei"
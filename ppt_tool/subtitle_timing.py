@@ -0,0 +1,149 @@
+"""
+基于静音检测的字幕时间轴对齐
+
+对已生成的整页音频做短时能量分析，找出句间停顿，再把按文本估算的行边界吸附到最近的停顿上。
+只使用NumPy向量运算，不需要额外的TTS调用，可用合成音频离线测试。
+"""
+import subprocess
+import numpy as np
+
+def load_audio_samples(audio_path, sample_rate=16000):
+    """
+    用ffmpeg将音频解码为单声道浮点采样
+
+    Returns:
+    - 一维 numpy.ndarray，取值范围约为[-1, 1]
+    """
+    from video_encoder import get_ffmpeg_binary
+
+    cmd = [
+        get_ffmpeg_binary(), "-v", "error", "-i", audio_path,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg解码音频失败: {result.stderr.decode('utf-8', errors='ignore')[-500:]}")
+    return np.frombuffer(result.stdout, dtype='<i2').astype(np.float32) / 32768.0
+
+def frame_energy_db(samples, sample_rate, frame_ms=20.0, hop_ms=10.0):
+    """
+    计算短时RMS能量(dB)
+
+    Parameters:
+    - samples: 单声道采样数组
+    - sample_rate: 采样率
+    - frame_ms: 分析窗长度(毫秒)
+    - hop_ms: 窗移(毫秒)
+
+    Returns:
+    - (energy_db, hop_seconds): 每帧能量数组和帧间隔(秒)
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    hop_len = max(1, int(sample_rate * hop_ms / 1000))
+    samples = np.asarray(samples, dtype=np.float32)
+    if len(samples) < frame_len:
+        samples = np.pad(samples, (0, frame_len - len(samples)))
+
+    frame_count = 1 + (len(samples) - frame_len) // hop_len
+    frames = np.lib.stride_tricks.as_strided(
+        samples,
+        shape=(frame_count, frame_len),
+        strides=(samples.strides[0] * hop_len, samples.strides[0])
+    )
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    energy_db = 20 * np.log10(np.maximum(rms, 1e-10))
+    return energy_db, hop_len / sample_rate
+
+def detect_pauses(samples, sample_rate, min_pause=0.15, threshold_db=-35.0, frame_ms=20.0, hop_ms=10.0):
+    """
+    检测音频中的停顿区间
+
+    阈值相对于语音段的响度(能量的95百分位)，因此与音量大小无关。
+
+    Parameters:
+    - min_pause: 最短停顿时长(秒)，更短的静音视为字间间隙
+    - threshold_db: 相对响度阈值(dB)，低于该值的帧视为静音
+
+    Returns:
+    - [(开始时间, 结束时间), ...] 按时间排序的停顿列表，包含开头和结尾的静音
+    """
+    energy_db, hop_seconds = frame_energy_db(samples, sample_rate, frame_ms, hop_ms)
+    if len(energy_db) == 0:
+        return []
+
+    reference_db = np.percentile(energy_db, 95)
+    silent = energy_db < reference_db + threshold_db
+
+    # 找出连续静音帧的起止位置
+    padded = np.concatenate(([False], silent, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = changes[0::2], changes[1::2]
+
+    total_duration = len(samples) / sample_rate
+    pauses = []
+    for start, end in zip(starts, ends):
+        start_time = start * hop_seconds
+        end_time = min(total_duration, end * hop_seconds + frame_ms / 1000)
+        if end_time - start_time >= min_pause:
+            pauses.append((start_time, end_time))
+    return pauses
+
+def snap_line_boundaries(line_durations, pauses, total_duration, max_shift=1.5):
+    """
+    将按估算时长得到的行边界吸附到最近的停顿上
+
+    Parameters:
+    - line_durations: 每行的估算显示时长，总和应约等于total_duration
+    - pauses: detect_pauses 返回的停顿列表
+    - total_duration: 音频总时长(秒)
+    - max_shift: 边界允许移动的最大距离(秒)，超出时保留估算值
+
+    Returns:
+    - 调整后的每行显示时长列表
+    """
+    if len(line_durations) < 2:
+        return list(line_durations)
+
+    # 开头和结尾的静音不能作为行边界
+    inner_pauses = [(start, end) for start, end in pauses if start > 0 and end < total_duration]
+    candidates = np.array([(start + end) / 2 for start, end in inner_pauses])
+
+    estimated = np.cumsum(line_durations)[:-1]
+    boundaries = []
+    previous = 0.0
+    used = np.zeros(len(candidates), dtype=bool)
+    for i, boundary in enumerate(estimated):
+        snapped = boundary
+        if len(candidates):
+            distance = np.abs(candidates - boundary)
+            distance[used | (candidates <= previous)] = np.inf
+            best = int(np.argmin(distance))
+            if distance[best] <= max_shift:
+                snapped = float(candidates[best])
+                used[:best + 1] = True
+        # 保证边界单调递增，并为剩余行留出时间
+        remaining_lines = len(estimated) - i
+        snapped = min(max(snapped, previous + 0.05), total_duration - 0.05 * remaining_lines)
+        boundaries.append(snapped)
+        previous = snapped
+
+    edges = [0.0] + boundaries + [max(total_duration, previous)]
+    return [edges[i + 1] - edges[i] for i in range(len(line_durations))]
+
+def silence_aligned_durations(audio_path, line_durations, total_duration=None, sample_rate=16000, **pause_options):
+    """
+    读取整页音频，按停顿位置修正估算的行时长
+
+    Returns:
+    - 修正后的每行显示时长列表，分析失败时返回None
+    """
+    try:
+        samples = load_audio_samples(audio_path, sample_rate)
+        if total_duration is None:
+            total_duration = len(samples) / sample_rate
+        pauses = detect_pauses(samples, sample_rate, **pause_options)
+        print(f"静音检测: 找到 {len(pauses)} 处停顿")
+        return snap_line_boundaries(line_durations, pauses, total_duration)
+    except Exception as e:
+        print(f"静音检测失败: {e}")
+        return None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# ppt_tool 的模块以平铺方式互相导入(from slide_renderer import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import textwrap
+import pytest
+from export_worker import SlideExportWorker, SlideExportTimeout
+
+# 模拟的PowerPoint: Dispatch 启动一个常驻进程代表 POWERPNT.EXE，Presentations.Open 永远不返回
+FAKE_CLIENT = textwrap.dedent('''
+    import os, sys, time, subprocess
+
+    class _Presentations:
+        Count = 0
+        def Open(self, path, *args, **kwargs):
+            time.sleep(1000)
+
+    class _App:
+        def __init__(self):
+            self.process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(1000)"])
+            self.HWND = self.process.pid
+            with open(os.environ["FAKE_POWERPOINT_PID_FILE"], "w") as f:
+                f.write(str(self.process.pid))
+            self.Presentations = _Presentations()
+
+        def Quit(self):
+            self.process.kill()
+
+    def Dispatch(name):
+        return _App()
+''')
+
+FAKE_PROCESS = textwrap.dedent('''
+    def GetWindowThreadProcessId(hwnd):
+        return 0, hwnd
+''')
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    # 已结束但尚未被回收的进程仍能收到信号0
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return True
+
+@pytest.fixture
+def fake_powerpoint(tmp_path, monkeypatch):
+    package = tmp_path / "fakes" / "win32com"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "client.py").write_text(FAKE_CLIENT)
+    (tmp_path / "fakes" / "win32process.py").write_text(FAKE_PROCESS)
+    pid_file = tmp_path / "powerpoint.pid"
+    # spawn启动的子进程继承 sys.path 和环境变量
+    monkeypatch.syspath_prepend(str(tmp_path / "fakes"))
+    monkeypatch.setenv("FAKE_POWERPOINT_PID_FILE", str(pid_file))
+    return pid_file
+
+def test_open_timeout_kills_powerpoint(fake_powerpoint, tmp_path):
+    deck = tmp_path / "corrupt.pptx"
+    deck.write_bytes(b"")
+    worker = SlideExportWorker({'backend': 'powerpoint'}, open_timeout=5)
+    try:
+        with pytest.raises(SlideExportTimeout):
+            worker.open(str(deck))
+        assert worker.kills == 1
+        powerpoint_pid = int(fake_powerpoint.read_text())
+        deadline = time.time() + 5
+        while _process_alive(powerpoint_pid) and time.time() < deadline:
+            time.sleep(0.1)
+        assert not _process_alive(powerpoint_pid)
+    finally:
+        worker.kill()
+
+# 模拟的 soffice --convert-to pdf: 按pptx的页数生成PDF
+FAKE_SOFFICE = textwrap.dedent('''
+    import os, sys, pymupdf
+    sys.path[:0] = os.environ["FAKE_SOFFICE_PATH"].split(os.pathsep)
+    from slide_renderer import read_pptx_slides
+    args = sys.argv[1:]
+    output_dir, source = args[args.index("--outdir") + 1], args[-1]
+    document = pymupdf.open()
+    for _ in read_pptx_slides(source):
+        document.new_page(width=960, height=540)
+    document.save(os.path.join(output_dir, os.path.splitext(os.path.basename(source))[0] + ".pdf"))
+''')
+
+@pytest.fixture
+def fake_soffice(tmp_path, monkeypatch):
+    pytest.importorskip("pymupdf")
+    soffice = tmp_path / "soffice"
+    soffice.write_text(f"#!{sys.executable}\n{FAKE_SOFFICE}")
+    soffice.chmod(0o755)
+    monkeypatch.setenv("FAKE_SOFFICE_PATH", os.pathsep.join(sys.path))
+    return str(soffice)
+
+def _write_text_deck(path, slide_count):
+    from test_narration_parser import _write_deck, _text_box
+    _write_deck(path, [_text_box(f"title {i + 1}") for i in range(slide_count)])
+    return str(path)
+
+def test_worker_rasterizes_with_process_pool(fake_soffice, tmp_path):
+    # 子进程中的LibreOffice后端按页数启动光栅化进程池，导出子进程不能是守护进程
+    deck = _write_text_deck(tmp_path / "deck.pptx", 8)
+    output_dir = tmp_path / "slides"
+    output_dir.mkdir()
+
+    worker = SlideExportWorker({'backend': 'libreoffice', 'soffice_path': fake_soffice, 'raster_workers': 2})
+    try:
+        assert worker.open(deck) == 8
+        results = worker.export_slides(list(range(8)), str(output_dir), 320, 180)
+        assert sorted(results) == list(range(1, 9))
+        assert all((output_dir / f"slide_{i}.png").exists() for i in range(1, 9))
+    finally:
+        worker.stop()
+
+def test_callback_error_leaves_protocol_in_sync(fake_soffice, tmp_path):
+    # 回调出错后，本次导出的剩余消息不能被下一个请求当作回复
+    first = _write_text_deck(tmp_path / "first.pptx", 4)
+    second = _write_text_deck(tmp_path / "second.pptx", 3)
+    output_dir = tmp_path / "slides"
+    output_dir.mkdir()
+
+    def on_slide(processed_idx, result):
+        raise ValueError("pipeline stopped")
+
+    worker = SlideExportWorker({'backend': 'libreoffice', 'soffice_path': fake_soffice})
+    try:
+        worker.open(first)
+        with pytest.raises(ValueError):
+            worker.export_slides(list(range(4)), str(output_dir), 320, 180, on_slide=on_slide)
+        worker.close_presentation()
+        assert worker.open(second) == 3
+        assert worker.kills == 0
+    finally:
+        worker.stop()
+
+def test_worker_renderer_reports_real_backend():
+    # 片段缓存键按实际的渲染后端区分画面，不能都记为 'worker'
+    from export_worker import WorkerSlideRenderer
+    assert WorkerSlideRenderer(SlideExportWorker({'backend': 'powerpoint'})).backend == 'powerpoint'
+    assert WorkerSlideRenderer(SlideExportWorker({'backend': 'libreoffice'})).backend == 'libreoffice'
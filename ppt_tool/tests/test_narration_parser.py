@@ -0,0 +1,56 @@
+import zipfile
+import pytest
+from slide_renderer import read_pptx_slides
+from narration_parser import parse_narrations, preflight_narrations
+
+P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+def _text_box(text):
+    paragraphs = "".join(f"<a:p><a:r><a:t>{line}</a:t></a:r></a:p>" for line in text.split("\n"))
+    return f"<p:sp><p:txBody>{paragraphs}</p:txBody></p:sp>"
+
+def _write_deck(path, slides):
+    """写出只包含文字的最小pptx，slides 为每页 spTree 内的XML"""
+    with zipfile.ZipFile(path, 'w') as package:
+        ids = "".join(f'<p:sldId id="{256 + i}" r:id="rId{i + 1}"/>' for i in range(len(slides)))
+        package.writestr('ppt/presentation.xml',
+                         f'<p:presentation xmlns:p="{P}" xmlns:r="{R}"><p:sldIdLst>{ids}</p:sldIdLst></p:presentation>')
+        rels = "".join(f'<Relationship Id="rId{i + 1}" Target="slides/slide{i + 1}.xml"/>' for i in range(len(slides)))
+        package.writestr('ppt/_rels/presentation.xml.rels',
+                         f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{rels}</Relationships>')
+        for i, shapes in enumerate(slides):
+            package.writestr(f'ppt/slides/slide{i + 1}.xml',
+                             f'<p:sld xmlns:p="{P}" xmlns:a="{A}"><p:cSld><p:spTree>{shapes}</p:spTree></p:cSld></p:sld>')
+
+def test_parse_page_markers():
+    narrations = parse_narrations("page1: 第一页\npage2：第二页", 3, verbose=False)
+    assert narrations == {0: "第一页", 1: "第二页"}
+
+def test_parse_numbered_list():
+    assert parse_narrations("1. 第一页\n2. 第二页", 3, verbose=False) == {0: "第一页", 1: "第二页"}
+
+def test_parse_numbered_list_from_powerpoint_text():
+    # PowerPoint的 TextRange.Text 以 \r 分隔段落、\x0b 表示段内换行
+    narrations = parse_narrations("1. 第一页\r2. 第二页\x0b第二行\r", 3, verbose=False)
+    assert narrations == {0: "第一页", 1: "第二页\n第二行"}
+
+def test_parse_rejects_missing_marker():
+    with pytest.raises(ValueError):
+        parse_narrations("page1: 第一页\npage3: 第三页", 4, verbose=False)
+
+def test_grouped_text_box_is_ignored(tmp_path):
+    # PowerPoint的 Slide.Shapes 不展开组合，组合内的旁白标记不会被读取
+    deck = tmp_path / "grouped.pptx"
+    _write_deck(deck, [
+        _text_box("标题"),
+        _text_box("page1: 顶层旁白") + f"<p:grpSp>{_text_box('page2: 组内旁白')}</p:grpSp>",
+    ])
+    slides = read_pptx_slides(str(deck))
+    assert slides[1][0] == "page1: 顶层旁白\n"
+
+    _write_deck(deck, [_text_box("标题"), _text_box("标题"),
+                       _text_box("page1: 第一页") + f"<p:grpSp>{_text_box('page2: 第二页')}</p:grpSp>"])
+    with pytest.raises(ValueError):
+        preflight_narrations(str(deck))
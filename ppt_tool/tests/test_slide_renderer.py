@@ -0,0 +1,75 @@
+import zipfile
+from slide_renderer import hash_pptx_slides
+
+P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+LAYOUT = R + '/slideLayout'
+NOTES = R + '/notesSlide'
+FONT = R + '/font'
+SLIDE_NUMBER = f'<a:fld xmlns:a="{A}" id="{{B6F15528-21DE-4FAA-801E-634DDDAF4B2B}}" type="slidenum"><a:t>‹#›</a:t></a:fld>'
+
+def _rels(*relationships):
+    items = "".join(f'<Relationship Id="rId{i + 1}" Type="{rel_type}" Target="{target}"/>'
+                    for i, (rel_type, target) in enumerate(relationships))
+    return f'<Relationships xmlns="{RELS}">{items}</Relationships>'
+
+def _write_deck(path, slide_texts, layout="layout", notes="notes", font=None):
+    """写出各页共用一个版式、各带一页备注的最小pptx；slide_texts 中的内容原样写入幻灯片XML"""
+    with zipfile.ZipFile(path, 'w') as package:
+        ids = "".join(f'<p:sldId id="{256 + i}" r:id="rId{i + 1}"/>' for i in range(len(slide_texts)))
+        package.writestr('ppt/presentation.xml',
+                         f'<p:presentation xmlns:p="{P}" xmlns:r="{R}"><p:sldIdLst>{ids}</p:sldIdLst>'
+                         f'<p:sldSz cx="12192000" cy="6858000"/></p:presentation>')
+        relationships = [(R + '/slide', f"slides/slide{i + 1}.xml") for i in range(len(slide_texts))]
+        if font is not None:
+            relationships.append((FONT, "fonts/font1.fntdata"))
+            package.writestr('ppt/fonts/font1.fntdata', font)
+        package.writestr('ppt/_rels/presentation.xml.rels', _rels(*relationships))
+        package.writestr('ppt/slideLayouts/slideLayout1.xml', f'<p:sldLayout xmlns:p="{P}"><!--{layout}--></p:sldLayout>')
+        for i, text in enumerate(slide_texts):
+            package.writestr(f'ppt/slides/slide{i + 1}.xml', f'<p:sld xmlns:p="{P}">{text}</p:sld>')
+            package.writestr(f'ppt/slides/_rels/slide{i + 1}.xml.rels',
+                             _rels((LAYOUT, "../slideLayouts/slideLayout1.xml"), (NOTES, f"../notesSlides/notesSlide{i + 1}.xml")))
+            package.writestr(f'ppt/notesSlides/notesSlide{i + 1}.xml', f'<p:notes xmlns:p="{P}"><!--{notes}--></p:notes>')
+
+def test_slide_hash_follows_slide_content(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    _write_deck(deck, ["one", "two"])
+    original = hash_pptx_slides(deck)
+    assert len(original) == 2 and original[0] != original[1]
+
+    _write_deck(deck, ["one", "changed"])
+    edited = hash_pptx_slides(deck)
+    assert edited[0] == original[0] and edited[1] != original[1]
+
+def test_slide_hash_covers_layout_but_not_notes(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    _write_deck(deck, ["one", "two"])
+    original = hash_pptx_slides(deck)
+
+    _write_deck(deck, ["one", "two"], notes="edited notes")
+    assert hash_pptx_slides(deck) == original
+
+    _write_deck(deck, ["one", "two"], layout="edited layout")
+    assert all(new != old for new, old in zip(hash_pptx_slides(deck), original))
+
+def test_slide_hash_follows_position_of_slide_number_field(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    _write_deck(deck, [SLIDE_NUMBER, "plain"])
+    numbered_first, plain_second = hash_pptx_slides(deck)
+
+    # 调换顺序后带页码的幻灯片显示的页码不同，不带字段的幻灯片画面不变
+    _write_deck(deck, ["plain", SLIDE_NUMBER])
+    plain_first, numbered_second = hash_pptx_slides(deck)
+    assert numbered_second != numbered_first
+    assert plain_first == plain_second
+
+def test_slide_hash_covers_embedded_fonts(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    _write_deck(deck, ["one", "two"], font=b"font v1")
+    original = hash_pptx_slides(deck)
+
+    _write_deck(deck, ["one", "two"], font=b"font v2")
+    assert all(new != old for new, old in zip(hash_pptx_slides(deck), original))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from subtitle_timing import detect_pauses, snap_line_boundaries
+
+SAMPLE_RATE = 16000
+
+def _audio(*segments):
+    """按 (时长, 是否发声) 拼接合成音频，发声段为440Hz正弦波"""
+    parts = []
+    for duration, voiced in segments:
+        t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+        parts.append(0.5 * np.sin(2 * np.pi * 440 * t) if voiced else np.zeros_like(t))
+    return np.concatenate(parts).astype(np.float32)
+
+def _boundaries(durations):
+    return list(np.cumsum(durations)[:-1])
+
+def test_detect_pauses_finds_silent_gaps():
+    samples = _audio((1.0, True), (0.4, False), (1.0, True), (0.05, False), (1.0, True))
+    pauses = detect_pauses(samples, SAMPLE_RATE)
+    # 0.05秒的间隙短于 min_pause，不算停顿
+    assert len(pauses) == 1
+    start, end = pauses[0]
+    assert start == pytest.approx(1.0, abs=0.05)
+    assert end == pytest.approx(1.4, abs=0.05)
+
+def test_boundaries_snap_to_pauses():
+    samples = _audio((1.0, True), (0.4, False), (1.5, True), (0.4, False), (1.0, True))
+    total = len(samples) / SAMPLE_RATE
+    pauses = detect_pauses(samples, SAMPLE_RATE)
+
+    durations = snap_line_boundaries([1.5, 1.5, total - 3.0], pauses, total)
+    boundaries = _boundaries(durations)
+    assert boundaries[0] == pytest.approx(1.2, abs=0.05)
+    assert boundaries[1] == pytest.approx(3.1, abs=0.05)
+    assert sum(durations) == pytest.approx(total)
+
+def test_boundaries_respect_max_shift():
+    samples = _audio((1.0, True), (0.4, False), (3.0, True))
+    total = len(samples) / SAMPLE_RATE
+    pauses = detect_pauses(samples, SAMPLE_RATE)
+
+    # 估算边界距停顿约1.8秒，超过 max_shift 时保留估算值
+    estimated = [3.0, total - 3.0]
+    assert snap_line_boundaries(estimated, pauses, total, max_shift=1.0) == pytest.approx(estimated)
+    assert _boundaries(snap_line_boundaries(estimated, pauses, total, max_shift=2.0))[0] == pytest.approx(1.2, abs=0.05)
+
+def test_no_pause_keeps_estimates():
+    samples = _audio((3.0, True))
+    total = len(samples) / SAMPLE_RATE
+    pauses = detect_pauses(samples, SAMPLE_RATE)
+
+    estimated = [1.2, 1.8]
+    assert [pause for pause in pauses if 0 < pause[0] and pause[1] < total] == []
+    assert snap_line_boundaries(estimated, pauses, total) == pytest.approx(estimated)
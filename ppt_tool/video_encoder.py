@@ -0,0 +1,781 @@
+"""
+视频编码后端
+
+ppt_to_video 先把每一页整理成一个"片段"(segment)，再交给这里的编码后端输出视频:
+- moviepy: 原有方式，由moviepy逐帧合成后再交给ffmpeg
+- ffmpeg_pipe: 把内存中的画面以rawvideo格式直接写入一个常驻ffmpeg进程的stdin，
+  相同画面只转换一次，重复帧直接重复写入
+- ffmpeg_still: 可变帧率，每张不同的画面只编码一帧，帧切换和关键帧都落在字幕行边界上
+
+开启分段并行编码时，每个片段在进程池中按相同的编码参数单独编码，
+最后用ffmpeg的concat demuxer无损拼接 (-c copy)；ppt_to_video 的流水线用 encode_single_segment
+在每页渲染完成后立即编码该页，同样最后拼接。
+"""
+import os
+import time
+import subprocess
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips, concatenate_audioclips
+from moviepy.config import get_setting
+from subtitle_export import collect_subtitle_events, write_ass_file, subtitles_filter
+
+# 可选的编码后端
+ENCODER_BACKENDS = ('moviepy', 'ffmpeg_pipe', 'ffmpeg_still')
+
+DEFAULT_FPS = 24
+
+# 两种后端共用的x264参数，保证输出一致、便于对比
+X264_PARAMS = [
+    "-preset", "medium",
+    "-crf", "21",
+    "-movflags", "+faststart",
+    "-profile:v", "high",
+    "-tune", "stillimage"
+]
+
+# 可变帧率静态画面使用的x264参数: 帧数很少，每帧都值得更高的质量；
+# 关键帧只在画面切换时强制插入，不再按固定间隔插入
+X264_STILL_PARAMS = [
+    "-preset", "slow",
+    "-crf", "18",
+    "-movflags", "+faststart",
+    "-profile:v", "high",
+    "-tune", "stillimage",
+    "-x264-params", "keyint=infinite:min-keyint=1:scenecut=0:bframes=0"
+]
+
+# 结尾淡出在可变帧率模式下用若干张逐渐变暗的画面实现
+STILL_FADE_STEPS = 12
+
+# 图片默认按25fps的时间基读入，时间戳会被取整到40毫秒；改为毫秒时间基以精确对齐字幕
+STILL_TIMEBASE_OPTION = "option framerate 1000"
+
+class BandedFrame:
+    """
+    只有一条横向区域与底图不同的画面
+
+    字幕只占画面底部一窄条，同一页各行字幕共用一张底图，每行只保存自己的字幕条，
+    编码时由后端把底图与字幕条拼成完整画面，不再为每行复制整张图片。
+    """
+
+    def __init__(self, base, band, top):
+        self.base = base    # 整页底图(RGB)，同一页各行共用
+        self.band = band    # 字幕条(RGB)，宽度与底图相同
+        self.top = top      # 字幕条在底图中的起始行
+
+    @property
+    def size(self):
+        return self.base.size
+
+    def to_image(self):
+        """合成为完整的PIL图片"""
+        image = self.base.copy()
+        image.paste(self.band, (0, self.top))
+        return image
+
+def frame_to_image(frame):
+    """将画面(PIL图片或BandedFrame)转换为完整的RGB PIL图片"""
+    if isinstance(frame, BandedFrame):
+        return frame.to_image()
+    return frame.convert('RGB') if frame.mode != 'RGB' else frame
+
+def make_segment(index, frames, audio_path, duration, subtitles=None):
+    """
+    创建一页幻灯片的片段描述
+
+    Parameters:
+    - index: 处理序号（从1开始）
+    - frames: [(画面, 显示时长秒数), ...]，按显示顺序排列；画面为PIL图片或BandedFrame
+    - audio_path: 该页的音频文件路径
+    - duration: 片段最终时长（秒），音频和画面都截取到这个长度
+    - subtitles: 由ffmpeg烧录的字幕事件 [(开始秒, 结束秒, 文字), ...]，时间相对于片段开头
+
+    Returns:
+    - 片段字典
+    """
+    return {
+        'index': index,
+        'frames': frames,
+        'audio_path': audio_path,
+        'duration': duration,
+        'subtitles': subtitles or []
+    }
+
+def get_ffmpeg_binary():
+    """返回moviepy所使用的ffmpeg可执行文件路径"""
+    return get_setting("FFMPEG_BINARY")
+
+def get_encode_threads():
+    """根据CPU核心数计算编码线程数"""
+    cpu_count = multiprocessing.cpu_count()
+    return max(2, min(12, int(cpu_count * 0.75)))
+
+def build_still_sequence_clip(frames, total_duration=None, fallback_image=None):
+    """
+    将按行渲染的字幕画面拼接为视频片段，每张画面只转换一次并按其时长保持显示
+
+    Parameters:
+    - frames: [(画面, 显示时长秒数), ...]，按显示顺序排列；画面为PIL图片或BandedFrame
+    - total_duration: 片段应有的总时长；若各行时长之和不足，则延长最后一张画面
+    - fallback_image: 没有任何有效画面时使用的图片
+
+    Returns:
+    - moviepy视频片段
+    """
+    still_clips = []
+    base_arrays = {}  # 同一页的底图只转换一次
+    for image, duration in frames:
+        if duration <= 0:
+            continue
+        if isinstance(image, BandedFrame):
+            base_key = id(image.base)
+            if base_key not in base_arrays:
+                base_arrays[base_key] = np.array(image.base.convert('RGB'))
+            array = base_arrays[base_key].copy()
+            band_array = np.array(image.band.convert('RGB'))
+            array[image.top:image.top + band_array.shape[0]] = band_array
+        else:
+            array = np.array(image.convert('RGB'))
+        still_clips.append(ImageClip(array).set_duration(duration))
+
+    if not still_clips:
+        if fallback_image is None:
+            raise ValueError("没有可用的字幕画面")
+        still_clips.append(ImageClip(np.array(frame_to_image(fallback_image))).set_duration(total_duration or 0))
+
+    # 时长之和不足时，延长最后一张画面
+    covered_duration = sum(clip.duration for clip in still_clips)
+    if total_duration is not None and covered_duration < total_duration:
+        last_clip = still_clips[-1]
+        still_clips[-1] = last_clip.set_duration(last_clip.duration + total_duration - covered_duration)
+
+    if len(still_clips) == 1:
+        return still_clips[0]
+    return concatenate_videoclips(still_clips, method="chain")
+
+def build_segment_clip(segment):
+    """
+    将片段转换为带音频的moviepy视频片段
+
+    Returns:
+    - (视频片段, 音频片段)，音频片段需由调用方关闭
+    """
+    audio_clip = AudioFileClip(segment['audio_path'])
+    duration = min(segment['duration'], audio_clip.duration)
+    video_clip = build_still_sequence_clip(segment['frames'], duration)
+    if video_clip.duration > duration:
+        video_clip = video_clip.subclip(0, duration)
+    video_clip = video_clip.set_audio(audio_clip.subclip(0, duration))
+    return video_clip, audio_clip
+
+def encode_segments(segments, output_path, temp_dir, encoder_params=None):
+    """
+    按选定的编码后端将片段编码为最终视频
+
+    Parameters:
+    - segments: make_segment 创建的片段列表
+    - output_path: 输出视频路径
+    - temp_dir: 可用于存放中间文件的临时目录
+    - encoder_params: 编码参数字典
+                    Optional keys: 'backend' ('moviepy'、'ffmpeg_pipe' 或 'ffmpeg_still'，默认 'moviepy'),
+                                   'fps' (默认24，ffmpeg_still 为可变帧率不使用此项), 'fade_out' (结尾淡出秒数，默认0.5),
+                                   'parallel_segments' (是否分段并行编码，默认False),
+                                   'parallel_workers' (并行进程数，默认为CPU核心数),
+                                   'subtitle_style' (make_ass_style 创建的样式；设置后片段中的字幕事件由ffmpeg烧录),
+                                   'segment_cache' (DiskLRUCache；设置后逐页编码并缓存，已缓存的片段直接复用)
+    """
+    if encoder_params is None:
+        encoder_params = {}
+
+    backend = encoder_params.get('backend', 'moviepy')
+    if backend not in ENCODER_BACKENDS:
+        print(f"未知的编码后端 {backend}，使用 moviepy")
+        backend = 'moviepy'
+
+    fps = encoder_params.get('fps', DEFAULT_FPS)
+    fade_out = encoder_params.get('fade_out', 0.5)
+    subtitle_style = encoder_params.get('subtitle_style')
+
+    total_duration = sum(segment['duration'] for segment in segments)
+    print(f"编码后端: {backend}，片段数: {len(segments)}，总时长: {total_duration:.2f}秒")
+
+    start_time = time.time()
+    encoded = False
+    segment_cache = encoder_params.get('segment_cache')
+    if segment_cache is not None:
+        # 缓存命中的片段没有画面数据，无法回退到整体编码，出错时直接抛出
+        encode_segments_incremental(segments, output_path, temp_dir, segment_cache, backend, fps, fade_out,
+                                    encoder_params.get('parallel_segments', False),
+                                    encoder_params.get('parallel_workers'), subtitle_style)
+        encoded = True
+    elif encoder_params.get('parallel_segments', False) and len(segments) > 1:
+        try:
+            encode_segments_parallel(segments, output_path, temp_dir, backend, fps, fade_out,
+                                     encoder_params.get('parallel_workers'), subtitle_style)
+            encoded = True
+        except Exception as e:
+            print(f"分段并行编码失败 ({e})，改为整体编码...")
+            print(traceback.format_exc())
+
+    if not encoded:
+        _encode_with_backend(backend, segments, output_path, temp_dir, fps, fade_out, subtitle_style=subtitle_style)
+    elapsed = time.time() - start_time
+
+    # 输出吞吐量，便于在同一个演示文稿上比较不同后端；可变帧率后端没有固定帧率，只报告编码速度
+    speed = total_duration / max(elapsed, 1e-6)
+    if backend == 'ffmpeg_still':
+        print(f"编码耗时: {elapsed:.2f}秒，编码速度 {speed:.1f}x 实时")
+    else:
+        print(f"编码耗时: {elapsed:.2f}秒，约 {speed * fps:.1f} 帧/秒，编码速度 {speed:.1f}x 实时")
+
+def _encode_with_backend(backend, segments, output_path, temp_dir, fps, fade_out, threads=None, subtitle_style=None):
+    """使用指定后端将一组片段编码为一个视频文件"""
+    subtitles_vf = prepare_burned_subtitles(segments, output_path, temp_dir, subtitle_style)
+    if backend == 'ffmpeg_pipe':
+        encode_with_ffmpeg_pipe(segments, output_path, temp_dir, fps=fps, fade_out=fade_out, threads=threads,
+                                subtitles_vf=subtitles_vf)
+    elif backend == 'ffmpeg_still':
+        encode_with_ffmpeg_still(segments, output_path, temp_dir, fade_out=fade_out, threads=threads,
+                                 subtitles_vf=subtitles_vf)
+    else:
+        encode_with_moviepy(segments, output_path, fps=fps, fade_out=fade_out, threads=threads, temp_dir=temp_dir,
+                            subtitles_vf=subtitles_vf)
+
+def prepare_burned_subtitles(segments, output_path, temp_dir, subtitle_style):
+    """
+    为要编码的片段写出ASS字幕文件
+
+    Returns:
+    - subtitles滤镜参数；未设置样式或没有字幕事件时返回None
+    """
+    if not subtitle_style:
+        return None
+    events = collect_subtitle_events(segments)
+    if not events:
+        return None
+    output_stem = os.path.splitext(os.path.basename(output_path))[0]
+    ass_path = write_ass_file(os.path.join(temp_dir, f"{output_stem}.ass"), events, subtitle_style)
+    print(f"已生成ASS字幕 ({len(events)} 条)，由ffmpeg烧录: {ass_path}")
+    return subtitles_filter(ass_path, subtitle_style)
+
+def _encode_segment_job(job):
+    """进程池任务: 将单个片段编码为独立的MP4文件"""
+    backend, segment, output_path, temp_dir, fps, fade_out, threads, subtitle_style = job
+    _encode_with_backend(backend, [segment], output_path, temp_dir, fps, fade_out, threads, subtitle_style)
+    return output_path
+
+def encode_single_segment(segment, output_path, temp_dir, encoder_params=None, is_last=False, threads=None):
+    """
+    按选定的编码后端把一个片段单独编码为MP4，编码参数与分段并行编码一致，可与其他片段无损拼接
+
+    Parameters:
+    - segment: make_segment 创建的片段
+    - output_path: 输出的MP4路径
+    - temp_dir: 存放中间文件的临时目录
+    - encoder_params: 编码参数字典，同 encode_segments
+    - is_last: 是否为最后一个片段，结尾淡出只作用于最后一个片段
+    - threads: x264线程数，默认按CPU核心数计算
+    """
+    if encoder_params is None:
+        encoder_params = {}
+    backend = encoder_params.get('backend', 'moviepy')
+    if backend not in ENCODER_BACKENDS:
+        backend = 'moviepy'
+    fade_out = encoder_params.get('fade_out', 0.5) if is_last else 0
+    start_time = time.time()
+    _encode_with_backend(backend, [segment], output_path, temp_dir, encoder_params.get('fps', DEFAULT_FPS),
+                         fade_out, threads, encoder_params.get('subtitle_style'))
+    print(f"片段 {segment['index']} 编码完成 ({segment['duration']:.2f}秒)，耗时 {time.time() - start_time:.2f}秒")
+    return output_path
+
+def encode_segments_parallel(segments, output_path, temp_dir, backend='moviepy', fps=DEFAULT_FPS, fade_out=0.5, workers=None, subtitle_style=None):
+    """
+    在进程池中按相同编码参数分别编码每个片段，再用concat demuxer无损拼接
+
+    Parameters:
+    - segments: 片段列表
+    - output_path: 输出视频路径
+    - temp_dir: 存放分段文件的临时目录
+    - backend: 每个片段使用的编码后端
+    - fps: 帧率
+    - fade_out: 结尾淡出秒数，只作用于最后一个片段
+    - workers: 并行进程数，默认为CPU核心数
+    - subtitle_style: ASS字幕样式，设置后每个片段烧录自己的字幕
+    """
+    cpu_count = multiprocessing.cpu_count()
+    if not workers:
+        workers = cpu_count
+    workers = max(1, min(workers, len(segments)))
+    # 每个进程分到的x264线程数，避免总线程数远超核心数
+    threads_per_job = max(1, cpu_count // workers)
+
+    segments_dir = os.path.join(temp_dir, "segments")
+    os.makedirs(segments_dir, exist_ok=True)
+
+    jobs = []
+    for position, segment in enumerate(segments):
+        segment_path = os.path.join(segments_dir, f"segment_{position:04d}.mp4")
+        segment_fade = fade_out if position == len(segments) - 1 else 0
+        jobs.append((backend, segment, segment_path, segments_dir, fps, segment_fade, threads_per_job, subtitle_style))
+
+    print(f"分段并行编码: {len(jobs)} 个片段，{workers} 个进程，每个进程 {threads_per_job} 个编码线程")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_encode_segment_job, job): job for job in jobs}
+        finished = 0
+        for future in as_completed(futures):
+            future.result()
+            finished += 1
+            print(f"  片段编码完成 {finished}/{len(jobs)}")
+
+    concat_segment_files([job[2] for job in jobs], output_path, temp_dir)
+
+def encode_segments_incremental(segments, output_path, temp_dir, segment_cache, backend='moviepy', fps=DEFAULT_FPS,
+                                fade_out=0.5, parallel=False, workers=None, subtitle_style=None):
+    """
+    增量编码: 只编码没有缓存的片段，编码结果存入缓存，再与缓存命中的片段无损拼接
+
+    Parameters:
+    - segments: 片段列表；缓存命中的片段带有 'encoded_path'，需要编码的片段可带 'cache_key'
+    - segment_cache: 存放已编码片段的 DiskLRUCache
+    - parallel: 是否在进程池中并行编码各片段
+    - 其余参数同 encode_segments_parallel
+    """
+    from segment_cache import store_cached_segment
+
+    segments_dir = os.path.join(temp_dir, "segments")
+    os.makedirs(segments_dir, exist_ok=True)
+
+    segment_paths = []
+    jobs = []
+    for position, segment in enumerate(segments):
+        if segment.get('encoded_path'):
+            segment_paths.append(segment['encoded_path'])
+            continue
+        segment_path = os.path.join(segments_dir, f"segment_{position:04d}.mp4")
+        segment_paths.append(segment_path)
+        segment_fade = fade_out if position == len(segments) - 1 else 0
+        jobs.append((backend, segment, segment_path, segments_dir, fps, segment_fade, None, subtitle_style))
+
+    print(f"增量编码: 复用 {len(segments) - len(jobs)} 个缓存片段，编码 {len(jobs)} 个片段")
+
+    if parallel and len(jobs) > 1:
+        cpu_count = multiprocessing.cpu_count()
+        workers = max(1, min(workers or cpu_count, len(jobs)))
+        threads_per_job = max(1, cpu_count // workers)
+        jobs = [job[:6] + (threads_per_job,) + job[7:] for job in jobs]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_encode_segment_job, jobs))
+    else:
+        for job in jobs:
+            _encode_segment_job(job)
+
+    for job in jobs:
+        segment, segment_path = job[1], job[2]
+        if segment.get('cache_key'):
+            store_cached_segment(segment_cache, segment['cache_key'], segment, segment_path)
+
+    concat_segment_files(segment_paths, output_path, temp_dir)
+
+def concat_segment_files(segment_paths, output_path, temp_dir):
+    """
+    使用ffmpeg的concat demuxer将编码参数一致的MP4片段无损拼接 (-c copy)
+    """
+    list_path = os.path.join(temp_dir, "concat_list.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for segment_path in segment_paths:
+            f.write(f"file '{_escape_concat_path(segment_path)}'\n")
+
+    cmd = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-c", "copy", "-movflags", "+faststart",
+        output_path
+    ]
+    print(f"无损拼接 {len(segment_paths)} 个片段...")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error_output = result.stderr.decode('utf-8', errors='replace')
+        raise Exception(f"ffmpeg拼接失败 (返回码 {result.returncode}): {error_output[-1000:]}")
+
+def _escape_concat_path(path):
+    """转换为concat列表可用的路径格式"""
+    return os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+
+def encode_with_moviepy(segments, output_path, fps=DEFAULT_FPS, fade_out=0.5, threads=None, temp_dir=None, subtitles_vf=None):
+    """使用moviepy合成所有片段并导出视频，subtitles_vf为烧录字幕的滤镜参数"""
+    # moviepy默认把临时音频写到当前目录，指定临时目录时放到其中，避免并行编码时互相覆盖
+    temp_audiofile = None
+    if temp_dir:
+        output_stem = os.path.splitext(os.path.basename(output_path))[0]
+        temp_audiofile = os.path.join(temp_dir, f"{output_stem}_TEMP_MPY_wvf_snd.m4a")
+
+    clips = []
+    audio_clips = []
+    try:
+        for segment in segments:
+            video_clip, audio_clip = build_segment_clip(segment)
+            clips.append(video_clip)
+            audio_clips.append(audio_clip)
+
+        # 移除交叉淡入淡出效果，因为它会导致黑屏问题
+        # 直接拼接视频片段，依靠音频中的静音缓冲区避免噪音
+        final_clip = concatenate_videoclips(clips, method="compose")  # 仅使用compose方法而非crossfade
+
+        # 添加整体淡入淡出效果
+        if fade_out and final_clip.duration > 2.0:
+            final_clip = final_clip.fadein(0.0).fadeout(fade_out)
+
+        try:
+            # 首先尝试使用多线程导出
+            cpu_count = multiprocessing.cpu_count()
+            if threads is None:
+                threads = get_encode_threads()
+            print(f"检测到 {cpu_count} 个CPU核心，将使用 {threads} 个线程进行视频导出")
+
+            ffmpeg_params = list(X264_PARAMS)
+
+            # 添加安全参数以处理特殊字符
+            ffmpeg_params.extend(["-ignore_unknown", "-strict", "experimental"])
+            if subtitles_vf:
+                ffmpeg_params.extend(["-vf", subtitles_vf])
+
+            final_clip.write_videofile(
+                output_path,
+                fps=fps,
+                codec='libx264',
+                audio_codec='aac',
+                audio_bitrate='192k',
+                threads=threads,
+                ffmpeg_params=ffmpeg_params,
+                temp_audiofile=temp_audiofile,
+                logger=None,
+                verbose=False
+            )
+            print(f"视频成功导出到临时位置")
+        except Exception as e:
+            print(f"多线程导出失败 ({e})，将使用单线程导出...")
+
+            try:
+                # 简化参数的单线程备选方案
+                final_clip.write_videofile(
+                    output_path,
+                    fps=fps,
+                    codec='libx264',
+                    audio_codec='aac',
+                    ffmpeg_params=["-vf", subtitles_vf] if subtitles_vf else None,
+                    verbose=False,
+                    logger=None
+                )
+                print(f"单线程导出成功")
+            except Exception as e2:
+                print(f"单线程导出也失败 ({e2})，尝试使用最简单的设置...")
+
+                # 最后的备选方法 - 使用最简单的设置
+                try:
+                    final_clip.write_videofile(
+                        output_path,
+                        verbose=False,
+                        logger=None
+                    )
+                    print(f"使用最简单设置导出成功")
+                except Exception as e3:
+                    print(f"所有导出方法都失败: {e3}")
+                    raise
+    finally:
+        for clip in audio_clips:
+            try:
+                clip.close()
+            except:
+                pass
+
+def write_concatenated_audio(segments, output_path):
+    """将各片段的音频按片段时长截取后拼接，写入WAV文件"""
+    audio_clips = []
+    try:
+        parts = []
+        for segment in segments:
+            audio_clip = AudioFileClip(segment['audio_path'])
+            audio_clips.append(audio_clip)
+            parts.append(audio_clip.subclip(0, min(segment['duration'], audio_clip.duration)))
+
+        full_audio = concatenate_audioclips(parts)
+        full_audio.write_audiofile(output_path, fps=44100, codec='pcm_s16le', verbose=False, logger=None)
+    finally:
+        for clip in audio_clips:
+            try:
+                clip.close()
+            except:
+                pass
+
+def encode_with_ffmpeg_pipe(segments, output_path, temp_dir, fps=DEFAULT_FPS, fade_out=0.5, threads=None, subtitles_vf=None):
+    """
+    将片段画面以rawvideo格式直接写入一个常驻ffmpeg进程，绕过moviepy的逐帧合成
+
+    每张画面只转换一次为RGB字节，重复帧直接重复写入同一块内存。
+    BandedFrame只转换字幕条，字幕条上下的部分直接引用底图字节。
+    帧数按累计时长取整，避免逐行取整带来的时间漂移。
+    """
+    first_image = segments[0]['frames'][0][0]
+    width, height = first_image.size
+    # libx264 的 yuv420p 要求宽高为偶数
+    width -= width % 2
+    height -= height % 2
+
+    # 中间文件以输出文件名区分，便于多个编码进程共用临时目录
+    output_stem = os.path.splitext(os.path.basename(output_path))[0]
+    audio_path = os.path.join(temp_dir, f"{output_stem}_audio.wav")
+    print("拼接音频轨道...")
+    write_concatenated_audio(segments, audio_path)
+
+    total_duration = sum(segment['duration'] for segment in segments)
+    if threads is None:
+        threads = get_encode_threads()
+
+    cmd = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-threads", str(threads)
+    ] + X264_PARAMS + [
+        "-c:a", "aac", "-b:a", "192k",
+        "-shortest"
+    ]
+    video_filters = []
+    if subtitles_vf:
+        video_filters.append(subtitles_vf)
+    if fade_out and total_duration > 2.0:
+        video_filters.append(f"fade=t=out:st={total_duration - fade_out:.3f}:d={fade_out}")
+    if video_filters:
+        cmd += ["-vf", ",".join(video_filters)]
+    cmd.append(output_path)
+
+    log_path = os.path.join(temp_dir, f"{output_stem}_ffmpeg.log")
+    print(f"启动ffmpeg管道编码: {width}x{height} @ {fps}fps，{threads} 个线程")
+
+    written_frames = 0
+    elapsed_time = 0.0
+    with open(log_path, "wb") as log_file:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=log_file)
+        try:
+            for segment in segments:
+                base_bytes = {}  # 本页底图的RGB字节，供各行字幕条共用
+                segment_end = elapsed_time + segment['duration']
+                segment_time = elapsed_time
+                for image, duration in segment['frames']:
+                    if duration <= 0 or segment_time >= segment_end:
+                        continue
+                    segment_time = min(segment_time + duration, segment_end)
+                    target_frames = int(round(segment_time * fps))
+                    frame_count = target_frames - written_frames
+                    if frame_count <= 0:
+                        continue
+
+                    frame_chunks = _frame_to_rgb_chunks(image, width, height, base_bytes)
+                    for _ in range(frame_count):
+                        for chunk in frame_chunks:
+                            process.stdin.write(chunk)
+                    written_frames = target_frames
+
+                # 画面时长不足时，用最后一张画面补齐到片段结尾
+                target_frames = int(round(segment_end * fps))
+                if target_frames > written_frames and segment['frames']:
+                    frame_chunks = _frame_to_rgb_chunks(segment['frames'][-1][0], width, height, base_bytes)
+                    for _ in range(target_frames - written_frames):
+                        for chunk in frame_chunks:
+                            process.stdin.write(chunk)
+                    written_frames = target_frames
+                elapsed_time = segment_end
+
+            process.stdin.close()
+            return_code = process.wait()
+        except (BrokenPipeError, OSError) as e:
+            process.kill()
+            process.wait()
+            return_code = process.returncode
+            print(f"写入ffmpeg管道失败: {e}")
+            print(traceback.format_exc())
+
+    if return_code != 0:
+        with open(log_path, "rb") as log_file:
+            error_output = log_file.read().decode('utf-8', errors='replace')
+        raise Exception(f"ffmpeg管道编码失败 (返回码 {return_code}): {error_output[-1000:]}")
+
+    print(f"ffmpeg管道编码完成，共写入 {written_frames} 帧")
+
+def _image_to_rgb_bytes(image, width, height):
+    """将PIL图片转换为指定尺寸的RGB原始字节"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != (width, height):
+        image = image.resize((width, height))
+    return image.tobytes()
+
+def _frame_to_rgb_chunks(frame, width, height, base_bytes):
+    """
+    将画面转换为按顺序写入管道的RGB字节块
+
+    BandedFrame返回 [字幕条以上的底图, 字幕条, 字幕条以下的底图]，底图部分是对base_bytes中缓存字节的引用。
+    """
+    if not isinstance(frame, BandedFrame):
+        return [_image_to_rgb_bytes(frame, width, height)]
+
+    band_height = frame.band.height
+    if frame.size != (width, height) or frame.band.width != width or frame.top + band_height > height:
+        # 尺寸需要调整时按完整画面处理
+        return [_image_to_rgb_bytes(frame.to_image(), width, height)]
+
+    base_key = id(frame.base)
+    if base_key not in base_bytes:
+        base_bytes[base_key] = memoryview(_image_to_rgb_bytes(frame.base, width, height))
+    base_view = base_bytes[base_key]
+
+    row_bytes = width * 3
+    band_start = frame.top * row_bytes
+    band_end = (frame.top + band_height) * row_bytes
+    band_data = frame.band.tobytes() if frame.band.mode == 'RGB' else frame.band.convert('RGB').tobytes()
+    return [chunk for chunk in (base_view[:band_start], band_data, base_view[band_end:]) if len(chunk)]
+
+def build_still_timeline(segments):
+    """
+    将片段列表展开为可变帧率时间轴
+
+    每个条目是一张画面及其显示时长；除了画面切换外，字幕事件的起止时间也会切分画面，
+    以便烧录字幕时每次字幕变化都正好对应一帧。
+
+    Returns:
+    - [(画面, 开始秒, 时长秒), ...]
+    """
+    timeline = []
+    elapsed_time = 0.0
+    for segment in segments:
+        segment_end = elapsed_time + segment['duration']
+        cuts = set()
+        for start, end, _ in segment.get('subtitles') or []:
+            cuts.add(elapsed_time + start)
+            cuts.add(elapsed_time + end)
+
+        frame_time = elapsed_time
+        frames = [(image, duration) for image, duration in segment['frames'] if duration > 0]
+        for position, (image, duration) in enumerate(frames):
+            if frame_time >= segment_end:
+                break
+            # 画面时长不足时，最后一张画面补齐到片段结尾
+            frame_end = segment_end if position == len(frames) - 1 else min(frame_time + duration, segment_end)
+            points = [frame_time] + sorted(t for t in cuts if frame_time < t < frame_end) + [frame_end]
+            for start, end in zip(points[:-1], points[1:]):
+                if end - start > 1e-6:
+                    timeline.append((image, start, end - start))
+            frame_time = frame_end
+        elapsed_time = segment_end
+    return timeline
+
+def encode_with_ffmpeg_still(segments, output_path, temp_dir, fade_out=0.5, threads=None, subtitles_vf=None):
+    """
+    以可变帧率编码: 每张画面只编码一帧，并在每次画面切换处强制插入关键帧
+
+    画面写成PPM图片，由concat demuxer按各自时长读入，输出使用 -vsync vfr 保留原始时间戳，
+    播放器会在字幕行边界准确切换画面。
+    """
+    output_stem = os.path.splitext(os.path.basename(output_path))[0]
+    frames_dir = os.path.join(temp_dir, f"{output_stem}_frames")
+    os.makedirs(frames_dir, exist_ok=True)
+
+    audio_path = os.path.join(temp_dir, f"{output_stem}_audio.wav")
+    print("拼接音频轨道...")
+    write_concatenated_audio(segments, audio_path)
+
+    timeline = build_still_timeline(segments)
+    if not timeline:
+        raise ValueError("没有可编码的画面")
+    total_duration = sum(duration for _, _, duration in timeline)
+
+    first_image = frame_to_image(timeline[0][0])
+    width, height = first_image.size
+    # libx264 的 yuv420p 要求宽高为偶数
+    width -= width % 2
+    height -= height % 2
+
+    # 结尾淡出: 把最后一段拆成若干张逐渐变暗的画面
+    if fade_out and total_duration > 2.0:
+        timeline = _apply_still_fade(timeline, fade_out)
+
+    # 相同的画面对象只写一次图片文件
+    image_files = {}
+    list_lines = ["ffconcat version 1.0"]
+    for image, _, duration in timeline:
+        image_key = id(image)
+        if image_key not in image_files:
+            image_path = os.path.join(frames_dir, f"frame_{len(image_files):05d}.ppm")
+            frame_image = frame_to_image(image)
+            if frame_image.size != (width, height):
+                frame_image = frame_image.resize((width, height))
+            frame_image.save(image_path)
+            image_files[image_key] = image_path
+        list_lines.append(f"file '{_escape_concat_path(image_files[image_key])}'")
+        list_lines.append(STILL_TIMEBASE_OPTION)
+        list_lines.append(f"duration {duration:.6f}")
+    # concat demuxer 会忽略最后一个文件的时长，需要再列一次最后一张画面
+    list_lines.append(f"file '{_escape_concat_path(image_files[id(timeline[-1][0])])}'")
+    list_lines.append(STILL_TIMEBASE_OPTION)
+
+    list_path = os.path.join(temp_dir, f"{output_stem}_frames.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(list_lines) + "\n")
+
+    # 每次画面切换都是一个关键帧，便于拖动进度条时立即显示正确的字幕
+    key_times = ",".join(f"{start:.3f}" for _, start, _ in timeline)
+
+    if threads is None:
+        threads = get_encode_threads()
+    cmd = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-threads", str(threads),
+        "-vsync", "vfr", "-force_key_frames", key_times
+    ] + X264_STILL_PARAMS + [
+        "-c:a", "aac", "-b:a", "192k",
+        "-t", f"{total_duration:.3f}"
+    ]
+    if subtitles_vf:
+        cmd += ["-vf", subtitles_vf]
+    cmd.append(output_path)
+
+    print(f"可变帧率编码: {len(timeline)} 帧，{len(image_files)} 张不同画面，总时长 {total_duration:.2f}秒")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error_output = result.stderr.decode('utf-8', errors='replace')
+        raise Exception(f"ffmpeg可变帧率编码失败 (返回码 {result.returncode}): {error_output[-1000:]}")
+
+    print(f"可变帧率编码完成: {output_path}")
+
+def _apply_still_fade(timeline, fade_out, steps=STILL_FADE_STEPS):
+    """将时间轴最后fade_out秒替换为逐渐变暗的画面"""
+    total_duration = sum(duration for _, _, duration in timeline)
+    fade_start = total_duration - fade_out
+
+    result = []
+    fade_sources = []
+    for image, start, duration in timeline:
+        end = start + duration
+        if end <= fade_start:
+            result.append((image, start, duration))
+            continue
+        if start < fade_start:
+            result.append((image, start, fade_start - start))
+        fade_sources.append((image, max(start, fade_start), end))
+
+    step_duration = fade_out / steps
+    for step in range(steps):
+        step_start = fade_start + step * step_duration
+        source = next((image for image, start, end in fade_sources if start <= step_start < end), fade_sources[-1][0])
+        factor = 1.0 - (step + 1) / steps
+        faded = frame_to_image(source).point(lambda value, factor=factor: int(value * factor))
+        result.append((faded, step_start, step_duration))
+    return result
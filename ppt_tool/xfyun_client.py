@@ -0,0 +1,280 @@
+"""
+科大讯飞WebSocket TTS协议
+
+包含请求签名(XFyunWsParam)、基于asyncio的并发合成客户端，以及用于离线测试吞吐量的本地模拟服务器。
+asyncio客户端依赖可选的 websockets 库，未安装时 XFYUN_ASYNC_AVAILABLE 为False，调用方应回退到线程版实现。
+"""
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import math
+import ssl
+import struct
+import time
+from time import mktime
+from urllib.parse import urlencode, urlparse
+from wsgiref.handlers import format_date_time
+
+try:
+    import websockets
+    XFYUN_ASYNC_AVAILABLE = True
+except ImportError:
+    websockets = None
+    XFYUN_ASYNC_AVAILABLE = False
+
+XFYUN_TTS_URL = 'wss://tts-api.xfyun.cn/v2/tts'
+XFYUN_SIGNATURE_HOST = 'ws-api.xfyun.cn'
+XFYUN_SAMPLE_RATE = 16000
+
+class XFyunWsParam:
+    """科大讯飞WebSocket参数类"""
+    def __init__(self, app_id, api_key, api_secret, text, voice="xiaoyan", speed=50, volume=50, ttp="text",
+                 url=XFYUN_TTS_URL, signature_host=XFYUN_SIGNATURE_HOST, verbose=True):
+        self.APPID = app_id
+        self.APIKey = api_key
+        self.APISecret = api_secret
+        self.Text = text
+        self.url = url
+        self.signature_host = signature_host
+        self.verbose = verbose
+
+        # 公共参数
+        self.CommonArgs = {"app_id": self.APPID}
+
+        # 业务参数 - 按照官方格式设置
+        self.BusinessArgs = {
+            "aue": "raw",  # 使用raw格式，便于后续处理
+            "auf": f"audio/L16;rate={XFYUN_SAMPLE_RATE}",  # 音频采样率
+            "vcn": voice,  # 发音人
+            "tte": "utf8",  # 文本编码
+            "speed": speed,  # 语速
+            "volume": volume,  # 音量
+            "ttp": ttp  # 文本类型，普通文本或CSSML
+        }
+
+        # 数据
+        self.Data = {
+            "status": 2,  # 2表示一次性发送全部数据
+            "text": str(base64.b64encode(self.Text.encode('utf-8')), "UTF8")
+        }
+
+    def create_url(self):
+        """生成鉴权URL"""
+        # 生成RFC1123格式的时间戳
+        now = datetime.datetime.now()
+        date = format_date_time(mktime(now.timetuple()))
+
+        # 拼接字符串
+        signature_origin = "host: " + self.signature_host + "\n"
+        signature_origin += "date: " + date + "\n"
+        signature_origin += "GET " + urlparse(self.url).path + " HTTP/1.1"
+
+        if self.verbose:
+            print(f"签名原始字符串: \n{signature_origin}")
+
+        # 进行hmac-sha256加密
+        signature_sha = hmac.new(self.APISecret.encode('utf-8'),
+                                  signature_origin.encode('utf-8'),
+                                  digestmod=hashlib.sha256).digest()
+        signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding='utf-8')
+
+        authorization_origin = f'api_key="{self.APIKey}", algorithm="hmac-sha256", headers="host date request-line", signature="{signature_sha_base64}"'
+        authorization = base64.b64encode(authorization_origin.encode('utf-8')).decode(encoding='utf-8')
+
+        # 将请求的鉴权参数组合为字典
+        v = {
+            "authorization": authorization,
+            "date": date,
+            "host": self.signature_host
+        }
+
+        # 拼接鉴权参数，生成url
+        url = self.url + '?' + urlencode(v)
+        if self.verbose:
+            print(f"WebSocket URL: {self.url}?authorization=***&date={date}&host={self.signature_host}")
+        return url
+
+    def create_request(self):
+        """生成发送给服务器的JSON请求"""
+        return json.dumps({
+            "common": self.CommonArgs,
+            "business": self.BusinessArgs,
+            "data": self.Data
+        })
+
+class XFyunAsyncClient:
+    """
+    基于asyncio的科大讯飞TTS客户端
+
+    讯飞协议每个连接只处理一次合成，服务器发送最后一帧后即关闭连接，
+    因此客户端在同一个事件循环上同时维持多个连接，由信号量限制并发数，不为单个请求创建线程。
+    """
+
+    def __init__(self, app_id, api_key, api_secret, voice="xiaoyan", speed=50, volume=50, ttp="text",
+                 max_concurrency=8, url=XFYUN_TTS_URL, signature_host=XFYUN_SIGNATURE_HOST,
+                 timeout_func=None):
+        if not XFYUN_ASYNC_AVAILABLE:
+            raise RuntimeError("未安装 websockets 库，无法使用asyncio版科大讯飞客户端")
+        self.app_id = app_id
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.voice = voice
+        self.speed = speed
+        self.volume = volume
+        self.ttp = ttp
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.url = url
+        self.signature_host = signature_host
+        self.timeout_func = timeout_func or (lambda text: min(180.0, 10.0 + 0.15 * len(text or "")))
+        self._semaphore = None
+
+    def _make_param(self, text):
+        return XFyunWsParam(
+            self.app_id, self.api_key, self.api_secret, text,
+            voice=self.voice, speed=self.speed, volume=self.volume, ttp=self.ttp,
+            url=self.url, signature_host=self.signature_host, verbose=False
+        )
+
+    async def _receive_pcm(self, text):
+        ws_param = self._make_param(text)
+        ssl_context = None
+        if self.url.startswith('wss://'):
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+        pcm_chunks = []
+        async with websockets.connect(ws_param.create_url(), ssl=ssl_context, max_size=None) as ws:
+            await ws.send(ws_param.create_request())
+            async for message in ws:
+                message = json.loads(message)
+                code = message.get("code", -1)
+                if code != 0:
+                    raise RuntimeError(f"科大讯飞错误: {message.get('message', '未知错误')} (代码: {code})")
+                data = message.get("data") or {}
+                audio = data.get("audio", "")
+                if audio:
+                    pcm_chunks.append(base64.b64decode(audio))
+                if data.get("status", 0) == 2:
+                    break
+        return b"".join(pcm_chunks)
+
+    async def synthesize(self, text):
+        """
+        合成一段文本
+
+        Returns:
+        - 成功返回16kHz 16位单声道PCM字节串，失败返回None
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            try:
+                pcm_data = await asyncio.wait_for(self._receive_pcm(text), self.timeout_func(text))
+                return pcm_data or None
+            except asyncio.TimeoutError:
+                print(f"科大讯飞请求超时: {text[:20]}{'...' if len(text) > 20 else ''}")
+                return None
+            except Exception as e:
+                print(f"科大讯飞语音合成失败: {e}")
+                return None
+
+    async def synthesize_many(self, texts):
+        """
+        并发合成多段文本
+
+        Returns:
+        - 与texts顺序一致的PCM字节串列表，失败项为None
+        """
+        return await asyncio.gather(*(self.synthesize(text) for text in texts))
+
+def make_stub_pcm(text, chars_per_second=4.0, frequency=440.0):
+    """按文本长度生成正弦波PCM，模拟服务器返回的音频"""
+    sample_count = int(XFYUN_SAMPLE_RATE * max(0.2, len(text) / chars_per_second))
+    step = 2 * math.pi * frequency / XFYUN_SAMPLE_RATE
+    samples = (int(3000 * math.sin(step * i)) for i in range(sample_count))
+    return struct.pack(f"<{sample_count}h", *samples)
+
+class XFyunStubServer:
+    """
+    模拟科大讯飞TTS协议的本地WebSocket服务器
+
+    收到请求后等待latency秒模拟合成耗时，再将音频分成若干帧返回，最后一帧status为2，随后关闭连接。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.3, frame_bytes=8192):
+        if not XFYUN_ASYNC_AVAILABLE:
+            raise RuntimeError("未安装 websockets 库，无法启动模拟服务器")
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.frame_bytes = frame_bytes
+        self.request_count = 0
+        self._server = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/v2/tts"
+
+    async def handler(self, ws, path=None):
+        request = json.loads(await ws.recv())
+        self.request_count += 1
+        text = base64.b64decode(request["data"]["text"]).decode('utf-8')
+        await asyncio.sleep(self.latency)
+
+        pcm_data = make_stub_pcm(text)
+        frames = [pcm_data[i:i + self.frame_bytes] for i in range(0, len(pcm_data), self.frame_bytes)] or [b""]
+        for i, frame in enumerate(frames):
+            status = 2 if i == len(frames) - 1 else 1
+            await ws.send(json.dumps({
+                "code": 0,
+                "message": "success",
+                "sid": f"stub{self.request_count:06d}",
+                "data": {"audio": base64.b64encode(frame).decode('utf-8'), "status": status, "ced": str(i)}
+            }))
+
+    async def start(self):
+        self._server = await websockets.serve(self.handler, self.host, self.port, max_size=None)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+async def _run_benchmark(texts, concurrency_levels, latency):
+    server = await XFyunStubServer(latency=latency).start()
+    results = {}
+    try:
+        for concurrency in concurrency_levels:
+            client = XFyunAsyncClient("stub_app", "stub_key", "stub_secret",
+                                      max_concurrency=concurrency, url=server.url)
+            start_time = time.time()
+            pcm_list = await client.synthesize_many(texts)
+            elapsed = time.time() - start_time
+            failed_count = sum(1 for pcm in pcm_list if not pcm)
+            results[concurrency] = elapsed
+            print(f"并发数 {concurrency}: {len(texts)} 段文本耗时 {elapsed:.2f}秒, "
+                  f"吞吐量 {len(texts) / elapsed:.1f} 段/秒, 失败 {failed_count} 段")
+    finally:
+        await server.stop()
+    return results
+
+def benchmark_xfyun_client(request_count=40, concurrency_levels=(1, 4, 8, 16), latency=0.3):
+    """
+    使用本地模拟服务器测试asyncio客户端在不同并发数下的吞吐量
+
+    Returns:
+    - {并发数: 耗时秒数} 字典
+    """
+    texts = [f"这是第{i + 1}段用于测试吞吐量的旁白文本。" for i in range(request_count)]
+    print(f"科大讯飞客户端吞吐量测试: {request_count} 段文本，模拟服务器延迟 {latency}秒")
+    return asyncio.run(_run_benchmark(texts, concurrency_levels, latency))
+
+if __name__ == "__main__":
+    benchmark_xfyun_client()